@@ -1,33 +1,137 @@
+from collections import OrderedDict
 from datetime import datetime, timezone
+from functools import cached_property
 import dateutil.parser
+import orjson
+import time
 
 from sanic import response
 from natural.date import duration
 
+from tools.compression import decompress
+
 from .formatter import format_content_html
 
 
+def parse_timestamp(value):
+    """
+    str(datetime) and iso timestamps are parsed directly, anything else by dateutil
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = dateutil.parser.parse(value)
+    return parsed.astimezone(timezone.utc)
+
+
+STREAM_ABOVE = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def send_body(body, content_type):
+    """
+    A response for a rendered transcript, streamed in chunks when it's large
+    """
+    if len(body) <= STREAM_ABOVE:
+        return response.raw(body, content_type=content_type)
+
+    async def streaming_fn(res):
+        for start in range(0, len(body), CHUNK_SIZE):
+            await res.write(body[start : start + CHUNK_SIZE])
+
+    return response.ResponseStream(streaming_fn, content_type=content_type)
+
+
+class RenderCache:
+    """
+    Rendered transcripts by log key and version
+
+    Entries expire after ttl seconds so relative times don't go stale, and the
+    least recently viewed ones are dropped past max_size bytes
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self.pop(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, body):
+        self.pop(key)
+        self.entries[key] = (time.monotonic() + self.ttl, body)
+        self.size += len(body)
+        while self.size > self.max_size and self.entries:
+            self.pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+def render_cache(app):
+    cache = getattr(app.ctx, "render_cache", None)
+    if cache is None:
+        cache = app.ctx.render_cache = RenderCache()
+    return cache
+
+
 class LogEntry:
     def __init__(self, app, data):
         self.app = app
         self.key = data["key"]
         self.open = data["open"]
-        self.created_at = dateutil.parser.parse(data["created_at"]).astimezone(timezone.utc)
+        self.created_at = parse_timestamp(data["created_at"])
         self.human_created_at = duration(self.created_at, now=datetime.now(timezone.utc))
-        self.closed_at = (
-            dateutil.parser.parse(data["closed_at"]).astimezone(timezone.utc) if not self.open else None
-        )
+        self.closed_at = parse_timestamp(data["closed_at"]) if not self.open else None
         self.channel_id = int(data["channel_id"])
         self.guild_id = int(data["guild_id"])
         self.creator = User(data["creator"])
         self.recipient = User(data["recipient"])
         self.closer = User(data["closer"]) if not self.open else None
         self.close_message = format_content_html(data.get("close_message") or "")
-        self.messages = [Message(m) for m in data["messages"]]
-        self.internal_messages = [m for m in self.messages if m.type == "internal"]
-        self.thread_messages = [
-            m for m in self.messages if m.type not in ("internal", "system")
-        ]
+        # either a list of messages or compressed pages of them, the bot
+        # stores chunks in redis and a single page in postgres
+        self.chunks = data.get("chunks")
+        self.raw_messages = data.get("messages") or []
+        self.version = data.get("version") or (
+            data.get("closed_at"),
+            len(self.chunks if self.chunks is not None else self.raw_messages),
+        )
+
+    def iter_messages(self):
+        """
+        Messages decoded one page at a time
+        """
+        if "messages" in self.__dict__:
+            yield from self.messages
+        elif self.chunks is not None:
+            for chunk in self.chunks:
+                yield from map(Message, orjson.loads(decompress(chunk)))
+        else:
+            yield from map(Message, self.raw_messages)
+
+    @cached_property
+    def messages(self):
+        return list(self.iter_messages())
+
+    @cached_property
+    def internal_messages(self):
+        return [m for m in self.messages if m.type == "internal"]
+
+    @cached_property
+    def thread_messages(self):
+        return [m for m in self.messages if m.type not in ("internal", "system")]
 
     @property
     def system_avatar_url(self):
@@ -37,7 +141,7 @@ class LogEntry:
     def human_closed_at(self):
         return duration(self.closed_at, now=datetime.now(timezone.utc))
 
-    @property
+    @cached_property
     def message_groups(self):
         groups = []
 
@@ -60,55 +164,70 @@ class LogEntry:
         return groups
 
     def render_html(self):
-        return self.app.ctx.render_template("logbase", log_entry=self)
+        cache = render_cache(self.app)
+        key = (self.key, self.version, "html")
+        body = cache.get(key)
+        if body is None:
+            body = self.app.ctx.render_template("logbase", log_entry=self).body
+            cache.set(key, body)
+
+        return send_body(body, "text/html; charset=utf-8")
 
     def render_plain_text(self):
-        messages = self.messages
+        cache = render_cache(self.app)
+        key = (self.key, self.version, "text")
+        body = cache.get(key)
+        if body is None:
+            body = "".join(self.plain_text_lines()).encode()
+            cache.set(key, body)
+
+        return send_body(body, "text/plain; charset=utf-8")
+
+    def plain_text_lines(self):
+        messages = self.iter_messages()
+        message = next(messages, None)
+        sent = message is not None
         thread_create_time = self.created_at.strftime("%d %b %Y - %H:%M UTC")
-        out = f"Thread created at {thread_create_time}\n"
+        yield f"Thread created at {thread_create_time}\n"
 
         if self.creator == self.recipient:
-            out += f"[R] {self.creator} "
-            out += f"({self.creator.id}) created a Modmail thread. \n"
+            yield f"[R] {self.creator} "
+            yield f"({self.creator.id}) created a Modmail thread. \n"
         else:
-            out += f"[M] {self.creator} "
-            out += f"created a thread with [R] "
-            out += f"{self.recipient} ({self.recipient.id})\n"
+            yield f"[M] {self.creator} "
+            yield f"created a thread with [R] "
+            yield f"{self.recipient} ({self.recipient.id})\n"
 
-        out += "────────────────────────────────────────────────\n"
+        yield "────────────────────────────────────────────────\n"
 
-        if messages:
-            for index, message in enumerate(messages):
-                next_index = index + 1 if index + 1 < len(messages) else index
-                curr, next_ = message.author, messages[next_index].author
+        while message is not None:
+            next_message = next(messages, None)
+            curr, next_ = message.author, (next_message or message).author
 
-                author = curr
-                user_type = "M" if author.mod else "R"
-                create_time = message.created_at.strftime("%d/%m %H:%M")
+            author = curr
+            user_type = "M" if author.mod else "R"
+            create_time = message.created_at.strftime("%d/%m %H:%M")
 
-                base = f"{create_time} {user_type} "
-                base += f"{author}: {message.raw_content}\n"
+            yield f"{create_time} {user_type} "
+            yield f"{author}: {message.raw_content}\n"
 
-                for attachment in message.attachments:
-                    base += f"Attachment: {attachment}\n"
+            for attachment in message.attachments:
+                yield f"Attachment: {attachment}\n"
 
-                out += base
+            if curr != next_:
+                yield "────────────────────────────────\n"
 
-                if curr != next_:
-                    out += "────────────────────────────────\n"
-                    current_author = author
+            message = next_message
 
         if not self.open:
-            if messages:  # only add if at least 1 message was sent
-                out += "────────────────────────────────────────────────\n"
+            if sent:  # only add if at least 1 message was sent
+                yield "────────────────────────────────────────────────\n"
 
-            out += f"[M] {self.closer} ({self.closer.id}) "
-            out += "closed the Modmail thread. \n"
+            yield f"[M] {self.closer} ({self.closer.id}) "
+            yield "closed the Modmail thread. \n"
 
             closed_time = self.closed_at.strftime("%d %b %Y - %H:%M UTC")
-            out += f"Thread closed at {closed_time} \n"
-
-        return response.text(out)
+            yield f"Thread closed at {closed_time} \n"
 
 
 class User:
@@ -167,10 +286,8 @@ class Attachment:
 class Message:
     def __init__(self, data):
         self.id = int(data["message_id"])
-        self.created_at = dateutil.parser.parse(data["timestamp"]).astimezone(timezone.utc)
-        self.human_created_at = duration(self.created_at, now=datetime.now(timezone.utc))
+        self.created_at = parse_timestamp(data["timestamp"])
         self.raw_content = data["content"]
-        self.content = self.format_html_content(self.raw_content)
         self.attachments = [Attachment(a) for a in data["attachments"]]
         self.author = User(data["author"])
         self.type = data.get("type", "thread_message")
@@ -183,6 +300,14 @@ class Message:
             or other.type != self.type
         )
 
+    @cached_property
+    def human_created_at(self):
+        return duration(self.created_at, now=datetime.now(timezone.utc))
+
+    @cached_property
+    def content(self):
+        return self.format_html_content(self.raw_content)
+
     @staticmethod
     def format_html_content(content):
         return format_content_html(content)
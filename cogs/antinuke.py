@@ -7,6 +7,7 @@ import typing
 from discord.abc import GuildChannel
 from discord.ext.commands import group, Cog
 from discord import (
+    AuditLogEntry,
     Interaction,
     Embed,
     Member,
@@ -14,13 +15,13 @@ from discord import (
     AuditLogAction,
     Guild,
     TextChannel,
-    Message,
     Role,
 )
 
 from typing import Union, List
 
 from tools.bot import Pretend
+from tools.pipeline import MessageEvent
 from tools.validators import ValidTime
 from tools.converters import Punishment
 from tools.helpers import PretendContext
@@ -34,16 +35,32 @@ class Antinuke(Cog):
         self.thresholds = {}
         self.modules = ['channel delete','channel create','role giving','role delete','role create','kick','ban','edit role','mass mention','spammer','new accounts','bot add']
 
-    async def joined_whitelist(self, member: Member) -> bool:
-        """check if the added bot / young account is whitelisted"""
-        check = await self.bot.db.fetchval(
-            "SELECT whitelisted FROM antinuke WHERE guild_id = $1", member.guild.id
+    async def cog_load(self) -> None:
+        self.bot.pipeline.register(
+            "mass mention",
+            self.on_mass_mention,
+            feature=self.mass_mention_feature,
+            bots=True,
         )
-        if check:
-            if member.id in orjson.loads(check):
-                return True
 
-        return False
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.unregister("mass mention")
+
+    async def cog_after_invoke(self, ctx: PretendContext) -> None:
+        if ctx.guild and not ctx.command_failed:
+            # the config commands write straight to the database
+            await self.bot.an.reload(ctx.guild)
+
+    def mass_mention_feature(self, event: MessageEvent) -> bool:
+        """only mentions of everyone or roles can trigger the module"""
+        message = event.message
+        return bool(message.mention_everyone or message.role_mentions) and any(
+            r["module"] == "mass mention" for r in event.config("antinuke_modules")
+        )
+
+    async def joined_whitelist(self, member: Member) -> bool:
+        """check if the added bot / young account is whitelisted"""
+        return member.id in (await self.bot.an.policy(member.guild)).whitelisted
 
     def big_role_mention(self, roles: List[Role]) -> bool:
         for role in roles:
@@ -52,6 +69,82 @@ class Antinuke(Cog):
 
         return False
 
+    async def punish(
+        self, module: str, member: Member, reason: str, tasks: list = None
+    ):
+        """
+        revert the damage and punish the offender, only once per offender
+        """
+
+        tasks = tasks or []
+        with self.bot.an.engine.claim(member.guild.id, member.id) as claimed:
+            if not claimed:
+                # already being punished, only the damage has to be reverted
+                return await asyncio.gather(*tasks, return_exceptions=True)
+
+            tasks.append(await self.bot.an.decide_punishment(module, member, reason))
+            action_time = datetime.datetime.now()
+            policy = await self.bot.an.policy(member.guild)
+            await self.bot.an.take_action(
+                reason,
+                member,
+                tasks,
+                action_time,
+                policy.owner_id,
+                member.guild.get_channel(policy.logs),
+            )
+
+    async def offender(self, entry: AuditLogEntry) -> typing.Optional[Member]:
+        """
+        the executor of an entry if they can and should be punished
+        """
+
+        if not entry or entry.user_id == self.bot.user.id:
+            return None
+
+        member = await self.bot.an.engine.executor(entry)
+        if not member or await self.bot.an.is_whitelisted(member):
+            return None
+
+        if not self.bot.an.check_hieracy(member, entry.guild.me):
+            return None
+
+        return member
+
+    @Cog.listener("on_audit_log_entry_create")
+    async def on_audit_log_entry(self, entry: AuditLogEntry):
+        module = self.bot.an.engine.feed(entry)
+        if module not in ("kick", "ban", "channel create", "role create"):
+            # the other modules are handled with their gateway events
+            return
+
+        if not self.bot.an.get_bot_perms(entry.guild):
+            return
+
+        if not await self.bot.an.is_module(module, entry.guild):
+            return
+
+        if not (member := await self.offender(entry)):
+            return
+
+        if module == "channel create":
+            if channel := entry.guild.get_channel(entry.target.id):
+                await channel.delete()
+
+            if await self.bot.an.exceeded_threshold(module, member):
+                await self.punish(module, member, "Creating channels")
+
+        elif module == "role create":
+            tasks = []
+            if role := entry.guild.get_role(entry.target.id):
+                tasks.append(role.delete())
+
+            await self.punish(module, member, "Creating roles", tasks)
+
+        elif await self.bot.an.exceeded_threshold(module, member):
+            reason = "Kicking members" if module == "kick" else "Banning members"
+            await self.punish(module, member, reason)
+
     @Cog.listener("on_guild_role_update")
     async def on_role_edit(self, before: Role, after: Role):
         if self.bot.an.get_bot_perms(before.guild):
@@ -66,29 +159,13 @@ class Antinuke(Cog):
                 else:
                     return
 
-                async for entry in before.guild.audit_logs(
-                    limit=1, action=AuditLogAction.role_update
-                ):
-                    if self.bot.an.check_hieracy(entry.user, before.guild.me):
-                        if not await self.bot.an.is_whitelisted(entry.user):
-                            tasks.append(
-                                await self.bot.an.decide_punishment(
-                                    "edit role", entry.user, "Maliciously editing roles"
-                                )
-                            )
-                            action_time = datetime.datetime.now()
-                            check = await self.bot.db.fetchrow(
-                                "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                before.guild.id,
-                            )
-                            await self.bot.an.take_action(
-                                "Maliciously editing roles",
-                                entry.user,
-                                tasks,
-                                action_time,
-                                check["owner_id"],
-                                before.guild.get_channel(check["logs"]),
-                            )
+                entry = await self.bot.an.engine.attribute(
+                    before.guild, AuditLogAction.role_update, after.id
+                )
+                if member := await self.offender(entry):
+                    await self.punish(
+                        "edit role", member, "Maliciously editing roles", tasks
+                    )
 
     @Cog.listener("on_guild_update")
     async def change_antinuke_owner(self, before: Guild, after: Guild):
@@ -103,17 +180,16 @@ class Antinuke(Cog):
                     after.owner_id,
                     before.id,
                 )
+                await self.bot.an.reload(after)
 
     @Cog.listener("on_member_join")
     async def on_new_acc_join(self, member: Member):
         if self.bot.an.get_bot_perms(member.guild):
             if await self.bot.an.is_module("new accounts", member.guild):
                 if not await self.joined_whitelist(member):
-                    res = await self.bot.db.fetchval(
-                        "SELECT threshold FROM antinuke_modules WHERE guild_id = $1 AND module = $2",
-                        member.guild.id,
-                        "new accounts",
-                    )
+                    res = (
+                        await self.bot.an.get_module("new accounts", member.guild)
+                    ).threshold
                     if (
                         datetime.datetime.now()
                         - datetime.datetime.fromtimestamp(member.created_at.timestamp())
@@ -126,9 +202,8 @@ class Antinuke(Cog):
                             )
                         ]
                         action_time = datetime.datetime.now()
-                        check = await self.bot.db.fetchrow(
-                            "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                            member.guild.id,
+                        check = await self.bot.guild_config.fetch(
+                            "antinuke", member.guild.id
                         )
                         await self.bot.an.take_action(
                             f"Account younger than {humanfriendly.format_timespan(res)}",
@@ -153,9 +228,8 @@ class Antinuke(Cog):
                             )
                         ]
                         action_time = datetime.datetime.now()
-                        check = await self.bot.db.fetchrow(
-                            "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                            member.guild.id,
+                        check = await self.bot.guild_config.fetch(
+                            "antinuke", member.guild.id
                         )
                         await self.bot.an.take_action(
                             f"Account flagged as spammer by discord",
@@ -171,191 +245,47 @@ class Antinuke(Cog):
         if self.bot.an.get_bot_perms(member.guild):
             if member.bot:
                 if await self.bot.an.is_module("bot add", member.guild):
-                    async for entry in member.guild.audit_logs(
-                        limit=1, action=AuditLogAction.bot_add
-                    ):
-                        if not await self.joined_whitelist(member):
-                            if self.bot.an.check_hieracy(entry.user, member.guild.me):
-                                if not await self.bot.an.is_whitelisted(entry.user):
-                                    tasks = [
-                                        member.ban(reason="Unwhitelisted bot added"),
-                                        await self.bot.an.decide_punishment(
-                                            "bot add",
-                                            entry.user,
-                                            "Adding unwhitelisted bots",
-                                        ),
-                                    ]
-                                    action_time = datetime.datetime.now()
-                                    check = await self.bot.db.fetchrow(
-                                        "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                        member.guild.id,
-                                    )
-                                    await self.bot.an.take_action(
-                                        "Adding bots",
-                                        entry.user,
-                                        tasks,
-                                        action_time,
-                                        check["owner_id"],
-                                        member.guild.get_channel(check["logs"]),
-                                    )
-
-    @Cog.listener("on_guild_channel_create")
-    async def on_guild_channel_create(self, channel: GuildChannel):
-        if self.bot.an.get_bot_perms(channel.guild):
-            if await self.bot.an.is_module("channel create", channel.guild):
-                async for entry in channel.guild.audit_logs(
-                    limit=1, action=AuditLogAction.channel_create
-                ):
-                    if self.bot.an.check_hieracy(entry.user, channel.guild.me):
-                        if not await self.bot.an.is_whitelisted(entry.user):
-                            await channel.delete()
-                            if await self.bot.an.check_threshold(
-                                "channel create", entry.user
-                            ):
-                                cache = self.bot.cache.get(
-                                    f"createchannel-{channel.guild.id}"
-                                )
-                                if not cache:
-                                    await self.bot.cache.set(
-                                        f"createchannel-{channel.guild.id}", True, 5
-                                    )
-                                    tasks = [
-                                        await self.bot.an.decide_punishment(
-                                            "channel create",
-                                            entry.user,
-                                            "Creating channels",
-                                        )
-                                    ]
-                                    action_time = datetime.datetime.now()
-                                    check = await self.bot.db.fetchrow(
-                                        "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                        channel.guild.id,
-                                    )
-                                    await self.bot.an.take_action(
-                                        "Creating channels",
-                                        entry.user,
-                                        tasks,
-                                        action_time,
-                                        check["owner_id"],
-                                        channel.guild.get_channel(check["logs"]),
-                                    )
+                    if not await self.joined_whitelist(member):
+                        entry = await self.bot.an.engine.attribute(
+                            member.guild, AuditLogAction.bot_add, member.id
+                        )
+                        if offender := await self.offender(entry):
+                            await self.punish(
+                                "bot add",
+                                offender,
+                                "Adding unwhitelisted bots",
+                                [member.ban(reason="Unwhitelisted bot added")],
+                            )
 
     @Cog.listener("on_guild_channel_delete")
     async def on_guild_channel_delete(self, channel: GuildChannel):
         if self.bot.an.get_bot_perms(channel.guild):
             if await self.bot.an.is_module("channel delete", channel.guild):
-                async for entry in channel.guild.audit_logs(
-                    limit=1, action=AuditLogAction.channel_delete
-                ):
-                    if self.bot.an.check_hieracy(entry.user, channel.guild.me):
-                        if not await self.bot.an.is_whitelisted(entry.user):
-                            await channel.clone()
-                            if await self.bot.an.check_threshold(
-                                "channel delete", entry.user
-                            ):
-                                cache = self.bot.cache.get(
-                                    f"deletechannel-{channel.guild.id}"
-                                )
-                                if not cache:
-                                    await self.bot.cache.set(
-                                        f"deletechannel-{channel.guild.id}", True, 5
-                                    )
-                                    tasks = [
-                                        await self.bot.an.decide_punishment(
-                                            "channel delete",
-                                            entry.user,
-                                            "Deleting channels",
-                                        )
-                                    ]
-                                    action_time = datetime.datetime.now()
-                                    check = await self.bot.db.fetchrow(
-                                        "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                        channel.guild.id,
-                                    )
-                                    await self.bot.an.take_action(
-                                        "Deleting channels",
-                                        entry.user,
-                                        tasks,
-                                        action_time,
-                                        check["owner_id"],
-                                        channel.guild.get_channel(check["logs"]),
-                                    )
+                entry = await self.bot.an.engine.attribute(
+                    channel.guild, AuditLogAction.channel_delete, channel.id
+                )
+                if member := await self.offender(entry):
+                    await channel.clone()
+                    if await self.bot.an.exceeded_threshold("channel delete", member):
+                        await self.punish("channel delete", member, "Deleting channels")
 
     @Cog.listener("on_guild_role_delete")
     async def on_role_deletion(self, role: Role):
         if self.bot.an.get_bot_perms(role.guild):
             if await self.bot.an.is_module("role delete", role.guild):
-                async for entry in role.guild.audit_logs(
-                    limit=1, action=AuditLogAction.role_delete
-                ):
-                    if not await self.bot.an.is_whitelisted(
-                        entry.user
-                    ) and self.bot.an.check_hieracy(entry.user, role.guild.me):
-                        await role.guild.create_role(
-                            name=role.name,
-                            permissions=role.permissions,
-                            color=role.color,
-                            hoist=role.hoist,
-                            display_icon=role.display_icon,
-                            mentionable=role.mentionable,
-                        )
-                        cache = self.bot.cache.get(f"roledelete-{role.guild.id}")
-                        if not cache:
-                            await self.bot.cache.set(
-                                f"roledelete-{role.guild.id}", True, 5
-                            )
-                            tasks = [
-                                await self.bot.an.decide_punishment(
-                                    "role delete", entry.user, "Deleting roles"
-                                )
-                            ]
-                            action_time = datetime.datetime.now()
-                            check = await self.bot.db.fetchrow(
-                                "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                role.guild.id,
-                            )
-                            await self.bot.an.take_action(
-                                "Deleting roles",
-                                entry.user,
-                                tasks,
-                                action_time,
-                                check["owner_id"],
-                                role.guild.get_channel(check["logs"]),
-                            )
-
-    @Cog.listener("on_guild_role_create")
-    async def on_role_creation(self, role: Role):
-        if self.bot.an.get_bot_perms(role.guild):
-            if await self.bot.an.is_module("role create", role.guild):
-                async for entry in role.guild.audit_logs(
-                    limit=1, action=AuditLogAction.role_create
-                ):
-                    if not await self.bot.an.is_whitelisted(
-                        entry.user
-                    ) and self.bot.an.check_hieracy(entry.user, role.guild.me):
-                        guild = role.guild
-                        await role.delete()
-                        cache = self.bot.cache.get(f"rolecreate-{guild.id}")
-                        if not cache:
-                            await self.bot.cache.set(f"rolecreate-{guild.id}", True, 5)
-                            tasks = [
-                                await self.bot.an.decide_punishment(
-                                    "role create", entry.user, "Creating roles"
-                                )
-                            ]
-                            action_time = datetime.datetime.now()
-                            check = await self.bot.db.fetchrow(
-                                "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                guild.id,
-                            )
-                            await self.bot.an.take_action(
-                                "Creating roles",
-                                entry.user,
-                                tasks,
-                                action_time,
-                                check["owner_id"],
-                                guild.get_channel(check["logs"]),
-                            )
+                entry = await self.bot.an.engine.attribute(
+                    role.guild, AuditLogAction.role_delete, role.id
+                )
+                if member := await self.offender(entry):
+                    await role.guild.create_role(
+                        name=role.name,
+                        permissions=role.permissions,
+                        color=role.color,
+                        hoist=role.hoist,
+                        display_icon=role.display_icon,
+                        mentionable=role.mentionable,
+                    )
+                    await self.punish("role delete", member, "Deleting roles")
 
     @Cog.listener("on_member_update")
     async def on_member_role_give(self, before: Member, after: Member):
@@ -369,118 +299,29 @@ class Antinuke(Cog):
             if any(self.bot.is_dangerous(role) for role in roles):
                 if self.bot.an.get_bot_perms(before.guild):
                     if await self.bot.an.is_module("role giving", before.guild):
-                        async for entry in after.guild.audit_logs(
-                            limit=1, action=AuditLogAction.member_role_update
-                        ):
-                            if not await self.bot.an.is_whitelisted(entry.user):
-                                if self.bot.an.check_hieracy(
-                                    entry.user, before.guild.me
-                                ):
-                                    if not self.bot.cache.get(
-                                        f"role-give-{before.guild.id}"
-                                    ):
-                                        await self.bot.cache.set(
-                                            f"role-give-{before.guild.id}", True, 5
-                                        )
-                                        tasks = [
-                                            after.edit(
-                                                roles=[
-                                                    r
-                                                    for r in before.roles
-                                                    if r.is_assignable()
-                                                    and r.is_bot_managed()
-                                                ],
-                                                reason="Roles being reverted",
-                                            ),
-                                            await self.bot.an.decide_punishment(
-                                                "role giving",
-                                                entry.user,
-                                                "Giving roles with dangerous permissions",
-                                            ),
-                                        ]
-
-                                        action_time = datetime.datetime.now()
-                                        check = await self.bot.db.fetchrow(
-                                            "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                            before.guild.id,
-                                        )
-                                        await self.bot.an.take_action(
-                                            "Giving roles with dangerous permissions",
-                                            entry.user,
-                                            tasks,
-                                            action_time,
-                                            check["owner_id"],
-                                            before.guild.get_channel(check["logs"]),
-                                        )
-
-    @Cog.listener("on_member_remove")
-    async def on_kick_action(self, member: Member):
-        if self.bot.an.get_bot_perms(member.guild):
-            if await self.bot.an.is_module("kick", member.guild):
-                async for entry in member.guild.audit_logs(
-                    limit=1, action=AuditLogAction.kick
-                ):
-                    if not await self.bot.an.is_whitelisted(entry.user):
-                        if await self.bot.an.check_threshold("kick", entry.user):
-                            if self.bot.an.check_hieracy(entry.user, member.guild.me):
-                                cache = self.bot.cache.get(f"kick-{member.guild.id}")
-                                if not cache:
-                                    await self.bot.cache.set(
-                                        f"kick-{member.guild.id}", True, 5
-                                    )
-                                    tasks = [
-                                        await self.bot.an.decide_punishment(
-                                            "kick", entry.user, "Kicking members"
-                                        )
-                                    ]
-                                    action_time = datetime.datetime.now()
-                                    check = await self.bot.db.fetchrow(
-                                        "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                        member.guild.id,
-                                    )
-                                    await self.bot.an.take_action(
-                                        "Kicking members",
-                                        entry.user,
-                                        tasks,
-                                        action_time,
-                                        check["owner_id"],
-                                        member.guild.get_channel(check["logs"]),
-                                    )
-
-    @Cog.listener("on_member_ban")
-    async def on_ban_action(self, guild: Guild, user: Union[User, Member]):
-        if self.bot.an.get_bot_perms(guild):
-            if await self.bot.an.is_module("ban", guild):
-                async for entry in guild.audit_logs(limit=1, action=AuditLogAction.ban):
-                    if not await self.bot.an.is_whitelisted(entry.user):
-                        if isinstance(user, Member):
-                            if not self.bot.an.check_hieracy(entry.user, guild.me):
-                                return
-                        if await self.bot.an.check_threshold("ban", entry.user):
-                            cache = self.bot.cache.get(f"ban-{guild.id}")
-                            if not cache:
-                                await self.bot.cache.set(f"ban-{guild.id}", True, 5)
-                                tasks = [
-                                    await self.bot.an.decide_punishment(
-                                        "ban", entry.user, "Banning members"
+                        entry = await self.bot.an.engine.attribute(
+                            after.guild, AuditLogAction.member_role_update, after.id
+                        )
+                        if member := await self.offender(entry):
+                            await self.punish(
+                                "role giving",
+                                member,
+                                "Giving roles with dangerous permissions",
+                                [
+                                    after.edit(
+                                        roles=[
+                                            r
+                                            for r in before.roles
+                                            if r.is_assignable()
+                                            and r.is_bot_managed()
+                                        ],
+                                        reason="Roles being reverted",
                                     )
-                                ]
-                                action_time = datetime.datetime.now()
-                                check = await self.bot.db.fetchrow(
-                                    "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                    guild.id,
-                                )
-                                await self.bot.an.take_action(
-                                    "Banning members",
-                                    entry.user,
-                                    tasks,
-                                    action_time,
-                                    check["owner_id"],
-                                    guild.get_channel(check["logs"]),
-                                )
+                                ],
+                            )
 
-    @Cog.listener("on_message")
-    async def on_mass_mention(self, message: Message):
+    async def on_mass_mention(self, event: MessageEvent):
+        message = event.message
         if message.guild:
             if not message.is_system():
                 if (
@@ -513,24 +354,22 @@ class Antinuke(Cog):
                             ]
                             tasks.append(webhook[0].delete())
 
-                        cache = self.bot.cache.get(f"massmention-{message.guild.id}")
-                        if not cache:
-                            await self.bot.cache.set(
-                                f"massmention-{message.guild.id}", True, 5
-                            )
-                            action_time = datetime.datetime.now()
-                            check = await self.bot.db.fetchrow(
-                                "SELECT owner_id, logs FROM antinuke WHERE guild_id = $1",
-                                message.guild.id,
-                            )
-                            await self.bot.an.take_action(
-                                "Mass mention",
-                                message.author,
-                                tasks,
-                                action_time,
-                                check["owner_id"],
-                                message.guild.get_channel(check["logs"]),
-                            )
+                        with self.bot.an.engine.claim(
+                            message.guild.id, message.author.id
+                        ) as claimed:
+                            if claimed:
+                                action_time = datetime.datetime.now()
+                                check = await self.bot.guild_config.fetch(
+                                    "antinuke", message.guild.id
+                                )
+                                await self.bot.an.take_action(
+                                    "Mass mention",
+                                    message.author,
+                                    tasks,
+                                    action_time,
+                                    check["owner_id"],
+                                    message.guild.get_channel(check["logs"]),
+                                )
 
     @group(invoke_without_command=True, aliases=["an"])
     async def antinuke(self, ctx: PretendContext):
@@ -583,6 +422,7 @@ class Antinuke(Cog):
             await interaction.client.db.execute(
                 "DELETE FROM antinuke_modules WHERE guild_id = $1", interaction.guild.id
             )
+            await interaction.client.an.reload(interaction.guild)
             await interaction.response.edit_message(
                 embed=Embed(
                     color=interaction.client.yes_color,
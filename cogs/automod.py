@@ -1,5 +1,5 @@
 import asyncio
-import aiohttp, json as orjson
+import json as orjson
 import datetime
 import humanfriendly
 
@@ -13,7 +13,6 @@ from discord import (
     Embed,
     Message,
     utils,
-    User,
     abc,
     Member,
     Object,
@@ -27,13 +26,15 @@ from discord.ext.commands import (
     TextChannelConverter,
 )
 
-from typing import Tuple, List
+from typing import Optional
 from collections import defaultdict
 
 from tools.bot import Pretend
+from tools.pipeline import MessageEvent
 from tools.converters import NoStaff
 from tools.validators import ValidTime
 from tools.helpers import PretendContext
+from tools.windows import SlidingWindow, WindowStore
 from tools.predicates import antispam_enabled
 
 
@@ -41,39 +42,42 @@ class Automod(Cog):
     def __init__(self, bot: Pretend):
         self.bot = bot
         self.description = "Automod commands"
-        self.spam_cache = {}
-        self.joins_cache = {}
+        self.spam_cache = WindowStore(10)
+        self.joins_cache = WindowStore(5, limit=1000)
         self.locks = defaultdict(asyncio.Lock)
 
-    def antispam_threshold(self, message: Message):
-        if not self.spam_cache.get(message.guild.id):
-            self.spam_cache[message.guild.id]: dict = {}
+    async def cog_load(self) -> None:
+        self.bot.pipeline.register("antispam", self.antispam_event, feature="antispam")
 
-        if not self.spam_cache[message.guild.id].get(message.author.id):
-            self.spam_cache[message.guild.id][message.author.id]: List[
-                Tuple[datetime.datetime, Message]
-            ] = [(datetime.datetime.now(), message)]
-        else:
-            self.spam_cache[message.guild.id][message.author.id].append(
-                (datetime.datetime.now(), message)
-            )
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.unregister("antispam")
 
-        to_remove = [
-            d
-            for d in self.spam_cache[message.guild.id][message.author.id]
-            if (datetime.datetime.now() - d[0]).total_seconds() > 10
-        ]
-        for d in to_remove:
-            self.spam_cache[message.guild.id][message.author.id].remove(d)
+    def digest(self, message: Message) -> Optional[int]:
+        return hash(message.content.lower()) if message.content else None
 
-        return list(
-            map(lambda m: m[1], self.spam_cache[message.guild.id][message.author.id])
+    def antispam_threshold(self, message: Message) -> SlidingWindow:
+        return self.spam_cache.push(
+            (message.guild.id, message.author.id),
+            message.id,
+            message.channel.id,
+            self.digest(message),
         )
 
+    def is_spamming(self, message: Message, window: SlidingWindow, rate: int) -> bool:
+        """
+        too many messages, the same message repeated, or a burst of messages
+        """
+
+        if len(window) > rate:
+            return True
+
+        if window.repeats(self.digest(message)) > max(rate // 2, 3):
+            return True
+
+        return window.burst(window.last - 2) > max(rate // 2, 4)
+
     async def whitelisted_antispam(self, message: Message):
-        res = await self.bot.db.fetchrow(
-            "SELECT users, channels FROM antispam WHERE guild_id = $1", message.guild.id
-        )
+        res = self.bot.guild_config.get("antispam", message.guild.id)
         if res["users"]:
             users = orjson.loads(res["users"])
             if message.author.id in users:
@@ -87,31 +91,13 @@ class Automod(Cog):
         return False
 
     def get_joins(self, member: Member) -> int:
-        if self.joins_cache.get(member.guild.id):
-            self.joins_cache[member.guild.id].append(
-                (datetime.datetime.now(), member.id)
-            )
-            to_remove = [
-                m
-                for m in self.joins_cache[member.guild.id]
-                if (datetime.datetime.now() - m[0]).total_seconds() > 5
-            ]
-
-            for r in to_remove:
-                self.joins_cache[member.guild.id].remove(r)
-
-        else:
-            self.joins_cache[member.guild.id] = [(datetime.datetime.now(), member.id)]
-
-        return len(self.joins_cache[member.guild.id])
+        return len(self.joins_cache.push(member.guild.id, member.id))
 
     @Cog.listener("on_guild_channel_delete")
     async def whitelisted_channel_delete(self, channel: abc.GuildChannel):
         if str(channel.type) == "text":
-            check = await self.bot.db.fetchval(
-                "SELECT channels FROM antispam WHERE guild_id = $1", channel.guild.id
-            )
-            if check:
+            check = await self.bot.guild_config.fetch("antispam", channel.guild.id)
+            if check and check["channels"]:
                 channels = orjson.loads(check["channels"])
                 if channel.id in channels:
                     channels.remove(channel.id)
@@ -124,21 +110,26 @@ class Automod(Cog):
     @Cog.listener("on_member_join")
     async def mass_join_event(self, member: Member):
         if member.guild.me.guild_permissions.administrator:
-            if rate := await self.bot.db.fetchval(
-                "SELECT rate FROM anti_join WHERE guild_id = $1", member.guild.id
-            ):
+            config = await self.bot.guild_config.fetch("anti_join", member.guild.id)
+            if config and (rate := config["rate"]):
                 joins = self.get_joins(member)
                 if joins > rate:
                     async with self.locks[member.guild.id]:
+                        window = self.joins_cache.get(member.guild.id)
+                        if not window or len(window) <= rate:
+                            # already handled while waiting for the lock
+                            return
+
+                        self.joins_cache.pop(member.guild.id)
+
                         tasks = [
                             member.guild.ban(
-                                user=Object(m[1]),
+                                user=Object(m.id),
                                 reason="Flagged by mass join protection",
                             )
-                            for m in self.joins_cache[member.guild.id]
+                            for m in window
                         ]
                         await asyncio.gather(*tasks)
-                        self.joins_cache = []
 
                         url = f"https://discord.com/api/v9/guilds/{member.guild.id}/incident-actions"
                         until = (
@@ -155,17 +146,18 @@ class Automod(Cog):
                             "invites_disabled_until": until,
                         }
 
-                        async with aiohttp.ClientSession(headers=headers) as cs:
-                            async with cs.put(url, json=data) as r:
-                                print(r.status)
+                        async with self.bot.session.request(
+                            "PUT", url, headers=headers, json=data
+                        ) as r:
+                            print(r.status)
 
-    @Cog.listener("on_message")
-    async def antispam_event(self, message: Message):
+    async def antispam_event(self, event: MessageEvent):
+        message = event.message
         if message.guild:
-            if not message.guild.chunked:
-                await message.guild.chunk(cache=True)
-            if isinstance(message.author, User):
+            if not event.is_member:
                 return
+            # the author and its roles come with the message
+            self.bot.chunker.ready(message.guild)
             if not message.author.guild_permissions.manage_guild:
                 if message.guild.me.guild_permissions.moderate_members:
                     if message.guild.me.top_role:
@@ -175,23 +167,27 @@ class Automod(Cog):
                     else:
                         return
 
-                    if check := await self.bot.db.fetchrow(
-                        "SELECT * FROM antispam WHERE guild_id = $1", message.guild.id
-                    ):
+                    if check := event.config("antispam"):
                         if not await self.whitelisted_antispam(message):
-                            messages = self.antispam_threshold(message)
-                            if len(messages) > check["rate"]:
+                            window = self.antispam_threshold(message)
+                            if self.is_spamming(message, window, check["rate"]):
                                 res = self.bot.cache.get(
                                     f"antispam-{message.author.id}"
                                 )
                                 if not res:
-                                    del self.spam_cache[message.guild.id][
-                                        message.author.id
-                                    ]
+                                    self.spam_cache.pop(
+                                        (message.guild.id, message.author.id)
+                                    )
                                     timeout = utils.utcnow() + datetime.timedelta(
                                         seconds=check["timeout"]
                                     )
-                                    await message.channel.delete_messages(messages)
+                                    for channel_id, ids in window.by_channel().items():
+                                        if channel := message.guild.get_channel(
+                                            channel_id
+                                        ):
+                                            await channel.delete_messages(
+                                                [Object(i) for i in ids]
+                                            )
                                     await message.author.timeout(
                                         timeout, reason="Flagged by the antispam"
                                     )
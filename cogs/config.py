@@ -115,8 +115,7 @@ class Config(Cog):
                     async with self.locks['autopfp_send']:
                         channel = self.bot.get_channel(int(row["channel_id"]))
                         if channel:
-                            if not channel.guild.chunked:
-                                await channel.guild.chunk(cache=True)
+                            self.bot.chunker.ready(channel.guild)
                             await channel.send(embed=Embed(title='New pfp', url=pfp).set_image(url=pfp).set_footer(text="Sent from greed ^^"))
 
     @autopfp_loop.before_loop
@@ -131,6 +130,7 @@ class Config(Cog):
     @has_guild_permissions(manage_guild = True)
     async def alias_add(self, ctx: PretendContext, *, args: Alias):
         await self.bot.db.execute("""INSERT INTO aliases (guild_id,alias,command_name) VALUES($1,$2,$3) ON CONFLICT (guild_id, alias) DO UPDATE SET command_name = excluded.command_name""", ctx.guild.id, args[1],args[0].qualified_name)
+        await self.bot.guild_config.refresh("aliases", ctx.guild.id)
         return await ctx.send_success(f"created the alias **{args[1]}** for **{args[0]}**")
 
     @alias.command(name = 'remove', aliases = ['del','d','rem','r'], brief = 'manage_guild')
@@ -138,6 +138,7 @@ class Config(Cog):
     async def alias_remove(self, ctx: PretendContext, *, args: Alias):
         command, alias = args
         await self.bot.db.execute("""DELETE FROM aliases WHERE guild_id = $1 AND alias = $2 AND command_name = $3""", ctx.guild.id, alias, command.qualified_name)
+        await self.bot.guild_config.refresh("aliases", ctx.guild.id)
         return await ctx.send_success(f"deleted alias **{alias}** for **{command}**")
 
     @alias.command(name = 'list', aliases = ['l'], brief = 'manage_guild')
@@ -257,6 +258,7 @@ class Config(Cog):
         await self.bot.db.execute(
             "INSERT INTO disablecmd VALUES ($1,$2)", ctx.guild.id, command
         )
+        await self.bot.guild_config.refresh("disablecmd", ctx.guild.id)
         return await ctx.send_success(f"Succesfully disabled **{command}**")
 
     @command(brief="manage server", aliases=["enablecommand"])
@@ -277,6 +279,7 @@ class Config(Cog):
             ctx.guild.id,
             command,
         )
+        await self.bot.guild_config.refresh("disablecmd", ctx.guild.id)
         return await ctx.send_success(f"Succesfully enabled **{command}**")
 
     @group(invoke_without_command=True)
@@ -775,6 +778,7 @@ class Config(Cog):
             await self.bot.db.execute(
                 "DELETE FROM selfprefix WHERE user_id = $1", ctx.author.id
             )
+            self.bot.prefixes.set_user(ctx.author.id, None)
             return await ctx.send_success("Self prefix removed")
         if len(prefix) > 7:
             raise BadArgument("Prefix is too long!")
@@ -790,6 +794,7 @@ class Config(Cog):
                 ctx.author.id,
             )
         finally:
+            self.bot.prefixes.set_user(ctx.author.id, prefix)
             return await ctx.send_success(
                 f"Self prefix now **configured** as `{prefix}`"
             )
@@ -809,6 +814,7 @@ class Config(Cog):
             await self.bot.db.execute(
                 "DELETE FROM prefixes WHERE guild_id = $1", ctx.guild.id
             )
+            await self.bot.guild_config.refresh("prefixes", ctx.guild.id)
             return await ctx.send_success("Guild prefix removed")
 
         if len(prefix) > 7:
@@ -825,6 +831,7 @@ class Config(Cog):
                 ctx.guild.id,
             )
         finally:
+            await self.bot.guild_config.refresh("prefixes", ctx.guild.id)
             return await ctx.send_success(
                 f"Guild prefix now **configured** as `{prefix}`"
             )
@@ -878,6 +885,7 @@ class Config(Cog):
                 ctx.guild.id,
                 role.id,
             )
+        await self.bot.guild_config.refresh("fake_perms", ctx.guild.id)
         return await ctx.send_success(
             f"Added `{permission}` to the {role.mention}'s fake permissions"
         )
@@ -916,6 +924,7 @@ class Config(Cog):
                 role.id,
             )
 
+        await self.bot.guild_config.refresh("fake_perms", ctx.guild.id)
         return await ctx.send_success(
             f"Removed `{permission}` from the {role.mention}'s fake permissions"
         )
@@ -254,12 +254,16 @@ class EconomyCog(commands.Cog):
         self.conn.commit()
         await self._send_embed(ctx, f"You gave :money_with_wings: **{amount}** to {recipient.display_name}.")
 
+    async def cog_load(self):
+        self.bot.pipeline.register("economy", self.on_message, dms=True)
+
     def cog_unload(self):
+        self.bot.pipeline.unregister("economy")
         self.cursor.close()
         self.conn.close()
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def on_message(self, event):
+        message = event.message
         if message.author.bot:
             return
     
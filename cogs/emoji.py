@@ -1,4 +1,4 @@
-import asyncio, aiohttp
+import asyncio
 import zipfile
 import datetime, discord, functools, io, unicodedata
 import emoji as emoji_lib
@@ -293,11 +293,10 @@ class Emoji(Cog):
                     chars.remove("fe0f")
                 url = "https://twemoji.maxcdn.com/2/svg/" + "-".join(chars) + ".svg"
                 convert = True
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        return await ctx.send_warning(f"[This is **not** an emoji]({url})")
-                    img = await resp.read()
+            async with self.bot.session.request("GET", url) as resp:
+                if resp.status != 200:
+                    return await ctx.send_warning(f"[This is **not** an emoji]({url})")
+                img = await resp.read()
             if convert:
                 task = functools.partial(generate, img)
                 task = self.bot.loop.run_in_executor(None, task)
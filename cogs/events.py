@@ -11,6 +11,7 @@ from discord.ext.commands import (
 
 from tools.bot import Pretend
 from tools.helpers import PretendContext
+from tools.handlers.embedbuilder import ValidEmbedScript
 from tools.predicates import query_limit
 
 
@@ -77,7 +78,7 @@ class Events(Cog):
     @has_guild_permissions(manage_guild=True)
     @query_limit("welcome")
     async def welcome_add(
-        self, ctx: PretendContext, channel: TextChannel, *, code: str
+        self, ctx: PretendContext, channel: TextChannel, *, code: ValidEmbedScript
     ):
         """add a welcome message to the server"""
         args = (
@@ -201,7 +202,9 @@ class Events(Cog):
     @leave.command(name="add", brief="manage guild")
     @has_guild_permissions(manage_guild=True)
     @query_limit("leave")
-    async def leave_add(self, ctx: PretendContext, channel: TextChannel, *, code: str):
+    async def leave_add(
+        self, ctx: PretendContext, channel: TextChannel, *, code: ValidEmbedScript
+    ):
         """add a leave message to the server"""
         check = await self.bot.db.fetchrow(
             "SELECT * FROM leave WHERE channel_id = $1", channel.id
@@ -327,7 +330,9 @@ class Events(Cog):
     @boost.command(name="add", brief="manage guild")
     @has_guild_permissions(manage_guild=True)
     @query_limit("boost")
-    async def boost_add(self, ctx: PretendContext, channel: TextChannel, *, code: str):
+    async def boost_add(
+        self, ctx: PretendContext, channel: TextChannel, *, code: ValidEmbedScript
+    ):
         """add a boost message to the server"""
         check = await self.bot.db.fetchrow(
             "SELECT * FROM boost WHERE channel_id = $1", channel.id
@@ -453,7 +458,7 @@ class Events(Cog):
     @has_permissions(manage_guild=True)
     @query_limit("autoping")
     async def autoping_add(
-        self, ctx: PretendContext, channel: TextChannel, *, code: str
+        self, ctx: PretendContext, channel: TextChannel, *, code: ValidEmbedScript
     ):
         """add a ping message to the server"""
         check = await self.bot.db.fetchrow(
@@ -607,7 +612,7 @@ class Events(Cog):
     @joindm.command(name="set", brief="manage guild")
     @has_permissions(manage_guild=True)
     @query_limit("joindm")
-    async def joindm_set(self, ctx: PretendContext, *, code: str):
+    async def joindm_set(self, ctx: PretendContext, *, code: ValidEmbedScript):
         """set the join dm message for the server"""
         check = await self.bot.db.fetchrow(
             "SELECT * FROM joindm WHERE guild_id = $1", ctx.guild.id
@@ -843,7 +843,7 @@ class Fun(Cog):
             url = url_or_member.display_avatar.url
         else:
             url = url_or_member
-        caption_image = await Caption('impact.ttf').create_captioned_image(url, text)
+        caption_image = await Caption('impact.ttf', self.bot.media).create_captioned_image(url, text)
         await ctx.send(file=discord.File(caption_image, filename="caption.png"))
         
 
@@ -3,14 +3,16 @@ import asyncio
 import datetime
 
 from io import BytesIO
+from typing import Dict, Optional
 
 from tools.predicates import has_perks, lastfm_user_exists
 from tools.handlers.lastfmhandler import Spotify, Handler
 from tools.validators import ValidLastFmName
 from tools.helpers import PretendContext
 from tools.bot import Pretend
+from tools.pipeline import MessageEvent
 
-from discord import Message, Embed, User, Member, File
+from discord import Embed, User, Member, File
 from discord.ext.commands import Cog, group, MissingRequiredArgument, Author, command
 
 class Lastfm(Cog):
@@ -20,6 +22,43 @@ class Lastfm(Cog):
         self.description = "Last.Fm Integration commands"
         self.lastfmhandler = Handler("43693facbb24d1ac893a7d33846b15cc")
         self.spotify = Spotify(self.bot)
+        self.customcmds: Dict[int, str] = {}
+
+    async def cog_load(self) -> None:
+        results = await self.bot.db.fetch(
+            "SELECT user_id, customcmd FROM lastfm WHERE customcmd IS NOT NULL"
+        )
+        self.customcmds = {r["user_id"]: r["customcmd"] for r in results}
+        self.bot.ipc.register("lastfm_customcmd", self.on_customcmd)
+        self.bot.pipeline.register(
+            "lastfm", self.on_message, feature=self.is_customcmd
+        )
+
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.unregister("lastfm")
+        self.bot.ipc.unregister("lastfm_customcmd")
+
+    def is_customcmd(self, event: MessageEvent) -> bool:
+        return self.customcmds.get(event.author.id) == event.content
+
+    def apply_customcmd(self, user_id: int, cmd: Optional[str]) -> None:
+        if cmd:
+            self.customcmds[user_id] = cmd
+        else:
+            self.customcmds.pop(user_id, None)
+
+    async def set_customcmd(self, user_id: int, cmd: Optional[str]) -> None:
+        """
+        Apply a custom command change on every cluster
+        """
+
+        self.apply_customcmd(user_id, cmd)
+        await self.bot.ipc.broadcast(
+            "lastfm_customcmd", {"user_id": user_id, "cmd": cmd}
+        )
+
+    async def on_customcmd(self, data: dict) -> None:
+        self.apply_customcmd(data["user_id"], data["cmd"])
 
     async def lastfm_replacement(self, user: str, params: str) -> str:
         a = await self.lastfmhandler.get_tracks_recent(user, 1)
@@ -84,19 +123,13 @@ class Lastfm(Cog):
 
         return params
 
-    @Cog.listener()
-    async def on_message(self, message: Message):
-        if message.guild:
-            if not message.author.bot:
-                if check := await self.bot.db.fetchrow(
-                    "SELECT * FROM lastfm WHERE user_id = $1 AND customcmd = $2",
-                    message.author.id,
-                    message.content,
-                ):
-                    ctx = await self.bot.get_context(message)
-                    return await ctx.invoke(
-                        self.bot.get_command("nowplaying"), member=message.author
-                    )
+    async def on_message(self, event: MessageEvent):
+        # only runs for the author's custom command, see is_customcmd
+        message = event.message
+        ctx = await self.bot.get_context(message)
+        return await ctx.invoke(
+            self.bot.get_command("nowplaying"), member=message.author
+        )
 
     @group(invoke_without_command=True, aliases=["lf"])
     async def lastfm(self, ctx: PretendContext):
@@ -158,6 +191,8 @@ class Lastfm(Cog):
         await self.bot.db.execute(
             "DELETE FROM lastfm WHERE user_id = $1", ctx.author.id
         )
+        if ctx.author.id in self.customcmds:
+            await self.set_customcmd(ctx.author.id, None)
         return await ctx.lastfm_send("Removed your **Last.Fm** account")
 
     @lastfm.command(name="customcommand", aliases=["cc"])
@@ -182,11 +217,13 @@ class Lastfm(Cog):
                     None,
                     ctx.author.id,
                 )
+                await self.set_customcmd(ctx.author.id, None)
                 return await ctx.lastfm_send("Removed your **Last.Fm** custom command")
 
         await self.bot.db.execute(
             "UPDATE lastfm SET customcmd = $1 WHERE user_id = $2", cmd, ctx.author.id
         )
+        await self.set_customcmd(ctx.author.id, cmd)
         return await ctx.lastfm_send(f"You **Last.Fm** custom command set to: {cmd}")
 
     @lastfm.command(name="variables")
@@ -9,9 +9,15 @@ class Leaderboard(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = Database('/home/ubuntu/greedrecodetotallynotpretend/leaderboard.db')
+
+    async def cog_load(self):
+        self.bot.pipeline.register("leaderboard", self.on_message)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister("leaderboard")
         
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def on_message(self, event):
+        message = event.message
         if message.author.bot:
             return
 
@@ -5,17 +5,19 @@ from discord.ext.commands import (
     Cog,
     hybrid_group,
     hybrid_command,
-    CooldownMapping,
     BucketType,
     Author,
     has_guild_permissions,
 )
+from discord.ext import tasks
 
 from typing import Optional
-from collections import defaultdict
 
 from tools.bot import Pretend
+from tools.pipeline import MessageEvent
+from tools.leveling import LevelEngine, LevelState
 from tools.helpers import PretendContext
+from tools.handlers.embedbuilder import ValidEmbedScript
 from tools.predicates import leveling_enabled
 from tools.converters import LevelMember, NewRoleConverter
 
@@ -24,19 +26,32 @@ class Leveling(Cog):
     def __init__(self, bot: Pretend):
         self.bot = bot
         self.description = "Leveling commands"
-        self.levelcd = CooldownMapping.from_cooldown(3, 3, BucketType.member)
-        self.locks = defaultdict(asyncio.Lock)
+        self.levelcd = bot.ratelimiter.limit("leveling", 3, 3, BucketType.member)
+        self.engine = LevelEngine(bot)
+
+    async def cog_load(self) -> None:
+        self.bot.pipeline.register("leveling", self.on_message, feature="leveling")
+        self.flush_xp.start()
+
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.unregister("leveling")
+        self.flush_xp.cancel()
+        await self.engine.flush()
+
+    @tasks.loop(seconds=10)
+    async def flush_xp(self):
+        await self.engine.flush()
+        self.engine.evict()
 
     async def level_replace(self, member: Member, params: str):
         """
         replace variables for leveling system
         """
 
-        check = await self.bot.db.fetchrow(
-            "SELECT * FROM level_user WHERE guild_id = $1 AND user_id = $2",
-            member.guild.id,
-            member.id,
-        )
+        check = await self.engine.get(member.guild.id, member.id)
+        return self.format_level(check, params)
+
+    def format_level(self, check: LevelState, params: str) -> str:
         if "{level}" in params:
             params = params.replace("{level}", str(check["level"]))
 
@@ -45,13 +60,12 @@ class Leveling(Cog):
 
         return params
 
-    def get_cooldown(self, message: Message) -> Optional[int]:
+    def get_cooldown(self, message: Message) -> Optional[float]:
         """
         this prevents leveling up by spamming
         """
 
-        bucket = self.levelcd.get_bucket(message)
-        return bucket.update_rate_limit()
+        return self.levelcd.hit(message)
 
     async def give_rewards(self, member: Member, level: int):
         """
@@ -74,97 +88,28 @@ class Leveling(Cog):
             ]
             await asyncio.gather(*tasks)
 
-    @Cog.listener()
-    async def on_message(self, message: Message):
-        if not message.author.bot:
-            if res := await self.bot.db.fetchrow(
-                "SELECT * FROM leveling WHERE guild_id = $1", message.guild.id
-            ):
-                if not self.get_cooldown(message):
-                    async with self.locks[message.author.id]:
-                        check = await self.bot.db.fetchrow(
-                            """
-                SELECT * FROM level_user
-                WHERE guild_id = $1
-                AND user_id = $2
-                """,
-                            message.guild.id,
-                            message.author.id,
-                        )
-
-                        if not check:
-                            if res["booster_boost"] and message.author.premium_since:
-                                xp = 6
-                            else:
-                                xp = 4
-
-                            await self.bot.db.execute(
-                                """
-                    INSERT INTO level_user VALUES ($1,$2,$3,$4,$5)
-                    """,
-                                message.guild.id,
-                                message.author.id,
-                                xp,
-                                0,
-                                int((100 * 1) ** 0.9),
-                            )
-
-                            target_xp = 100
-                        else:
-                            if res["booster_boost"] and message.author.premium_since:
-                                xp = check["xp"] + 6
-                            else:
-                                xp = check["xp"] + 4
-
-                            target_xp = check["target_xp"]
-
-                            await self.bot.db.execute(
-                                """
-                  UPDATE level_user
-                  SET xp = $1
-                  WHERE user_id = $2
-                  AND guild_id = $3
-                  """,
-                                xp,
-                                message.author.id,
-                                message.guild.id,
-                            )
-
-                            await self.give_rewards(message.author, check["level"])
-
-                        if xp >= target_xp:
-                            level = check["level"] + 1
-                            target_xp = int((100 * level + 1) ** 0.9)
-                            xp = 0
-                            await self.bot.db.execute(
-                                """
-                  UPDATE level_user
-                  SET target_xp = $1,
-                  xp = $2,
-                  level = $3
-                  WHERE user_id = $4
-                  AND guild_id = $5
-                  """,
-                                target_xp,
-                                xp,
-                                level,
-                                message.author.id,
-                                message.guild.id,
-                            )
-
-                            channel = (
-                                message.guild.get_channel(res["channel_id"])
-                                or message.channel
-                            )
-                            mes = res["message"]
-
-                            x = await self.bot.embed_build.alt_convert(
-                                message.author,
-                                await self.level_replace(message.author, mes),
-                            )
-
-                            await channel.send(**x)
-                            await self.give_rewards(message.author, level)
+    async def on_message(self, event: MessageEvent):
+        message = event.message
+        res = event.config("leveling")
+        if self.get_cooldown(message):
+            return
+
+        if res["booster_boost"] and message.author.premium_since:
+            xp = 6
+        else:
+            xp = 4
+
+        state, leveled, first = await self.engine.add_xp(message.author, xp)
+
+        if leveled:
+            channel = message.guild.get_channel(res["channel_id"]) or message.channel
+            x = await self.bot.embed_build.alt_convert(
+                message.author, self.format_level(state, res["message"])
+            )
+            await channel.send(**x)
+
+        if leveled or first:
+            await self.give_rewards(message.author, state.level)
 
     @Cog.listener()
     async def on_guild_role_delete(self, role: Role):
@@ -186,15 +131,7 @@ class Leveling(Cog):
         get the rank of a member
         """
 
-        level = await self.bot.db.fetchrow(
-            """
-        SELECT * FROM level_user
-        WHERE guild_id = $1
-        AND user_id = $2
-        """,
-            ctx.guild.id,
-            member.id,
-        )
+        level = await self.engine.get(ctx.guild.id, member.id)
         if not level:
             return await ctx.send_warning("This member doesn't have a rank recorded")
 
@@ -268,6 +205,7 @@ class Leveling(Cog):
             await interaction.client.db.execute(
                 "DELETE FROM leveling WHERE guild_id = $1", interaction.guild.id
             )
+            self.engine.forget(interaction.guild.id)
             await interaction.client.db.execute(
                 "DELETE FROM level_user WHERE guild_id = $1", interaction.guild.id
             )
@@ -335,7 +273,7 @@ class Leveling(Cog):
         self,
         ctx: PretendContext,
         *,
-        message: str = "Good job, {user}! You leveled up to **Level {level}**",
+        message: ValidEmbedScript = "Good job, {user}! You leveled up to **Level {level}**",
     ):
         """
         set a custom level up message
@@ -449,11 +387,8 @@ class Leveling(Cog):
         if level < 1:
             return await ctx.send_error("The level cannot be **lower** than 0")
 
-        if await self.bot.db.fetchrow(
-            "SELECT * FROM level_user WHERE guild_id = $1 AND user_id = $2",
-            ctx.guild.id,
-            member.id,
-        ):
+        await self.engine.flush()
+        if await self.engine.get(ctx.guild.id, member.id):
             await self.bot.db.execute(
                 """
           UPDATE level_user
@@ -482,6 +417,7 @@ class Leveling(Cog):
                 int((100 * level + 1) ** 0.9),
             )
 
+        self.engine.set(ctx.guild.id, member.id, level)
         await ctx.send_success(
             f"Set the level for {member.mention} to **Level {level}**"
         )
@@ -501,6 +437,7 @@ class Leveling(Cog):
         if member is None:
 
             async def yes_callback(interaction: Interaction):
+                self.engine.forget(interaction.guild.id)
                 await interaction.client.db.execute(
                     "DELETE FROM level_user WHERE guild_id = $1", interaction.guild.id
                 )
@@ -517,6 +454,7 @@ class Leveling(Cog):
             member = await LevelMember().convert(ctx, str(member.id))
 
             async def yes_callback(interaction: Interaction):
+                self.engine.forget(interaction.guild.id, member.id)
                 await interaction.client.db.execute(
                     "DELETE FROM level_user WHERE guild_id = $1 AND user_id = $2",
                     interaction.guild.id,
@@ -541,6 +479,7 @@ class Leveling(Cog):
         returns a top leaderboard for leveling
         """
 
+        await self.engine.flush()
         results = await self.bot.db.fetch(
             "SELECT * FROM level_user WHERE guild_id = $1", ctx.guild.id
         )
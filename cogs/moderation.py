@@ -13,7 +13,8 @@ from discord import (
     User,
     Object,
     Role,
-    Thread
+    Thread,
+    Guild,
 )
 from discord.ext.commands import (
     Cog,
@@ -27,7 +28,7 @@ from discord.ext.commands import (
 from discord.abc import GuildChannel
 from tools.handlers.logs import ctx_to_log_data
 
-from typing import Union, Optional
+from typing import List, Union, Optional
 from collections import defaultdict
 from humanfriendly import format_timespan
 
@@ -46,6 +47,12 @@ class Moderation(Cog):
         self.locks = defaultdict(asyncio.Lock)
         self.role_lock = defaultdict(asyncio.Lock)
 
+    async def cog_load(self) -> None:
+        self.bot.joins.register("jail", self.on_jailed_join, feature="jail")
+
+    async def cog_unload(self) -> None:
+        self.bot.joins.unregister("jail")
+
     async def punish_a_bitch(
         self: "Moderation",
         module: str,
@@ -70,11 +77,12 @@ class Moderation(Cog):
                             return
 
                     if self.bot.an.check_hieracy(member, member.guild.me):
-                        cache = self.bot.cache.get(f"{module}-{member.guild.id}")
-                        if not cache:
-                            await self.bot.cache.set(
-                                f"{module}-{member.guild.id}", True, 5
-                            )
+                        with self.bot.an.engine.claim(
+                            member.guild.id, member.id
+                        ) as claimed:
+                            if not claimed:
+                                return
+
                             tasks = [
                                 await self.bot.an.decide_punishment(
                                     module, member, reason
@@ -106,18 +114,27 @@ class Moderation(Cog):
                     reason="overwriting permissions for jail role",
                 )
 
-    @Cog.listener()
-    async def on_member_join(self, member: Member):
-        if await self.bot.db.fetchrow(
-            "SELECT * FROM jail_members WHERE guild_id = $1 AND user_id = $2",
-            member.guild.id,
-            member.id,
-        ):
-            if re := await self.bot.db.fetchrow(
-                "SELECT role_id FROM jail WHERE guild_id = $1", member.guild.id
-            ):
-                if role := member.guild.get_role(re[0]):
-                    await member.add_roles(role, reason="member jailed")
+    async def on_jailed_join(self, guild: Guild, members: List[Member]):
+        row = self.bot.guild_config.get("jail", guild.id)
+        if not row or not row["role_id"]:
+            return
+
+        if not (role := guild.get_role(int(row["role_id"]))):
+            return
+
+        results = await self.bot.db.fetch(
+            "SELECT user_id FROM jail_members WHERE guild_id = $1 AND user_id = ANY($2::BIGINT[])",
+            guild.id,
+            [m.id for m in members],
+        )
+        jailed = {r["user_id"] for r in results}
+        await asyncio.gather(
+            *(
+                self.bot.joins.add_roles(member, role, reason="member jailed")
+                for member in members
+                if member.id in jailed
+            )
+        )
 
     @Cog.listener()
     async def on_member_remove(self, member: Member):
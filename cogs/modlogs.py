@@ -3,7 +3,7 @@ import discord
 from discord import ExpiringDictionary
 from asyncio import sleep, ensure_future
 from tools.handlers.logs import Logs, get_embed, get_username
-from typing import Optional, Any, Union
+from typing import List, Optional, Any, Union
 from tools.bot import Pretend
 from tools.helpers import PretendContext
 from pydantic import BaseModel
@@ -41,6 +41,18 @@ def human_readable_timedelta(delta):
     else:
         return format_unit(seconds, "SEC")
     
+def log_embed(
+    bot: Pretend,
+    log_type: str,
+    user: discord.abc.User,
+    message: str = None,
+    footer: str = None,
+) -> discord.Embed:
+    embed = discord.Embed(title = "Mod Logs", description = f"`{log_type}` {user.name} **{message}**", color = bot.color)
+    if footer != None:
+        embed.set_footer(text = footer)
+    return embed
+
 async def log_event(
     bot: Pretend,
     log_type: dict,
@@ -53,10 +65,8 @@ async def log_event(
     if channel is None:
         return
 
-    embed = discord.Embed(title = "Mod Logs", description = f"`{log_type['type']}` {user.name} **{message}**", color = bot.color)
-    if footer != None:
-        embed.set_footer(text = footer)
-    if await bot.ratelimiter.ratelimit(f"logs:{channel.guild.id}", 2, 5) != False:
+    embed = log_embed(bot, log_type['type'], user, message, footer)
+    if bot.ratelimiter.window(f"logs:{channel.guild.id}", 1, 5):
         await sleep(5)
     await channel.send(channel, embed=embed)
 
@@ -67,7 +77,13 @@ class LogStatus(BaseModel):
 class ModLogs(commands.Cog):
     def __init__(self, bot: Pretend):
         self.bot = bot
-        self.invites = {}
+        self.invites = bot.invite_tracker
+
+    async def cog_load(self) -> None:
+        self.bot.joins.register("modlogs", self.on_member_joins, feature="modlogs")
+
+    async def cog_unload(self) -> None:
+        self.bot.joins.unregister("modlogs")
 
     @commands.Cog.listener('on_ready')
     async def cache_all(self):
@@ -75,8 +91,9 @@ class ModLogs(commands.Cog):
 
     async def set_all_invites(self):
         for guild_id in await self.bot.db.fetch("""SELECT guild_id FROM modlogs"""):
-            if guild := self.bot.get_guild(int(guild_id.guild_id)):
-                await self.set_guild_invites(guild)
+            guild = self.bot.get_guild(int(guild_id.guild_id))
+            if guild and not self.invites.tracked(guild.id):
+                await self.invites.load(guild)
 
 
     async def check_logs(self, guild: Union[discord.Guild, int]) -> LogStatus:
@@ -84,7 +101,7 @@ class ModLogs(commands.Cog):
             g = guild.id
         else:
             g = guild
-        data = await self.bot.db.fetchrow("""SELECT channel_id FROM modlogs WHERE guild_id = $1""", g)
+        data = await self.bot.guild_config.fetch("modlogs", g)
         if not data:
             data = {'enabled': False, 'channel_id': None}
         else:
@@ -94,26 +111,24 @@ class ModLogs(commands.Cog):
         return LogStatus(**data)
     
     async def send(self, channel: discord.TextChannel, **kwargs):
-        if await self.bot.ratelimiter.ratelimit(f"logs:{channel.guild.id}", 2, 5) != False:
+        if self.bot.ratelimiter.window(f"logs:{channel.guild.id}", 1, 5):
             await sleep(5)
  #       if channel.guild.id == 1203397622325583944:
 #            await (self.bot.get_channel(1203397624024137760)).send(f"sending mod log for {kwargs['embed'].description}")
         return await channel.send(**kwargs)
     
-    @commands.Cog.listener()
-    async def on_member_join(self, member: discord.Member):
-        log_type = 'rejoin' if member.flags.did_rejoin else 'join'
-        log_status = await self.check_logs(member.guild)
-        if log_status.enabled == False:
-            return
-        if log_status.channel_id == None:
+    async def on_member_joins(self, guild: discord.Guild, members: List[discord.Member]):
+        log_status = await self.check_logs(guild)
+        channel = guild.get_channel(log_status.channel_id)
+        if channel is None:
             return
 
-        try:
-            message, footer = await self.guild_invite_compare(member.guild)
-        except:
-            return
-        await self.log_join_part(channel_id = log_status.channel_id, log_type=log_type, member=member, message=message, footer=footer)
+        message, footer = await self.guild_invite_compare(guild, len(members))
+
+        for member in members:
+            log_type = 'rejoin' if member.flags.did_rejoin else 'join'
+            embed = log_embed(self.bot, log_type, member, message, footer)
+            self.bot.joins.outbox.send(channel, embed=embed)
 
 #    @commands.Cog.listener()
  #   async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
@@ -126,44 +141,22 @@ class ModLogs(commands.Cog):
 
 #        await self.log_join_part(channel_id = log_status.channel_id, log_type=log_type, member=payload.user)
 
-    async def set_guild_invites(self, guild: discord.Guild):
-        self.invites[guild.id] = await guild.invites()
-        return True
-    
-    async def add_invite(self, invite: discord.Invite):
-        if invite.guild.id in self.invites:
-            self.invites[invite.guild.id].append(invite)
-            return True
-        return False
-    
-    async def remove_invite(self, invite: discord.Invite) -> bool:
-        if invite.guild.id in self.invites:
-            self.invites[invite.guild.id].remove(invite)
-            return True
-        return False
-    
 
     async def set_log_state(self, ctx: PretendContext, state: bool, channel: Optional[discord.abc.GuildChannel] = None):
         if channel == None:
             if state == True:
                 return await ctx.send_warning(f"a channel is required")
             else:
-                try:
-                    self.invites.pop(ctx.guild.id)
-                except:
-                    pass
+                self.invites.forget(ctx.guild.id)
                 await self.bot.db.execute("""DELETE FROM modlogs WHERE guild_id = $1""", ctx.guild.id)
                 return await ctx.send_success(f"mod logs are now **disabled**")
         else:
             if state == True:
                 await self.bot.db.execute("""INSERT INTO modlogs (guild_id, channel_id) VALUES ($1, $2) ON CONFLICT(guild_id) DO UPDATE SET channel_id = excluded.channel_id""", ctx.guild.id, channel.id)
-                ensure_future(self.set_guild_invites(ctx.guild))
+                ensure_future(self.invites.load(ctx.guild))
                 return await ctx.send_success(f"mod logs are now **enabled**")
             else:
-                try:
-                    self.invites.pop(ctx.guild.id)
-                except:
-                    pass
+                self.invites.forget(ctx.guild.id)
                 await self.bot.db.execute("""DELETE FROM modlogs WHERE guild_id = $1 AND channel_id = $2""", ctx.guild.id, channel.id)
                 return await ctx.send_success(f"mod logs are now **disabled**")
             
@@ -184,11 +177,11 @@ class ModLogs(commands.Cog):
 
     @commands.Cog.listener()
     async def on_invite_create(self, invite: discord.Invite):
-        return await self.add_invite(invite)
+        self.invites.invite_create(invite)
 
     @commands.Cog.listener()
     async def on_invite_delete(self, invite: discord.Invite):
-        await self.remove_invite(invite)
+        self.invites.invite_delete(invite)
 
     async def log_join_part(self, channel_id: int, log_type: str, member: discord.User, message: str = None, footer: str = None):
         await log_event(
@@ -199,31 +192,12 @@ class ModLogs(commands.Cog):
             footer = footer
         )
 
-    async def guild_invite_compare(self, guild: discord.Guild):
-        # What if the invite is the last invite - is it deleted and cal on_invite_delete?
-        message, footer = None, None
-        before_invites = self.invites.get(guild.id, None)
-        if before_invites == None:
-            await self.set_guild_invites(guild = guild)
-            return None
-        before_dict = {invite.code: invite.uses for invite in before_invites}
-
-        try:
-            after_invites = await guild.invites()
-        except discord.Forbidden:
-            after_invites = []
-
-        if after_invites:
-            self.invites[guild.id] = after_invites
-
-            for after in after_invites:
-                before_uses = before_dict.get(after.code)
-                if before_uses is not None and before_uses < after.uses:
-                    message = f'Invited by: {after.inviter.mention} `{after.inviter}`'
-                    footer = f'Invite: {after.code}'
-                    break
+    async def guild_invite_compare(self, guild: discord.Guild, joins: int = 1):
+        # joins close together share one invites fetch, see InviteTracker
+        if invite := await self.invites.attribute(guild, joins):
+            return f'Invited by: {invite.mention} `{invite.inviter}`', f'Invite: {invite.code}'
 
-        return message, footer
+        return None, None
     
     @commands.Cog.listener('on_user_update')
     async def username_change(self, before: discord.User, after: discord.User):
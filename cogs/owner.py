@@ -4,13 +4,14 @@ import random
 import string, psutil
 import discord
 import asyncio
+import asyncpg
 import datetime
 import importlib
 
 from discord import User, Member, Guild
 from discord.ext.commands import Cog, command, is_owner, group
 from discord.ext import tasks
-from typing import Union
+from typing import List, Union
 from jishaku.codeblocks import codeblock_converter
 import requests
 
@@ -47,6 +48,29 @@ class Owner(Cog):
         self.shard_stats.start()
         self.change_status.start()
 
+    async def cog_load(self) -> None:
+        self.bot.ipc.register("reload", self.reload_remote)
+        self.bot.joins.register("globalban", self.on_globalban_join)
+
+    async def cog_unload(self) -> None:
+        self.bot.ipc.unregister("reload")
+        self.bot.joins.unregister("globalban")
+
+    async def reload_remote(self, module: str) -> list:
+        """reload a module asked by another cluster"""
+        if module == "~":
+            modules = list(self.bot.extensions)
+        else:
+            modules = [module.replace("%", "cogs").replace("!", "tools").strip()]
+
+        for name in modules:
+            if name.startswith("cogs"):
+                await self.bot.reload_extension(name)
+            else:
+                importlib.reload(importlib.import_module(name))
+
+        return modules
+
     @tasks.loop(seconds=10)
     async def shard_stats(self):
         import orjson
@@ -63,6 +87,11 @@ class Owner(Cog):
                 "shard_user_count": f"{users:,}",
                 "shard_guilds": [str(g.id) for g in guilds],
             }
+
+        # every cluster only knows its own shards
+        if self.bot.clusters > 1 and (current := await self.bot.redis.get("shards")):
+            shards = {**orjson.loads(current), **shards}
+
         await self.bot.redis.set("shards", orjson.dumps(shards))
 
     async def add_donor_role(self, member: User):
@@ -81,14 +110,18 @@ class Owner(Cog):
             role = guild.get_role(1225578947442507897)
             await user.remove_roles(role, reason="member got donator perks")
 
-    @Cog.listener()
-    async def on_member_join(self, member: Member):
-        reason = await self.bot.db.fetchval(
-            "SELECT reason FROM globalban WHERE user_id = $1", member.id
+    async def on_globalban_join(self, guild: Guild, members: List[Member]):
+        if not guild.me.guild_permissions.ban_members:
+            return
+
+        results = await self.bot.db.fetch(
+            "SELECT user_id, reason FROM globalban WHERE user_id = ANY($1::BIGINT[])",
+            [m.id for m in members],
         )
-        if reason:
-            if member.guild.me.guild_permissions.ban_members:
-                await member.ban(reason=reason)
+        reasons = {r["user_id"]: r["reason"] for r in results}
+        for member in members:
+            if member.id in reasons:
+                await member.ban(reason=reasons[member.id])
 
     @command(
         name="reload",
@@ -105,6 +138,9 @@ class Owner(Cog):
             os.system("git pull")
             module = module.replace(" --pull", "")
 
+        if self.bot.clusters > 1:
+            await self.bot.ipc.broadcast("reload", module)
+
         if module == "~":
             for module in list(self.bot.extensions):
                 try:
@@ -150,7 +186,7 @@ class Owner(Cog):
     async def change_status(self):
         total_members = sum(guild.member_count for guild in self.bot.guilds)
         total_guilds = len(self.bot.guilds)
-        shard_count = 3
+        shard_count = self.bot.shard_count
 
         status_messages = [
             f"{total_members} users",
@@ -193,14 +229,6 @@ class Owner(Cog):
                         "DELETE FROM donor WHERE user_id = $1", before.id
                     )
 
-    @Cog.listener()
-    async def on_guild_join(self, guild: Guild):
-        check = await self.bot.db.fetchrow(
-            "SELECT * FROM blacklist WHERE id = $1 AND type = $2", guild.id, "server"
-        )
-        if check:
-            await guild.leave()
-
     @command(aliases=["py"])
     @is_owner()
     async def eval(self, ctx: PretendContext, *, argument: codeblock_converter):
@@ -272,6 +300,19 @@ class Owner(Cog):
             f"{member.mention} is the **new** antinuke owner for **{guild.name}**"
         )
 
+    @command()
+    @is_owner()
+    async def clusters(self, ctx: PretendContext):
+        """the guilds, users and latency of every cluster"""
+        stats = await self.bot.ipc.request("stats")
+        return await ctx.paginate(
+            [
+                f"cluster **{c}** (shards {', '.join(map(str, s['shards']))}) - {s['guilds']:,} guilds, {s['users']:,} users, {s['latency']}ms"
+                for c, s in stats.items()
+            ],
+            f"clusters ({len(stats)}/{self.bot.clusters})",
+        )
+
     @command()
     @is_owner()
     async def guilds(self, ctx: PretendContext):
@@ -457,11 +498,14 @@ class Owner(Cog):
             await self.bot.db.execute(
                 "INSERT INTO blacklist VALUES ($1,$2)", user.id, "user"
             )
-            return await ctx.send_success(f"Blacklisted {user.mention} from greed")
-        except:
+        except asyncpg.UniqueViolationError:
             await self.bot.db.execute("DELETE FROM blacklist WHERE id = $1", user.id)
+            await self.bot.blacklist.set(user.id, "user", False)
             return await ctx.send_success(f"Unblacklisted {user.mention} from greed")
 
+        await self.bot.blacklist.set(user.id, "user", True)
+        return await ctx.send_success(f"Blacklisted {user.mention} from greed")
+
     @blacklist.command(name="server")
     @bot_owner()
     async def blacklist_server(self, ctx: PretendContext, *, server_id: int):
@@ -473,18 +517,19 @@ class Owner(Cog):
             await self.bot.db.execute(
                 "INSERT INTO blacklist VALUES ($1,$2)", server_id, "server"
             )
-            guild = self.bot.get_guild(server_id)
-            if guild:
-                await guild.leave()
-            return await ctx.send_success(
-                f"Blacklisted server {server_id} from greed"
-            )
-        except:
+        except asyncpg.UniqueViolationError:
             await self.bot.db.execute("DELETE FROM blacklist WHERE id = $1", server_id)
+            await self.bot.blacklist.set(server_id, "server", False)
             return await ctx.send_success(
                 f"Unblacklisted server {server_id} from greed"
             )
 
+        await self.bot.blacklist.set(server_id, "server", True)
+        guild = self.bot.get_guild(server_id)
+        if guild:
+            await guild.leave()
+        return await ctx.send_success(f"Blacklisted server {server_id} from greed")
+
 
 async def setup(bot: Pretend) -> None:
     await bot.add_cog(Owner(bot))
@@ -113,8 +113,7 @@ class Presence(commands.Cog):
 	async def write_usage(self, member: Member, before: Member, after: Member):
 		async with self.locks['screentime']:
 			if hasattr(self.bot, "redis") and self.bot.user.name == "rival":
-				check=await self.bot.redis.ratelimited(f"st{member.id}",1,10,1)
-				if check == True: return
+				if await self.bot.ratelimiter.shared(f"st:{member.id}",1,10): return
 				online=0
 				offline=0
 				idle=0
@@ -157,7 +156,7 @@ class Presence(commands.Cog):
 			try:
 				if member := self.bot.get_user(m):
 					if hasattr(self.bot, "redis") and self.bot.user.name == "rival":
-						if await self.bot.redis.ratelimited(f'sc{member.id}',1,30,1) != True:
+						if not await self.bot.ratelimiter.shared(f'sc:{member.id}',1,30):
 							if member:
 								await self.write_usage(member, member, member)
 					else:
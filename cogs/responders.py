@@ -1,10 +1,11 @@
 import re
 import json as orjson
 
-from discord.ext.commands import Cog, group, has_guild_permissions
+from discord.ext.commands import BadArgument, Cog, group, has_guild_permissions
 
 from tools.bot import Pretend
 from tools.helpers import PretendContext
+from tools.validators import ValidAutoreact
 
 
 class Responders(Cog):
@@ -52,7 +53,8 @@ class Responders(Cog):
         reactions = [
             c.strip()
             for c in con[1].split(" ")
-            if custom_regex.match(c) or unicode_regex.match(c)
+            if (custom_regex.match(c) or unicode_regex.match(c))
+            and await ValidAutoreact().convert(ctx, c.strip())
         ]
 
         if len(reactions) == 0:
@@ -147,6 +149,10 @@ class Responders(Cog):
             return await ctx.send_warning("No trigger found")
 
         resp = responses[1].strip()
+        try:
+            self.bot.embed_build.compile(resp)
+        except BadArgument as e:
+            return await ctx.send_warning(e.args[0])
 
         check = await self.bot.db.fetchrow(
             "SELECT * FROM autoresponder WHERE guild_id = $1 AND trigger = $2",
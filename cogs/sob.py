@@ -9,6 +9,12 @@ class sobCog(commands.Cog):
         self.file_path = "/home/ubuntu/greedrecodetotallynotpretend/events/sob.json"
         self.ensure_file_exists()
 
+    async def cog_load(self):
+        self.bot.pipeline.register("sob", self.on_message, bots=True, system=True)
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister("sob")
+
     def ensure_file_exists(self):
         if not os.path.exists(self.file_path):
             with open(self.file_path, "w") as f:
@@ -107,8 +113,8 @@ class sobCog(commands.Cog):
         with open(self.file_path, "w") as f:
             json.dump(data, f, indent=4)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def on_message(self, event):
+        message = event.message
         if not message.guild:
             return
         
@@ -13,13 +13,16 @@ from PIL import Image
 from discord.ext import commands
 
 from io import BytesIO
-from typing import Union, Optional, Any
+from typing import Dict, Set, Union, Optional, Any
 
 from shazamio import Shazam
 from ttapi import TikTokApi
 
 from tools.bot import Pretend
+from tools.pipeline import MessageEvent
 from tools.misc.views import Donate
+from tools.misc.session import Session
+from tools.media import MediaCache
 from tools.validators import ValidTime
 from tools.helpers import PretendContext
 from tools.predicates import is_afk, is_there_a_reminder, reminder_exists
@@ -47,7 +50,6 @@ from functools import partial, wraps
 from io import BytesIO
 from math import sqrt
 from typing import Union, List
-import aiohttp
 
 
 
@@ -79,13 +81,12 @@ def _collage_open(image: BytesIO):
     return image
 
 
-async def _collage_read(image: str):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(image) as response:
-            try:
-                return await _collage_open(BytesIO(await response.read()))
-            except:
-                return None
+async def _collage_read(image: str, media: Optional[MediaCache] = None):
+    try:
+        data = await media.get(image) if media else await Session().get_bytes(image)
+        return await _collage_open(BytesIO(data))
+    except:
+        return None
 
 
 async def _collage_paste(image: Image, x: int, y: int, background: Image):
@@ -98,10 +99,10 @@ async def _collage_paste(image: Image, x: int, y: int, background: Image):
     )
 
 
-async def collage(images: List[str]):
+async def collage(images: List[str], media: Optional[MediaCache] = None):
     tasks = list()
     for image in images:
-        tasks.append(_collage_read(image))
+        tasks.append(_collage_read(image, media))
 
     images = [image for image in await asyncio.gather(*tasks) if image]
     if not images:
@@ -145,9 +146,20 @@ class Utility(commands.Cog):
         self.tz = Timezone(bot)
         self.description = "Utility commands"
         self.tiktok = TikTokApi(debug=True)
-        self.afk_cd = commands.CooldownMapping.from_cooldown(
-            3, 3, commands.BucketType.channel
-        )
+        self.afk_cd = bot.ratelimiter.limit("afk", 3, 3, commands.BucketType.channel)
+        # users with an active afk by guild, the afk stage only runs for them
+        self.afk_users: Dict[int, Set[int]] = {}
+
+    async def cog_load(self) -> None:
+        results = await self.bot.db.fetch("SELECT guild_id, user_id FROM afk")
+        self.afk_users = {}
+        for result in results:
+            self.afk_users.setdefault(result["guild_id"], set()).add(result["user_id"])
+
+        self.bot.pipeline.register("afk", self.afk_listener, feature=self.involves_afk)
+
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.unregister("afk")
 
     def human_format(self, number: int) -> str:
         """
@@ -159,13 +171,12 @@ class Utility(commands.Cog):
 
         return number.__str__()
 
-    def afk_ratelimit(self, message: discord.Message) -> Optional[int]:
+    def afk_ratelimit(self, message: discord.Message) -> Optional[float]:
         """
         Cooldown for the afk message event
         """
 
-        bucket = self.afk_cd.get_bucket(message)
-        return bucket.update_rate_limit()
+        return self.afk_cd.hit(message)
 
     async def cache_profile(self, member: discord.User) -> Any:
         """
@@ -191,18 +202,26 @@ class Utility(commands.Cog):
 
 
 
-    @commands.Cog.listener("on_message")
-    async def afk_listener(self, message: discord.Message):
-        if message.is_system():
-            return
+    def involves_afk(self, event: MessageEvent) -> bool:
+        users = self.afk_users.get(event.guild.id)
+        if not users:
+            return False
 
-        if not message.guild:
-            return
+        return event.author.id in users or any(
+            m.id in users for m in event.message.mentions
+        )
 
-        if not message.author:
-            return
+    def set_afk(self, guild_id: int, user_id: int, afk: bool) -> None:
+        if afk:
+            self.afk_users.setdefault(guild_id, set()).add(user_id)
+        elif users := self.afk_users.get(guild_id):
+            users.discard(user_id)
+            if not users:
+                del self.afk_users[guild_id]
 
-        if message.author.bot:
+    async def afk_listener(self, event: MessageEvent):
+        message = event.message
+        if not message.author:
             return
 
         if check := await self.bot.db.fetchrow(
@@ -217,6 +236,7 @@ class Utility(commands.Cog):
                 message.guild.id,
                 message.author.id,
             )
+            self.set_afk(message.guild.id, message.author.id, False)
             embed = discord.Embed(
                 color=self.bot.color,
                 description=f"👋 {ctx.author.mention}: Welcome back! You were gone for **{humanize.precisedelta(datetime.datetime.fromtimestamp(time.timestamp()), format='%0.0f')}**",
@@ -355,7 +375,7 @@ class Utility(commands.Cog):
         if await self.bot.db.fetchval("""SELECT count(*) FROM avatars WHERE user_id = $1""", user.id) == 0:
             return await ctx.send_warning(f"no **avatars** saved for you")
         avatars = [record.avatar for record in await self.bot.db.fetch('SELECT avatar FROM avatars WHERE user_id = $1 ORDER BY ts DESC', user.id)]
-        file = await collage(avatars)
+        file = await collage(avatars, self.bot.media)
         embed = discord.Embed(
         description=f"> {user.name}'s **avatar history**",
         color=self.bot.color
@@ -1340,6 +1360,7 @@ class Utility(commands.Cog):
             reason,
             datetime.datetime.now(),
         )
+        self.set_afk(ctx.guild.id, ctx.author.id, True)
 
         embed = discord.Embed(
             color=self.bot.color,
@@ -1919,8 +1940,7 @@ class Utility(commands.Cog):
             icon = ctx.message.attachments[0].url  
         
         link = icon
-        async with aiohttp.ClientSession() as ses: 
-          async with ses.get(link) as r:
+        async with self.bot.session.request("GET", link) as r:
            try:
             if r.status in range (200, 299):
                 img = BytesIO(await r.read())
@@ -1949,8 +1969,7 @@ class Utility(commands.Cog):
             icon = ctx.message.attachments[0].url
         
         link = icon
-        async with aiohttp.ClientSession() as ses: 
-          async with ses.get(link) as r:
+        async with self.bot.session.request("GET", link) as r:
            try:
             if r.status in range (200, 299):
                 img = BytesIO(await r.read())
@@ -1979,8 +1998,7 @@ class Utility(commands.Cog):
             icon = ctx.message.attachments[0].url
         
         link = icon
-        async with aiohttp.ClientSession() as ses: 
-          async with ses.get(link) as r:
+        async with self.bot.session.request("GET", link) as r:
            try:
             if r.status in range (200, 299):
                 img = BytesIO(await r.read())
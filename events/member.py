@@ -1,19 +1,32 @@
+import time
 import orjson
 import asyncio
-import aiohttp
+import logging
 import datetime
 from discord.ui import Button, View
-from typing import Optional
+from typing import List, Optional
 from collections import defaultdict
 from discord.ext.commands import Cog
-from discord import ButtonStyle, Embed, User, Member, Message, Button, utils
-from tools.expiringdictionary import ExpiringDictionary
+from discord import (
+    ButtonStyle,
+    Embed,
+    Guild,
+    HTTPException,
+    User,
+    Member,
+    Message,
+    Button,
+    utils,
+)
 from discord.ui import View
 
 from collections import defaultdict
 
 from tools.bot import Pretend
 from tools.asset import Storage
+from tools.database import Record
+
+log = logging.getLogger(__name__)
 
 
 class Members(Cog):
@@ -23,7 +36,102 @@ class Members(Cog):
 #        self.assets = Storage(self.bot)
         self.to_send = []
 
-        self.ratelimiter = ExpiringDictionary()
+    async def cog_load(self) -> None:
+        self.bot.joins.register("welcome", self.on_welcome, feature="welcome")
+        self.bot.joins.register("autoping", self.on_autoping, feature="autoping")
+        self.bot.joins.register("joindm", self.on_joindm, feature="joindm")
+        self.bot.joins.register("autorole", self.on_autorole)
+
+    async def cog_unload(self) -> None:
+        self.bot.joins.unregister("welcome", "autoping", "joindm", "autorole")
+
+    def greet(self, guild: Guild, members: List[Member], rows: List[Record]):
+        """queue a rendered greeting for every member in every configured channel"""
+        for row in rows:
+            channel = guild.get_channel(row["channel_id"])
+            if channel:
+                perms = channel.permissions_for(guild.me)
+                if perms.send_messages and perms.embed_links:
+                    try:
+                        template = self.bot.embed_build.compile(row["message"])
+                    except Exception:
+                        log.exception(f"Unable to compile a greeting in {guild.id}")
+                        continue
+
+                    for member in members:
+                        try:
+                            message = template.render(member)
+                        except Exception:
+                            log.exception(f"Unable to greet {member.id}")
+                            continue
+
+                        self.bot.joins.outbox.send(channel, **message)
+
+    async def on_welcome(self, guild: Guild, members: List[Member]):
+        self.greet(guild, members, self.bot.guild_config.get("welcome", guild.id))
+
+    async def on_autoping(self, guild: Guild, members: List[Member]):
+        self.greet(guild, members, self.bot.guild_config.get("autoping", guild.id))
+
+    async def on_joindm(self, guild: Guild, members: List[Member]):
+        config = self.bot.guild_config.get("joindm", guild.id)
+        try:
+            template = self.bot.embed_build.compile(config["message"])
+        except Exception:
+            log.exception(f"Unable to compile the join dm of {guild.id}")
+            return
+
+        # dms lagging more than a minute behind the join are skipped
+        deadline = time.monotonic() + 60
+        for member in members:
+            while retry_after := self.bot.ratelimiter.bucket(
+                f"joindm:{guild.id}", 4, 20
+            ):
+                if time.monotonic() + retry_after > deadline:
+                    return
+
+                await asyncio.sleep(retry_after)
+
+            try:
+                await member.send(**template.render(member))
+            except HTTPException:
+                pass
+            except Exception:
+                log.exception(f"Unable to send the join dm to {member.id}")
+
+    async def on_autorole(self, guild: Guild, members: List[Member]):
+        if not guild.me.guild_permissions.manage_roles:
+            return
+
+        tasks = []
+        if guild.id == 1005150492382478377:
+            results = await self.bot.db.fetch(
+                "SELECT user_id FROM authorize WHERE user_id = ANY($1::BIGINT[])",
+                [m.id for m in members],
+            )
+            subscribers = {r["user_id"] for r in results}
+            if role := guild.get_role(1124447347783520318):
+                tasks.extend(
+                    self.bot.joins.add_roles(
+                        member, role, reason="Subscriber joined the server"
+                    )
+                    for member in members
+                    if member.id in subscribers
+                )
+
+        roles = [
+            role
+            for result in self.bot.guild_config.get("autorole", guild.id)
+            if (role := guild.get_role(result["role_id"])) and role.is_assignable()
+        ]
+        if roles:
+            tasks.extend(
+                self.bot.joins.add_roles(member, *roles, reason="AutoRole")
+                for member in members
+            )
+
+        await asyncio.gather(*tasks)
+
 
     async def get_user_avatar_url(self, member: User) -> Optional[str]:
         try:
@@ -74,40 +182,6 @@ class Members(Cog):
                 self.to_send = []
                 await asyncio.sleep(15)
 
-    @Cog.listener("on_member_join")
-    async def on_joindm_event(self, member: Member):
-        async with self.locks[f"joindm-{member.guild.id}"]:
-            message = await self.bot.db.fetchval(
-                """SELECT message FROM joindm WHERE guild_id = $1""", member.guild.id
-            )
-            if message:
-                if await self.ratelimiter.ratelimit(
-                    f"joindm-{member.guild.id}", 5, 20
-                ):
-                    await asyncio.sleep(5)
-
-                x = await self.bot.embed_build.alt_convert(member, message)
-                await member.send(x)
-
-
-    @Cog.listener("on_member_join")
-    async def on_autoping_event(self, member: Member):
-        async with self.locks[f"autoping-{member.guild.id}"]:
-            data = await self.bot.db.fetch(
-                """SELECT channel_id, message FROM autoping WHERE guild_id = $1""",
-                member.guild.id,
-            )
-            if not data:
-                return
-            for channel_id, message in data:
-                if channel := self.bot.get_channel(channel_id):
-                    perms = channel.permissions_for(member.guild.me)
-                    if perms.send_messages and perms.embed_links:
-                        x = await self.bot.embed_build.alt_convert(member, message)
-                        await channel.send(**x)
-                        await asyncio.sleep(0.4)
-
-
     @Cog.listener("on_user_update")
     async def username_change(self, before: User, after: User):
         if before.name != after.name:
@@ -127,9 +201,7 @@ class Members(Cog):
             if before.guild.system_channel:
                 return
 
-            results = await self.bot.db.fetch(
-                "SELECT * FROM boost WHERE guild_id = $1", after.guild.id
-            )
+            results = await self.bot.guild_config.fetch("boost", after.guild.id)
             for result in results:
                 channel = self.bot.get_channel(result["channel_id"])
                 if channel:
@@ -141,22 +213,6 @@ class Members(Cog):
                         await channel.send(**x)
                         await asyncio.sleep(0.4)
 
-    @Cog.listener("on_member_join")
-    async def on_new_member(self, member: Member):
-        results = await self.bot.db.fetch(
-            "SELECT * FROM welcome WHERE guild_id = $1", member.guild.id
-        )
-        for result in results:
-            channel = self.bot.get_channel(result["channel_id"])
-            if channel:
-                perms = channel.permissions_for(member.guild.me)
-                if perms.send_messages and perms.embed_links:
-                    x = await self.bot.embed_build.alt_convert(
-                        member, result["message"]
-                    )
-                    await channel.send(**x)
-                    await asyncio.sleep(0.4)
-
     @Cog.listener("on_member_remove")
     async def on_leave_event(self, member: Member):
         results = await self.bot.db.fetch(
@@ -173,28 +229,6 @@ class Members(Cog):
                     await channel.send(**x)
                     await asyncio.sleep(0.4)
 
-    @Cog.listener("on_member_join")
-    async def on_autorole(self, member: Member):
-        if member.guild.me.guild_permissions.manage_roles:
-            if member.guild.id == 1005150492382478377:
-                check = await self.bot.db.fetchrow(
-                    "SELECT * FROM authorize WHERE user_id = $1", member.id
-                )
-                if check:
-                    await member.add_roles(
-                        member.guild.get_role(1124447347783520318),
-                        reason="Subscriber joined the server",
-                    )
-
-            results = await self.bot.db.fetch(
-                "SELECT * FROM autorole WHERE guild_id = $1", member.guild.id
-            )
-            for result in results:
-                role = member.guild.get_role(result["role_id"])
-                if role:
-                    if role.is_assignable():
-                        await member.add_roles(role, reason="AutoRole")
-
     @Cog.listener("on_member_remove")
     async def on_boost_remove(self, before: Member):
         check = await self.bot.db.fetchrow(
@@ -244,13 +278,14 @@ class Members(Cog):
             }
 
             for result in results:
-                async with aiohttp.ClientSession(headers=headers) as session:
-                    async with session.post(result["webhook_url"], json=json) as r:
-                        if not r.status in [204, 429]:
-                            await self.bot.db.execute(
-                                "DELETE FROM username_track WHERE webhook_url = $1",
-                                result["webhook_url"],
-                            )
+                async with self.bot.session.request(
+                    "POST", result["webhook_url"], headers=headers, json=json
+                ) as r:
+                    if not r.status in [204, 429]:
+                        await self.bot.db.execute(
+                            "DELETE FROM username_track WHERE webhook_url = $1",
+                            result["webhook_url"],
+                        )
 
 
 async def setup(bot: Pretend) -> None:
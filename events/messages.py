@@ -1,6 +1,4 @@
 import re
-import orjson
-import aiohttp
 import asyncio
 import datetime
 
@@ -9,37 +7,64 @@ from bs4 import BeautifulSoup
 from typing import Optional
 
 from discord.ui import View, Button
-from discord.ext.commands import Cog, CooldownMapping, BucketType
+from discord.ext.commands import Cog, BucketType
 
 from discord import AllowedMentions, Message, MessageType, File, Embed
 
 from tools.bot import Pretend
+from tools.pipeline import MessageEvent
+from tools.triggers import TriggerIndexes
 from tools.exceptions import ApiError
 from tools.validators import ValidAutoreact
 
 
+BOOST_TYPES = (
+    MessageType.premium_guild_subscription,
+    MessageType.premium_guild_tier_1,
+    MessageType.premium_guild_tier_2,
+    MessageType.premium_guild_tier_3,
+)
+
+
 class Messages(Cog):
     def __init__(self, bot: Pretend):
         self.bot = bot
-        self._ccd = CooldownMapping.from_cooldown(4, 6, BucketType.channel)
+        self._ccd = bot.ratelimiter.limit("reposts", 4, 6, BucketType.channel)
         self.locks = defaultdict(asyncio.Lock)
-        self.autoreact_cd = CooldownMapping.from_cooldown(4, 6, BucketType.channel)
+        self.autoreact_cd = bot.ratelimiter.limit("autoreact", 4, 6, BucketType.channel)
+        self.triggers = TriggerIndexes(bot)
+
+    async def cog_load(self) -> None:
+        self.bot.pipeline.register(
+            "bump", self.bump_event, feature="bumpreminder", bots=True
+        )
+        self.bot.pipeline.register(
+            "boost", self.on_boost, feature=self.is_boost, system=True
+        )
+        self.bot.pipeline.register(
+            "autoresponder", self.on_autoresponder, feature="autoresponder"
+        )
+        self.bot.pipeline.register("autoreact", self.on_autoreact, feature="autoreact")
+
+    async def cog_unload(self) -> None:
+        self.bot.pipeline.unregister("bump", "boost", "autoresponder", "autoreact")
 
-    async def get_autoreact_cd(self, message: Message) -> Optional[int]:
+    def is_boost(self, event: MessageEvent) -> bool:
+        return event.message.type in BOOST_TYPES
+
+    async def get_autoreact_cd(self, message: Message) -> Optional[float]:
         """
         custom rate limit for autoreact
         """
 
-        bucket = self.autoreact_cd.get_bucket(message)
-        return bucket.update_rate_limit()
+        return self.autoreact_cd.hit(message)
 
-    async def get_ratelimit(self, message: Message) -> Optional[int]:
+    async def get_ratelimit(self, message: Message) -> Optional[float]:
         """
         custom rate limit for reposters
         """
 
-        bucket = self._ccd.get_bucket(message)
-        return bucket.update_rate_limit()
+        return self._ccd.hit(message)
 
     async def repost_instagram(self, message: Message):
         """
@@ -68,25 +93,29 @@ class Messages(Cog):
 
                         body = {"url": url, "lang_code": "en"}
 
-                        async with aiohttp.ClientSession(headers=headers) as cs:
-                            async with cs.post("https://fastdl.app/c/", data=body) as r:
-                                if r.status == 200:
-                                    data = await r.read()
-                                    soup = BeautifulSoup(data, "html.parser")
-                                    post = soup.find("a")
-
-                                    post_data = {
-                                        "url": post["href"],
-                                        "extension": "png"
-                                        if post["data-mediatype"] == "Image"
-                                        else "mp4",
-                                    }
-
-                                    await self.bot.cache.set(
-                                        f"igpost-{url}", post_data, 3600
-                                    )
-                                else:
-                                    raise ApiError(r.stauts)
+                        async with self.bot.session.request(
+                            "POST",
+                            "https://fastdl.app/c/",
+                            headers=headers,
+                            data=body,
+                        ) as r:
+                            if r.status == 200:
+                                data = await r.read()
+                                soup = BeautifulSoup(data, "html.parser")
+                                post = soup.find("a")
+
+                                post_data = {
+                                    "url": post["href"],
+                                    "extension": "png"
+                                    if post["data-mediatype"] == "Image"
+                                    else "mp4",
+                                }
+
+                                await self.bot.cache.set(
+                                    f"igpost-{url}", post_data, 3600
+                                )
+                            else:
+                                raise ApiError(r.status)
 
                     view = View()
                     view.add_item(
@@ -165,8 +194,8 @@ class Messages(Cog):
                         )
                         await message.channel.send(embed=embed, file=file)
 
-    @Cog.listener("on_message")
-    async def bump_event(self, message: Message):
+    async def bump_event(self, event: MessageEvent):
+        message = event.message
         if message.type == MessageType.chat_input_command:
             if (
                 message.interaction.name == "bump"
@@ -176,13 +205,10 @@ class Messages(Cog):
                     "Bump done!" in message.embeds[0].description
                     or "Bump done!" in message.content
                 ):
-                    check = await self.bot.db.fetchrow(
-                        "SELECT thankyou FROM bumpreminder WHERE guild_id = $1",
-                        message.guild.id,
-                    )
+                    check = event.config("bumpreminder")
                     if check is not None:
                         x = await self.bot.embed_build.alt_convert(
-                            message.interaction.user, check[0]
+                            message.interaction.user, check["thankyou"]
                         )
                         x["allowed_mentions"] = AllowedMentions.all()
                         await message.channel.send(**x)
@@ -194,10 +220,10 @@ class Messages(Cog):
                             message.guild.id,
                         )
 
-    @Cog.listener("on_message")
-    async def on_boost(self, message: Message):
+    async def on_boost(self, event: MessageEvent):
+        message = event.message
         if message.guild:
-            if "MessageType.premium_guild" in str(message.type):
+            if message.type in BOOST_TYPES:
                 if message.guild.id == 1005150492382478377:
                     res = await self.bot.db.fetchrow(
                         "SELECT * FROM donor WHERE user_id = $1", message.author.id
@@ -212,9 +238,7 @@ class Messages(Cog):
 
                 member = message.author
 
-                results = await self.bot.db.fetch(
-                    "SELECT * FROM boost WHERE guild_id = $1", message.guild.id
-                )
+                results = event.config("boost")
                 for result in results:
                     channel = self.bot.get_channel(result["channel_id"])
                     if channel:
@@ -226,19 +250,9 @@ class Messages(Cog):
                             await channel.send(**x)
                             await asyncio.sleep(0.4)
 
-    @Cog.listener("on_message")
-    async def on_autoresponder(self, message: Message):
-        if message.author.bot:
-            return
-
-        if not message.guild:
-            return
-
-        check = await self.bot.db.fetchrow(
-            "SELECT response FROM autoresponder WHERE guild_id = $1 AND trigger = $2",
-            message.guild.id,
-            message.content,
-        )
+    async def on_autoresponder(self, event: MessageEvent):
+        message = event.message
+        check = self.triggers.autoresponder(message.guild.id).match(event.content)
         if check:
             bucket = await self.get_ratelimit(message)
 
@@ -246,38 +260,38 @@ class Messages(Cog):
                 return
 
             ctx = await self.bot.get_context(message)
-            x = await self.bot.embed_build.convert(ctx, check[0])
+            x = await self.bot.embed_build.convert(ctx, check)
             await ctx.send(**x)
 
-    @Cog.listener("on_message")
-    async def on_autoreact(self, message: Message):
-        if message.author.bot:
+    async def on_autoreact(self, event: MessageEvent):
+        message = event.message
+        if not message.guild.me.guild_permissions.add_reactions:
             return
 
-        if not message.guild:
+        index = self.triggers.autoreact(message.guild.id)
+        trigger = index.match(event.lowered, event.words)
+        if trigger is None:
             return
 
-        if not message.guild.me.guild_permissions.add_reactions:
+        bucket = await self.get_autoreact_cd(message)
+
+        if bucket:
             return
 
-        words = message.content.lower().split()
-        results = await self.bot.db.fetch(
-            "SELECT * FROM autoreact WHERE guild_id = $1", message.guild.id
-        )
-        for result in results:
-            if result["trigger"].lower() in words:
-                bucket = await self.get_autoreact_cd(message)
-
-                if bucket:
-                    return
-
-                reactions = orjson.loads(result["reactions"])
-                ctx = await self.bot.get_context(message)
-                for reaction in reactions:
-                    x = await ValidAutoreact().convert(ctx, reaction)
-                    if x:
-                        await message.add_reaction(x)
-                return
+        reactions = index.resolved.get(trigger)
+        if reactions is None:
+            ctx = await self.bot.get_context(message)
+            reactions = index.resolved[trigger] = [
+                x
+                for x in [
+                    await ValidAutoreact().convert(ctx, reaction)
+                    for reaction in index.reactions[trigger]
+                ]
+                if x
+            ]
+
+        for reaction in reactions:
+            await message.add_reaction(reaction)
 
     @Cog.listener("on_message_delete")
     async def snipes(self, message: Message):
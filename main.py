@@ -1,26 +1,23 @@
 import uvloop
 uvloop.install()
 
+import os
 import uwuify
 import discord
 
+from typing import List
+
 from tools.bot import Pretend
+from tools.cluster import ClusterLauncher
 from tools.helpers import PretendContext
 
-bot = Pretend()
-
 
-@bot.check
 async def disabled_command(ctx: PretendContext):
-    if await ctx.bot.db.fetchrow(
-        """
-   SELECT * FROM disablecmd
-   WHERE guild_id = $1
-   AND cmd = $2
-   """,
-        ctx.guild.id,
-        str(ctx.command),
-    ):
+    if not ctx.guild:
+        return True
+
+    policy = await ctx.bot.command_policy.get(ctx.guild.id)
+    if policy.is_disabled(str(ctx.command)):
         await ctx.send_error(
             f"The command **{str(ctx.command)}** is **disabled** in this server"
         )
@@ -29,7 +26,6 @@ async def disabled_command(ctx: PretendContext):
     return True
 
 
-@bot.tree.context_menu(name="avatar")
 async def avatar_user(interaction: discord.Interaction, member: discord.Member):
     """
     Get a member's avatar
@@ -45,7 +41,6 @@ async def avatar_user(interaction: discord.Interaction, member: discord.Member):
     await interaction.response.send_message(embed=embed)
 
 
-@bot.tree.context_menu(name="banner")
 async def banner_user(interaction: discord.Interaction, member: discord.Member):
     """
     Get a member's banner
@@ -66,5 +61,30 @@ async def banner_user(interaction: discord.Interaction, member: discord.Member):
     return await interaction.response.send_message(embed=embed)
 
 
+def create_bot(**kwargs) -> Pretend:
+    bot = Pretend(**kwargs)
+    bot.check(disabled_command)
+    bot.tree.context_menu(name="avatar")(avatar_user)
+    bot.tree.context_menu(name="banner")(banner_user)
+    return bot
+
+
+def run_cluster(
+    cluster_id: int, shard_ids: List[int], shard_count: int, clusters: int
+):
+    create_bot(
+        cluster_id=cluster_id,
+        clusters=clusters,
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+    ).run()
+
+
 if __name__ == "__main__":
-    bot.run()
+    clusters = int(os.environ.get("clusters", 1))
+    if clusters > 1:
+        ClusterLauncher(
+            run_cluster, clusters, int(os.environ.get("shards", 3))
+        ).run()
+    else:
+        create_bot().run()
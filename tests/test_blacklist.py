@@ -0,0 +1,24 @@
+from tools.blacklist import BloomFilter
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(1000)
+    ids = range(10**17, 10**17 + 1000)
+    for id in ids:
+        bloom.add(id)
+
+    assert all(id in bloom for id in ids)
+
+
+def test_false_positive_rate():
+    bloom = BloomFilter(10_000, error=0.01)
+    for id in range(10_000):
+        bloom.add(id)
+
+    hits = sum(id in bloom for id in range(10**18, 10**18 + 10_000))
+    assert hits < 300
+
+
+def test_empty():
+    bloom = BloomFilter(0)
+    assert 1 not in bloom
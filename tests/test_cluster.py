@@ -0,0 +1,18 @@
+import pytest
+
+from tools.cluster import shard_ranges
+
+
+@pytest.mark.parametrize(
+    "shards, clusters", [(1, 1), (10, 3), (16, 4), (7, 7), (3, 5), (5, 0)]
+)
+def test_every_shard_once(shards: int, clusters: int):
+    ranges = shard_ranges(shards, clusters)
+    assert [shard for r in ranges for shard in r] == list(range(shards))
+    assert all(ranges)
+    assert max(map(len, ranges)) - min(map(len, ranges)) <= 1
+
+
+def test_ranges():
+    assert shard_ranges(10, 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert shard_ranges(3, 5) == [[0], [1], [2]]
@@ -0,0 +1,77 @@
+import pytest
+
+from tools import database
+from tools.database import QueryCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_key():
+    key = QueryCache.key("fetchrow", "SELECT * FROM prefixes JOIN afk ON", (1,))
+    assert key.tables == ("afk", "prefixes")
+    assert QueryCache.key("execute", "INSERT INTO afk VALUES ($1)", (1,)) is None
+    assert QueryCache.key("execute", "DELETE FROM afk", ()) is None
+    assert QueryCache.key("fetch", "SELECT now()", ()) is None
+    assert QueryCache.key("fetch", "SELECT * FROM afk WHERE id = $1", ([1],)) is None
+
+
+def test_hit_and_negative_result(clock):
+    cache = QueryCache()
+    key = QueryCache.key("fetchrow", "SELECT * FROM afk WHERE id = $1", (1,))
+    assert cache.get(key) == (False, None)
+
+    cache.set(key, None)
+    assert cache.get(key) == (True, None)
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_ttl(clock):
+    cache = QueryCache(ttl=10)
+    key = QueryCache.key("fetchval", "SELECT 1 FROM afk", ())
+    cache.set(key, 1)
+    clock[0] += 11
+    assert cache.get(key) == (False, None)
+    assert cache.expirations == 1
+
+
+def test_invalidate(clock):
+    cache = QueryCache()
+    afk = QueryCache.key("fetch", "SELECT * FROM afk", ())
+    both = QueryCache.key("fetch", "SELECT * FROM afk JOIN prefixes ON", ())
+    prefixes = QueryCache.key("fetch", "SELECT * FROM prefixes", ())
+    for key in (afk, both, prefixes):
+        cache.set(key, [1])
+
+    assert cache.invalidate("AFK") == 2
+    assert cache.get(afk)[0] is False
+    assert cache.get(both)[0] is False
+    assert cache.get(prefixes) == (True, [1])
+
+
+def test_stale_generation(clock):
+    cache = QueryCache()
+    key = QueryCache.key("fetch", "SELECT * FROM afk", ())
+    generation = cache.generation(key.tables)
+    cache.invalidate("afk")
+    cache.set(key, [1], generation=generation)
+    assert cache.get(key) == (False, None)
+
+
+def test_lru_eviction(clock):
+    cache = QueryCache(max_entries=2)
+    keys = [QueryCache.key("fetchval", f"SELECT {i} FROM afk", ()) for i in range(3)]
+    cache.set(keys[0], 0)
+    cache.set(keys[1], 1)
+    cache.get(keys[0])
+    cache.set(keys[2], 2)
+
+    assert cache.get(keys[1])[0] is False
+    assert cache.get(keys[0]) == (True, 0)
+    assert cache.evictions == 1
+    assert cache.bytes == sum(cache.sizeof(v) for v in (0, 2))
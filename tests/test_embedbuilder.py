@@ -0,0 +1,175 @@
+import datetime
+import types
+
+import discord
+import pytest
+
+from discord.ext import commands
+
+from tools.handlers.embedbuilder import (
+    VARIABLES,
+    EmbedBuilder,
+    EmbedTemplate,
+    Text,
+    Variables,
+    compile_script,
+)
+
+CREATED = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Member:
+    def __init__(self, name: str = "pretend", vanity: str = None):
+        self.name = name
+        self.mention = "<@1>"
+        self.discriminator = "0"
+        self.display_avatar = types.SimpleNamespace(url="https://cdn.pretend.best/a.png")
+        self.joined_at = CREATED
+        self.created_at = CREATED
+        self.guild = types.SimpleNamespace(
+            id=2,
+            name="guild",
+            member_count=21,
+            members=[None] * 21,
+            created_at=CREATED,
+            premium_subscription_count=3,
+            premium_subscribers=[None] * 2,
+            premium_tier=1,
+            vanity_url_code=vanity,
+            icon=None,
+        )
+
+    def __str__(self) -> str:
+        return self.name
+
+
+def replace_all(params: str, user: Member) -> str:
+    """The variables replaced one after another, like the old renderer did"""
+    for name, value in VARIABLES.items():
+        params = params.replace("{" + name + "}", value(user))
+
+    return params
+
+
+@pytest.mark.parametrize(
+    "script",
+    [
+        "no variables at all",
+        "welcome {user.mention} to {guild.name}, you're the {guild.count.format} member",
+        "{user}{user.name}{user.avatar}{user.joined_at}{user.created_at}",
+        "{guild.count} {guild.id} {guild.boost_count} {guild.booster_count}",
+        "{guild.boost_count.format} {guild.booster_count.format} {guild.boost_tier}",
+        "{guild.vanity} {invisible} {botcolor} {guild.icon} {user.discriminator}",
+        "{unknown} stays, {user.name} doesn't, {user.name",
+        "{{user.name}} {}",
+    ],
+)
+def test_text_matches_replace(script: str):
+    user = Member()
+    assert Text(script).render(Variables(user)) == replace_all(script, user)
+    assert EmbedBuilder().embed_replacement(user, script) == replace_all(script, user)
+
+
+def test_vanity():
+    assert Text("{guild.vanity}").render(Variables(Member())) == "none"
+    assert Text("{guild.vanity}").render(Variables(Member(vanity="pretend"))) == "/pretend"
+
+
+def test_variables_resolved_once():
+    user = Member()
+    variables = Variables(user)
+    assert variables["user.name"] == "pretend"
+    user.name = "changed"
+    assert variables["user.name"] == "pretend"
+
+
+@pytest.mark.asyncio
+async def test_plain_script():
+    assert compile_script("hi {user.name}").render(Member()) == {
+        "content": "hi pretend"
+    }
+
+
+@pytest.mark.asyncio
+async def test_embed_render():
+    script = (
+        "{embed}{color:#ff0000}$v{title:hi {user.name}}"
+        "$v{description:{guild.name} has {guild.count} members}"
+        "$v{author: name:{user.name} && icon:{user.avatar}}"
+        "$v{field: name:a && value:b && inline}"
+        "$v{footer: text:footer && icon:{guild.icon}}"
+        "$v{content:{user.mention}}$v{delete: 5}"
+        "$v{button:label:site && url: https://pretend.best}"
+    )
+    result = compile_script(script).render(Member())
+    embed: discord.Embed = result["embed"]
+
+    assert result["content"] == "<@1>"
+    assert result["delete_after"] == 5.0
+    assert embed.color.value == 0xFF0000
+    assert embed.title == "hi pretend"
+    assert embed.description == "guild has 21 members"
+    assert embed.author.name == "pretend"
+    assert embed.author.icon_url == "https://cdn.pretend.best/a.png"
+    assert [(f.name, f.value, f.inline) for f in embed.fields] == [("a", "b", True)]
+    assert embed.footer.text == "footer"
+    assert embed.footer.icon_url == "https://none.none"
+
+    [button] = result["view"].children
+    assert button.label == "site"
+    assert button.url == "https://pretend.best"
+
+
+@pytest.mark.asyncio
+async def test_renders_per_member():
+    template = compile_script("{embed}$v{title:{user.name}}")
+    assert template.render(Member("one"))["embed"].title == "one"
+    assert template.render(Member("two"))["embed"].title == "two"
+
+
+def test_compile_is_cached():
+    assert compile_script("{embed}$v{title: a}") is compile_script(
+        "{embed}$v{title: a}"
+    )
+
+
+@pytest.mark.parametrize(
+    "script, error",
+    [
+        ("{content: " + "a" * 2000 + "}", "Message content too long"),
+        ("{embed}$v{title: " + "a" * 256 + "}", "Embed title too long"),
+        ("{embed}$v{description: " + "a" * 2048 + "}", "Embed description too long"),
+        ("{embed}$v{author: name: " + "a" * 256 + "}", "author name too long"),
+        ("{embed}$v{field: name: " + "a" * 256 + "}", "field name too long"),
+        ("{embed}$v{field: value: " + "a" * 1024 + "}", "field value too long"),
+        ("{embed}$v{footer: text: " + "a" * 2048 + "}", "footer text too long"),
+        ("{embed}$v{image: not a url}", "The **image** parameter got an invalid url"),
+        (
+            "{embed}$v{thumbnail: nope}",
+            "The **thumbnail** parameter got an invalid url",
+        ),
+        (
+            "{embed}$v{author: name: a && icon: nope}",
+            "The **author icon** parameter got an invalid url",
+        ),
+        (
+            "{embed}" + "$v{field: name: a && value: b}" * 26,
+            "There are more than **25** fields in your embed",
+        ),
+    ],
+)
+def test_static_errors(script: str, error: str):
+    with pytest.raises(commands.BadArgument, match=error.replace("*", r"\*")):
+        EmbedTemplate(script)
+
+
+@pytest.mark.asyncio
+async def test_rendered_errors():
+    template = EmbedTemplate("{embed}$v{title: " + "a" * 240 + "{user.name}}")
+    assert template.render(Member("short"))["embed"].title.endswith("short")
+    with pytest.raises(commands.BadArgument, match="Embed title too long"):
+        template.render(Member("a much longer name"))
+
+    template = EmbedTemplate("{embed}$v{image: {user.name}}")
+    with pytest.raises(commands.BadArgument, match="invalid url"):
+        template.render(Member())
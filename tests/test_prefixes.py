@@ -0,0 +1,20 @@
+from tools.prefixes import PrefixMatcher
+
+MENTIONS = ("<@1> ", "<@!1> ")
+
+
+def test_matches():
+    matcher = PrefixMatcher((";", ","), MENTIONS)
+    assert matcher.matches(",help")
+    assert matcher.matches(";help")
+    assert matcher.matches("<@1> help")
+    assert matcher.matches("<@!1> help")
+
+
+def test_no_match():
+    matcher = PrefixMatcher(("!!",), MENTIONS)
+    assert not matcher.matches("")
+    assert not matcher.matches("hello")
+    assert not matcher.matches("!help")
+    assert not matcher.matches("<@2> help")
+    assert matcher.matches("!!help")
@@ -0,0 +1,67 @@
+import pytest
+
+from tools import windows
+from tools.windows import WindowStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(windows.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_expires_old_events(clock):
+    store = WindowStore(per=10)
+    store.push("a", 1)
+    clock[0] += 5
+    store.push("a", 2)
+    clock[0] += 6
+    window = store.push("a", 3)
+
+    assert [event.id for event in window] == [2, 3]
+    assert [event.id for event in store.get("a")] == [2, 3]
+    clock[0] += 10
+    assert len(store.get("a")) == 0
+
+
+def test_limit(clock):
+    store = WindowStore(per=10, limit=3)
+    for i in range(5):
+        window = store.push("a", i)
+
+    assert [event.id for event in window] == [2, 3, 4]
+
+
+def test_repeats_and_burst(clock):
+    store = WindowStore(per=10, limit=2)
+    store.push("a", 1, digest=7)
+    store.push("a", 2, digest=7)
+    assert store.get("a").repeats(7) == 2
+
+    clock[0] += 1
+    window = store.push("a", 3, digest=8)
+    assert window.repeats(7) == 1
+    assert window.repeats(8) == 1
+    assert window.repeats(None) == 0
+    assert window.burst(clock[0] - 0.5) == 1
+    assert window.burst(clock[0] - 2) == 2
+
+
+def test_by_channel(clock):
+    store = WindowStore(per=10)
+    store.push("a", 1, channel_id=10)
+    store.push("a", 2, channel_id=20)
+    window = store.push("a", 3, channel_id=10)
+    assert window.by_channel() == {10: [1, 3], 20: [2]}
+
+
+def test_sweep(clock):
+    store = WindowStore(per=10)
+    store.push("idle", 1)
+    clock[0] += 11
+    store.push("active", 2)
+
+    assert store.sweep() == 1
+    assert store.get("idle") is None
+    assert len(store) == 1
@@ -0,0 +1,51 @@
+from typing import Dict, List, Optional, Tuple
+
+from discord.ext.commands import AutoShardedBot as AB
+from discord.ext.commands import Command
+
+from .database import Record
+
+
+class AliasResolver:
+    """
+    Custom command aliases of every guild, compiled from the guild config store
+
+    A guild's aliases are compiled to a map once and recompiled whenever
+    the store holds new rows for it, which the alias commands and the
+    config notifications take care of
+    """
+
+    def __init__(self, bot: AB):
+        self.bot = bot
+        self.compiled: Dict[int, Tuple[List[Record], Dict[str, str]]] = {}
+
+    def __repr__(self) -> str:
+        return f"<AliasResolver guilds={len(self.compiled)}>"
+
+    def aliases(self, guild_id: int) -> Dict[str, str]:
+        rows = self.bot.guild_config.get("aliases", guild_id)
+        if not rows:
+            self.compiled.pop(guild_id, None)
+            return {}
+
+        compiled = self.compiled.get(guild_id)
+        if compiled is None or compiled[0] is not rows:
+            compiled = self.compiled[guild_id] = (
+                rows,
+                {r["alias"].lower(): r["command_name"] for r in rows},
+            )
+
+        return compiled[1]
+
+    def resolve(self, guild_id: int, invoked_with: str) -> Optional[Command]:
+        """
+        The command an alias points to
+        """
+
+        if name := self.aliases(guild_id).get(invoked_with.lower()):
+            return self.bot.get_command(name)
+
+        return None
+
+    def forget(self, guild_id: int) -> None:
+        self.compiled.pop(guild_id, None)
@@ -0,0 +1,263 @@
+import time
+import orjson
+import asyncio
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import (
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from discord import AuditLogAction, AuditLogEntry, Guild, Member
+from discord.utils import utcnow
+
+from .database import Record
+
+# audit log actions the antinuke modules react to
+MODULES: Dict[AuditLogAction, str] = {
+    AuditLogAction.channel_create: "channel create",
+    AuditLogAction.channel_delete: "channel delete",
+    AuditLogAction.role_create: "role create",
+    AuditLogAction.role_delete: "role delete",
+    AuditLogAction.role_update: "edit role",
+    AuditLogAction.member_role_update: "role giving",
+    AuditLogAction.kick: "kick",
+    AuditLogAction.ban: "ban",
+    AuditLogAction.bot_add: "bot add",
+}
+
+Target = Tuple[int, AuditLogAction, int]
+
+
+class ModuleRule(NamedTuple):
+    threshold: Optional[int]
+    punishment: Optional[str]
+
+
+def load_ids(value: Optional[str]) -> FrozenSet[int]:
+    return frozenset(orjson.loads(value)) if value else frozenset()
+
+
+class AntinukePolicy:
+    """
+    The antinuke config of a guild compiled into sets and maps
+    """
+
+    __slots__ = (
+        "config",
+        "rows",
+        "configured",
+        "owner_id",
+        "logs",
+        "whitelisted",
+        "admins",
+        "trusted",
+        "modules",
+    )
+
+    def __init__(self, config: Optional[Record], rows: List[Record]):
+        # the records it was compiled from, to tell when it went stale
+        self.config = config
+        self.rows = rows
+        self.configured = bool(config) and str(config["configured"]) == "true"
+        self.owner_id: Optional[int] = config["owner_id"] if config else None
+        self.logs: Optional[int] = config["logs"] if config else None
+        self.whitelisted = load_ids(config["whitelisted"]) if config else frozenset()
+        self.admins = load_ids(config["admins"]) if config else frozenset()
+        # owner, whitelisted and admins are all ignored by the modules
+        self.trusted = self.whitelisted | self.admins
+        if self.owner_id:
+            self.trusted |= {self.owner_id}
+
+        self.modules: Dict[str, ModuleRule] = {
+            r["module"]: ModuleRule(r["threshold"], r["punishment"]) for r in rows
+        }
+
+    def __repr__(self) -> str:
+        return f"<AntinukePolicy owner={self.owner_id} modules={len(self.modules)}>"
+
+    def compiled_from(self, config: Optional[Record], rows: List[Record]) -> bool:
+        return config is self.config and (rows is self.rows or not (rows or self.rows))
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id == self.owner_id or user_id in self.admins
+
+
+class AntinukeEngine:
+    """
+    Correlates audit log entries with gateway events and keeps a sliding
+    window of actions per guild, executor and module
+    """
+
+    def __init__(self, window: float = 60.0, memory: float = 30.0, skew: float = 2.0):
+        self.window = window
+        self.memory = memory
+        # how much older than the gateway event its entry may be
+        self.skew = skew
+        self.actions: Dict[Tuple[int, int, str], Deque[float]] = {}
+        self.entries: Dict[Target, Tuple[AuditLogEntry, float]] = {}
+        self.waiters: Dict[Target, List[asyncio.Future]] = {}
+        self.punished: Dict[Tuple[int, int], float] = {}
+        self.punishing: Set[Tuple[int, int]] = set()
+        self.fed = 0
+
+    def __repr__(self) -> str:
+        return f"<AntinukeEngine executors={len(self.actions)} entries={len(self.entries)} fed={self.fed}>"
+
+    def record(self, guild_id: int, user_id: int, module: str) -> int:
+        """
+        Add an action to the executor's window, returns the actions in the window
+        """
+
+        now = time.monotonic()
+        actions = self.actions.setdefault((guild_id, user_id, module), deque())
+        actions.append(now)
+        while actions and actions[0] < now - self.window:
+            actions.popleft()
+
+        return len(actions)
+
+    def count(self, guild_id: int, user_id: int, module: str) -> int:
+        actions = self.actions.get((guild_id, user_id, module))
+        if not actions:
+            return 0
+
+        cutoff = time.monotonic() - self.window
+        while actions and actions[0] < cutoff:
+            actions.popleft()
+
+        return len(actions)
+
+    def exceeded(
+        self, guild_id: int, user_id: int, module: str, threshold: Optional[int]
+    ) -> bool:
+        """
+        Whether the executor went over the module threshold within the window
+        """
+
+        if threshold == 0:
+            return True
+
+        return self.count(guild_id, user_id, module) > (threshold or 0)
+
+    def feed(self, entry: AuditLogEntry) -> Optional[str]:
+        """
+        Consume an audit log entry, returns the module it belongs to
+        """
+
+        module = MODULES.get(entry.action)
+        if module is None:
+            return None
+
+        self.fed += 1
+        now = time.monotonic()
+        self.record(entry.guild.id, entry.user_id, module)
+
+        target = (entry.guild.id, entry.action, getattr(entry.target, "id", 0))
+        self.entries[target] = (entry, now)
+        for future in self.waiters.pop(target, []):
+            if not future.done():
+                future.set_result(entry)
+
+        if self.fed % 256 == 0:
+            self.prune()
+
+        return module
+
+    async def attribute(
+        self,
+        guild: Guild,
+        action: AuditLogAction,
+        target_id: int,
+        timeout: float = 3.0,
+        since: Optional[datetime] = None,
+    ) -> Optional[AuditLogEntry]:
+        """
+        The audit log entry behind a gateway event, waiting for it to be streamed
+
+        Entries are consumed, and only ones created since the event are
+        accepted so an older action on the same target isn't blamed for it
+        """
+
+        since = since or utcnow() - timedelta(seconds=self.skew)
+        target = (guild.id, action, target_id)
+        if cached := self.entries.pop(target, None):
+            if cached[0].created_at >= since:
+                return cached[0]
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(target, []).append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            waiters = self.waiters.get(target, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self.waiters.pop(target, None)
+
+        # the entry never came through the stream, look it up once
+        async for entry in guild.audit_logs(limit=5, action=action, after=since):
+            if getattr(entry.target, "id", None) == target_id:
+                self.entries.pop(target, None)
+                return entry
+
+        return None
+
+    async def executor(self, entry: AuditLogEntry) -> Optional[Member]:
+        """
+        The member behind an entry, fetched only if it isn't cached
+        """
+
+        if isinstance(entry.user, Member):
+            return entry.user
+
+        if member := entry.guild.get_member(entry.user_id):
+            return member
+
+        try:
+            return await entry.guild.fetch_member(entry.user_id)
+        except Exception:
+            return None
+
+    @contextmanager
+    def claim(self, guild_id: int, user_id: int, ttl: float = 60.0) -> Iterator[bool]:
+        """
+        True only for the first caller wanting to punish an offender
+
+        The offender counts as punished for ttl seconds once the block
+        succeeds, if it raises the claim is released for the next caller
+        """
+
+        key = (guild_id, user_id)
+        if key in self.punishing or self.punished.get(key, 0) > time.monotonic():
+            yield False
+            return
+
+        self.punishing.add(key)
+        try:
+            yield True
+            self.punished[key] = time.monotonic() + ttl
+        finally:
+            self.punishing.discard(key)
+
+    def prune(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (_, at) in self.entries.items() if at < now - self.memory]:
+            del self.entries[key]
+
+        cutoff = now - self.window
+        for key in [k for k, a in self.actions.items() if not a or a[-1] < cutoff]:
+            del self.actions[key]
+
+        for key in [k for k, until in self.punished.items() if until < now]:
+            del self.punished[key]
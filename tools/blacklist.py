@@ -0,0 +1,153 @@
+import math
+import logging
+
+from typing import Dict, Iterable, Iterator, Set, Union
+
+from discord import Interaction
+from discord.ext.commands import AutoShardedBot as AB
+from xxhash import xxh3_64_intdigest
+
+log = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter over ids, for blacklists too big to hold in a set
+    """
+
+    __slots__ = ("bits", "size", "hashes")
+
+    def __init__(self, capacity: int, error: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(-capacity * math.log(error) / math.log(2) ** 2)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value: int) -> Iterator[int]:
+        data = value.to_bytes(8, "little", signed=False)
+        first = xxh3_64_intdigest(data)
+        second = xxh3_64_intdigest(data, seed=1) | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value: int) -> None:
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: int) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(value)
+        )
+
+
+class Blacklist:
+    """
+    Blacklisted users and servers held in memory
+
+    Lists are loaded at startup and kept in sync between clusters over
+    the IPC channel. Users above bloom_above entries are kept in a bloom
+    filter, only its hits are confirmed with the database
+    """
+
+    def __init__(self, bot: AB, bloom_above: int = 500_000):
+        self.bot = bot
+        self.bloom_above = bloom_above
+        self.users: Union[Set[int], BloomFilter] = set()
+        self.guilds: Set[int] = set()
+        self.confirmed: Dict[int, bool] = {}
+        self.blocked = 0
+
+    def __repr__(self) -> str:
+        kind = "bloom" if isinstance(self.users, BloomFilter) else "set"
+        return f"<Blacklist users={kind} guilds={len(self.guilds)} blocked={self.blocked}>"
+
+    async def setup(self) -> None:
+        self.bot.ipc.register("blacklist", self.on_change)
+        await self.load()
+
+    async def load(self) -> None:
+        self.bot.db.invalidate("blacklist")
+        results = await self.bot.db.fetch("SELECT id, type FROM blacklist")
+        users = [r["id"] for r in results if r["type"] == "user"]
+        self.guilds = {r["id"] for r in results if r["type"] == "server"}
+        self.confirmed.clear()
+        self.users = self.build(users)
+        log.info(f"Loaded {len(users)} blacklisted users, {len(self.guilds)} servers")
+
+    def build(self, users: Iterable[int]) -> Union[Set[int], BloomFilter]:
+        users = list(users)
+        if len(users) <= self.bloom_above:
+            return set(users)
+
+        bloom = BloomFilter(len(users) * 2)
+        for user_id in users:
+            bloom.add(user_id)
+
+        return bloom
+
+    async def user(self, user_id: int) -> bool:
+        """
+        Whether a user is blacklisted
+        """
+
+        if user_id not in self.users:
+            return False
+
+        if isinstance(self.users, BloomFilter):
+            if (hit := self.confirmed.get(user_id)) is None:
+                hit = self.confirmed[user_id] = (
+                    await self.bot.db.fetchval(
+                        "SELECT 1 FROM blacklist WHERE id = $1 AND type = $2",
+                        user_id,
+                        "user",
+                    )
+                    is not None
+                )
+
+            if not hit:
+                return False
+
+        self.blocked += 1
+        return True
+
+    def guild(self, guild_id: int) -> bool:
+        return guild_id in self.guilds
+
+    def apply(self, target: int, type: str, blacklisted: bool) -> None:
+        if type == "server":
+            if blacklisted:
+                self.guilds.add(target)
+            else:
+                self.guilds.discard(target)
+        elif isinstance(self.users, BloomFilter):
+            # bloom filters can't forget, the confirmation is what changes
+            if blacklisted:
+                self.users.add(target)
+            self.confirmed[target] = blacklisted
+        elif blacklisted:
+            self.users.add(target)
+        else:
+            self.users.discard(target)
+
+    async def set(self, target: int, type: str, blacklisted: bool) -> None:
+        """
+        Apply a change made by the blacklist commands on every cluster
+        """
+
+        self.apply(target, type, blacklisted)
+        await self.bot.ipc.broadcast(
+            "blacklist", {"id": target, "type": type, "blacklisted": blacklisted}
+        )
+
+    async def on_change(self, data: dict) -> None:
+        self.apply(data["id"], data["type"], data["blacklisted"])
+        if data["type"] == "server" and data["blacklisted"]:
+            if guild := self.bot.get_guild(data["id"]):
+                await guild.leave()
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        if interaction.guild and self.guild(interaction.guild.id):
+            return False
+
+        return not await self.user(interaction.user.id)
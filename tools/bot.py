@@ -1,15 +1,12 @@
 import os
 import dotenv
 import urllib
-import aiohttp
 import asyncio
 import asyncpg
 import logging
 import discord
 import datetime
-import colorgram
 
-from PIL import Image
 from typing import Any, List, Union, Optional, Set
 
 from num2words import num2words
@@ -22,7 +19,18 @@ from .persistent.vm import VoiceMasterView
 from .persistent.tickets import TicketView
 from .persistent.giveaway import GiveawayView
 
-from .expiringdictionary import ExpiringDictionary
+from .aliases import AliasResolver
+from .blacklist import Blacklist
+from .chunker import GuildChunker
+from .commandpolicy import CommandPolicies
+from .cluster import ClusterIPC
+from .counters import CounterService
+from .invites import InviteTracker
+from .joins import JoinPipeline
+from .prefixes import PrefixResolver
+from .ratelimit import RateLimiter
+from .guildconfig import GuildConfigStore
+from .pipeline import MessagePipeline, MessageEvent
 
 from .helpers import (
     PretendContext,
@@ -35,13 +43,16 @@ from .helpers import (
 )
 
 from .misc.session import Session
+from .media import MediaCache
+from .colors import ColorService
+from .scheduler import Scheduler
 from .misc.tasks import (
     pomelo_task,
     snipe_delete,
     shit_loop,
     bump_remind,
-    check_monthly_guilds,
-    gw_loop,
+    check_monthly_guild,
+    gw_end,
     reminder_task,
     counter_update,
 )
@@ -51,7 +62,6 @@ from .handlers.socials.profile import ServerProfile
 from .exceptions import RenameRateLimit, LastFmException, WrongMessageLink
 
 from io import BytesIO
-from copy import copy
 #from cogs.music import Music
 from cogs.fun import BlackTea
 from .database import PostgreSQL
@@ -95,7 +105,14 @@ class Pretend(commands.AutoShardedBot):
     The discord bot
     """
 
-    def __init__(self, db: asyncpg.Pool = None):
+    def __init__(
+        self,
+        db: asyncpg.Pool = None,
+        cluster_id: int = 0,
+        clusters: int = 1,
+        shard_ids: Optional[List[int]] = None,
+        shard_count: Optional[int] = None,
+    ):
         super().__init__(
             command_prefix=getprefix,
             intents=intents,
@@ -103,7 +120,8 @@ class Pretend(commands.AutoShardedBot):
             chunk_guilds_at_startup=False,
             owner_ids=[128114020744953856, 1208472692337020999, 930383131863842816],
             case_insensitive=True,
-            shard_count=3,
+            shard_ids=shard_ids,
+            shard_count=shard_count or int(os.environ.get("shards", 3)),
             strip_after_prefix=True,
             enable_debug_events=True,
             allowed_mentions=discord.AllowedMentions(
@@ -116,6 +134,9 @@ class Pretend(commands.AutoShardedBot):
         )
 
         self.db = db
+        self.cluster_id = cluster_id
+        self.clusters = clusters
+        self.ipc = ClusterIPC(self)
         self.login_data = {
             x: os.environ[x] for x in ["host", "password", "database", "user", "port"]
         }
@@ -127,25 +148,57 @@ class Pretend(commands.AutoShardedBot):
         self.yes = "<:check:1225126153098891304>"
         self.yes_color = 0x48db01
         self.time = datetime.datetime.now()
-        self.mcd = commands.CooldownMapping.from_cooldown(
-            3, 5, commands.BucketType.user
+        self.ratelimiter = RateLimiter(self)
+        # users can talk to every process, so their limit lives in redis
+        self.mcd = self.ratelimiter.limit(
+            "commands:user", 3, 5, commands.BucketType.user, mode="shared"
         )
-        self.ccd = commands.CooldownMapping.from_cooldown(
-            4, 5, commands.BucketType.channel
+        self.ccd = self.ratelimiter.limit(
+            "commands:channel", 4, 5, commands.BucketType.channel
         )
         self.session = Session()
+        self.media = MediaCache(self.session, cluster_id=cluster_id)
+        self.colors = ColorService(self)
         self.cache = Cache()
         self.tickets = TicketLogs(self)
         self.rival = RivalAPI("1c6ad8e0-6dbc-4e61-9600-275bddf0997d")
         self.proxy_url = os.environ.get("proxy_url")
         self.other_bots = {}
         self.logs = Logs(self)
-        self.ratelimiter = ExpiringDictionary()
         self.pretend_api = os.environ.get("pretend_key")
         self.pretend = API(self.pretend_api) 
         self.tea = BlackTea(self)
         self.an = AntinukeMeasures(self)
         self.embed_build = EmbedScript()
+        self.guild_config = GuildConfigStore(self)
+        self.chunker = GuildChunker(self)
+        self.counters = CounterService(self)
+        self.joins = JoinPipeline(self)
+        self.invite_tracker = InviteTracker(self)
+        self.prefixes = PrefixResolver(self)
+        self.aliases = AliasResolver(self)
+        self.command_policy = CommandPolicies(self)
+        self.blacklist = Blacklist(self)
+        self.tree.interaction_check = self.blacklist.interaction_check
+        self.pipeline = MessagePipeline(self)
+        self.pipeline.register("commands", self.command_stage)
+        self.scheduler = Scheduler(self)
+        self.scheduler.register(
+            "reminder",
+            "reminder",
+            "date",
+            ("guild_id", "user_id", "channel_id"),
+            reminder_task,
+        )
+        self.scheduler.register(
+            "giveaway", "giveaway", "finish", ("channel_id", "message_id"), gw_end
+        )
+        self.scheduler.register(
+            "bump", "bumpreminder", "time", ("channel_id",), bump_remind
+        )
+        self.scheduler.register(
+            "monthly", "authorize", "till", ("guild_id",), check_monthly_guild
+        )
 
     def run(self):
         """
@@ -218,21 +271,14 @@ class Pretend(commands.AutoShardedBot):
         Get the dominant color of a discord asset or image link
         """
 
-        if isinstance(url, discord.Asset):
-            url = url.url
-
-        img = Image.open(BytesIO(await self.session.get_bytes(url)))
-        img.thumbnail((32, 32))
-
-        colors = await asyncio.to_thread(lambda: colorgram.extract(img, 1))
-        return discord.Color.from_rgb(*list(colors[0].rgb)).value
+        return await self.colors.get(url)
 
     async def getbyte(self, url: str) -> BytesIO:
         """
         Get the BytesIO object of an url
         """
 
-        return BytesIO(await self.session.get_bytes(url))
+        return BytesIO(await self.media.get(url))
 
     async def create_db(self) -> asyncpg.Pool:
         """
@@ -246,10 +292,14 @@ class Pretend(commands.AutoShardedBot):
         self, message: discord.Message, cls=PretendContext
     ) -> PretendContext:
         """
-        Get the bot's custom context
+        Get the bot's custom context, resolving the guild's command aliases
         """
 
-        return await super().get_context(message, cls=cls)
+        ctx = await super().get_context(message, cls=cls)
+        if ctx.command is None and ctx.invoked_with and ctx.guild:
+            ctx.command = self.aliases.resolve(ctx.guild.id, ctx.invoked_with)
+
+        return ctx
 
     async def start_loops(self) -> None:
         """
@@ -259,10 +309,7 @@ class Pretend(commands.AutoShardedBot):
         shit_loop.start(self)
         snipe_delete.start(self)
         pomelo_task.start(self)
-        gw_loop.start(self)
-        bump_remind.start(self)
-        check_monthly_guilds.start(self)
-        reminder_task.start(self)
+        self.scheduler.start()
         counter_update.start(self)
 
     def url_encode(self, url: str):
@@ -272,8 +319,32 @@ class Pretend(commands.AutoShardedBot):
 
         return urllib.parse.unquote(urllib.parse.quote_plus(url))
 
+    def owns_guild(self, guild_id: int) -> bool:
+        """
+        Whether the guild belongs to one of the shards of this cluster
+        """
+
+        if self.shard_ids is None:
+            return True
+
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+
+    async def before_identify_hook(self, shard_id: int, *, initial: bool = False):
+        if self.clusters == 1:
+            return await super().before_identify_hook(shard_id, initial=initial)
+
+        # every cluster shares the identify rate limit of the token
+        while not await self.redis.set("identify", self.cluster_id, nx=True, ex=5):
+            await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        self.ipc.stop()
+        self.chunker.stop()
+        await super().close()
+        await self.session.close()
+
     async def setup_hook(self) -> None:
-        self.session2 = aiohttp.ClientSession()
+        self.session2 = self.session.client
         from .redis import PretendRedis
 
         self.redis = await PretendRedis.from_url()
@@ -282,6 +353,15 @@ class Pretend(commands.AutoShardedBot):
         if not self.db:
             self.db = await self.create_db()
 
+        await self.guild_config.setup()
+        await self.scheduler.setup()
+        await self.prefixes.setup()
+        await self.blacklist.setup()
+        await self.tickets.setup()
+        await self.ipc.start()
+        if self.clusters > 1:
+            self.db.on_write = self.ipc.invalidate
+
         self.bot_invite = discord.utils.oauth_url(
             client_id=self.user.id, permissions=discord.Permissions(8)
         )
@@ -320,30 +400,48 @@ class Pretend(commands.AutoShardedBot):
         self.add_view(TicketView(self, True))
 
     async def on_ready(self) -> None:
-        asyncio.ensure_future(self.__chunk_guilds())
+        self.chunker.start(self.guilds)
         log.info(f"Connected as {self.user}")
       #  await Music(self).start_nodes()
         await self.load()
         await self.start_loops()
    
-    async def __chunk_guilds(self):
-        for guild in self.guilds: 
-            await asyncio.sleep(0.1)
-            await guild.chunk(cache=True) 
-
-    async def do_aliases(self, ctx: PretendContext):
-        aliases = await self.db.fetch('SELECT alias, command_name FROM aliases WHERE guild_id = $1', ctx.guild.id)
-        if not aliases: return
-        ctx.message = copy(ctx.message)
-        m = ctx.message.content.strip(ctx.prefix).lower().split(' ')
-        for alias, command_name in aliases:
-            if alias.lower() in m:
-                i = m.index(alias.lower())
-                m[i] = m[i].replace(alias.lower(),command_name.lower())
-        ctx.message.content = ctx.prefix+" ".join(d for d in m)
-#        log.info(f'{ctx.message.content}')
-        return await self.process_commands(ctx.message)
-
+    async def on_shard_ready(self, shard_id: int) -> None:
+        await self.guild_config.load_shard(shard_id)
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        if self.blacklist.guild(guild.id):
+            return await guild.leave()
+
+        await self.guild_config.load([guild.id])
+        self.chunker.request(guild, self.chunker.priority(guild))
+
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.counters.member_join(member)
+        self.joins.push(member)
+
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.counters.member_remove(member)
+
+    async def on_member_update(
+        self, before: discord.Member, after: discord.Member
+    ) -> None:
+        self.counters.member_update(before, after)
+
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ) -> None:
+        self.counters.voice_state_update(member, before, after)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.guild_config.forget(guild.id)
+        self.an.policies.pop(guild.id, None)
+        self.aliases.forget(guild.id)
+        self.command_policy.forget(guild.id)
+        self.invite_tracker.forget(guild.id)
 
     async def on_command_error(
         self, ctx: PretendContext, error: commands.CommandError
@@ -361,17 +459,6 @@ class Pretend(commands.AutoShardedBot):
    #     if ctx.author.name == 'aiohttp':
     #        await ctx.send(str(error))
      #       await ctx.send(type(error))
-        if isinstance(error, discord.ext.commands.errors.CommandNotFound):
-            log.info('command not found lol')
-            return await self.do_aliases(ctx)
-            for alias, command_name in await ctx.bot.db.fetch('SELECT alias, command_name FROM aliases WHERE guild_id = $1', ctx.guild.id):
-                if alias.lower() in ctx.message.content.lower():
-                    m = copy(ctx.message)
-                    m.content = m.content.lower().replace(alias.lower(), command_name.lower())
-                    return await self.get_context(m).invoke()
-
-            return await ctx.send_warning(f"command `{ctx.message.content.split(ctx.prefix)[1]}` not found")
-
         if isinstance(
             error,
             (commands.CommandOnCooldown, commands.CommandNotFound, commands.NotOwner),
@@ -412,28 +499,13 @@ class Pretend(commands.AutoShardedBot):
         Returns a list of the bot's prefixes
         """
 
-        prefixes = set()
-        r = await self.db.fetchrow(
-            "SELECT prefix FROM selfprefix WHERE user_id = $1", message.author.id
-        )
-        if r:
-            prefixes.add(r[0])
-        re = await self.db.fetchrow(
-            "SELECT prefix FROM prefixes WHERE guild_id = $1", message.guild.id
-        )
-        if re:
-            prefixes.add(re[0])
-        else:
-            prefixes.add(",")
-        return set(prefixes)
+        return set((await self.prefixes.resolve(message)).prefixes)
 
-    def member_cooldown(self, message: discord.Message) -> Optional[int]:
-        bucket = self.mcd.get_bucket(message)
-        return bucket.update_rate_limit()
+    async def member_cooldown(self, message: discord.Message) -> Optional[float]:
+        return await self.mcd.shared_hit(message)
 
-    def channel_cooldown(self, message: discord.Message) -> Optional[int]:
-        bucket = self.ccd.get_bucket(message)
-        return bucket.update_rate_limit()
+    def channel_cooldown(self, message: discord.Message) -> Optional[float]:
+        return self.ccd.hit(message)
 
     def is_dangerous(self, role: discord.Role) -> bool:
         """
@@ -466,14 +538,12 @@ class Pretend(commands.AutoShardedBot):
         """
         Process a command from the given message
         """
-        if not self.is_ready(): 
+        if not self.is_ready() or not message.guild:
             return
-        
-        if message.content.startswith(
-            tuple(await self.get_prefixes(message))
-        ) or message.content.startswith(f"<@{self.user.id}>"):
+
+        if (await self.prefixes.resolve(message)).matches(message.content):
             channel_rl = self.channel_cooldown(message)
-            member_rl = self.member_cooldown(message)
+            member_rl = await self.member_cooldown(message)
 
             if channel_rl or member_rl:
                 return
@@ -487,37 +557,34 @@ class Pretend(commands.AutoShardedBot):
             return
 
         if before.content != after.content:
-            if after.content.startswith(
-                tuple(await self.get_prefixes(after))
-            ) or after.content.startswith(f"<@{self.user.id}>"):
-                return await self.process_commands(after)
+            return await self.process_commands(after)
 
     async def on_message(self, message: discord.Message) -> Any:
-        if not message.author.bot and message.guild:
-            perms = message.channel.permissions_for(message.guild.me)
-            if perms.send_messages and perms.embed_links:
-                if not await self.db.fetchrow(
-                    "SELECT * FROM blacklist WHERE id = $1 AND type = $2",
-                    message.author.id,
-                    "user",
-                ):
-                    if message.content == f"<@{self.user.id}>":
-                        channel_rl = self.channel_cooldown(message)
-                        member_rl = self.member_cooldown(message)
-
-                        if not channel_rl and not member_rl:
-                            prefixes = ", ".join(
-                                f"`{p}`" for p in await self.get_prefixes(message)
-                            )
-                            ctx = await self.get_context(message)
-                            return await ctx.send(
-                                embed=discord.Embed(
-                                    color=self.color,
-                                    description=f"Your {'prefix is' if len(await self.get_prefixes(message)) == 1 else 'prefixes are'}: {prefixes}",
-                                )
-                            )
-
-                    await self.process_commands(message)
+        await self.pipeline.dispatch(message)
+
+    async def command_stage(self, event: MessageEvent) -> Any:
+        """
+        The command handling stage of the message pipeline
+        """
+
+        message = event.message
+        if event.can_reply and not event.blacklisted:
+            if message.content == f"<@{self.user.id}>":
+                channel_rl = self.channel_cooldown(message)
+                member_rl = await self.member_cooldown(message)
+
+                if not channel_rl and not member_rl:
+                    matcher = await self.prefixes.resolve(message)
+                    prefixes = ", ".join(f"`{p}`" for p in matcher.prefixes)
+                    ctx = await self.get_context(message)
+                    return await ctx.send(
+                        embed=discord.Embed(
+                            color=self.color,
+                            description=f"Your {'prefix is' if len(matcher.prefixes) == 1 else 'prefixes are'}: {prefixes}",
+                        )
+                    )
+
+            await self.process_commands(message)
 
 
 async def getprefix(bot: Pretend, message: discord.Message) -> List[str]:
@@ -526,8 +593,7 @@ async def getprefix(bot: Pretend, message: discord.Message) -> List[str]:
     """
 
     if message.guild:
-        prefixes = list(map(lambda x: x, await bot.get_prefixes(message)))
-        return commands.when_mentioned_or(*prefixes)(bot, message)
+        return list((await bot.prefixes.resolve(message)).everything)
 
 # THIS CODE SUCKS,
 # LIM IS A CRAZY SKID 😭
@@ -1,20 +1,21 @@
 from PIL import Image, ImageDraw, ImageFont
 from textwrap import wrap
-from aiohttp import ClientSession as Session
+from .misc.session import Session
+from .media import MediaCache
 from aiofiles import open as async_open
 from typing import Optional
 from io import BytesIO
 from asyncio import to_thread as thread
 
 class Caption:
-	def __init__(self, font_path: Optional[str] = "/root/impact.ttf"):
+	def __init__(self, font_path: Optional[str] = "/root/impact.ttf", media: Optional[MediaCache] = None):
 		self.font_path = font_path
+		self.media = media
 
 	async def download_image(self, url: str) -> bytes:
-		async with Session() as session:
-			async with session.get(url) as response:
-				data = await response.read()
-		return data
+		if self.media:
+			return await self.media.get(url)
+		return await Session().get_bytes(url)
 	
 	async def get_bytes(self, fp: str) -> bytes:
 		async with async_open(fp, "rb") as file:
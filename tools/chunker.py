@@ -0,0 +1,180 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from discord import Guild
+from discord.ext.commands import AutoShardedBot as AB
+
+log = logging.getLogger(__name__)
+
+# lower goes first
+ACTIVE = 0
+CONFIGURED = 1
+IDLE = 2
+
+
+class GuildChunker:
+    """
+    Chunks guilds in the background, one queue per shard
+
+    Guilds something is waiting on go first, then guilds with any config,
+    then the rest, smaller guilds first within each priority. Every shard
+    runs a few workers sharing a token bucket kept below the gateway
+    limit of 120 commands per minute, so heartbeats still get through
+    """
+
+    def __init__(
+        self,
+        bot: AB,
+        concurrency: int = 2,
+        rate: int = 90,
+        per: float = 60.0,
+        timeout: float = 60.0,
+    ):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.rate = rate
+        self.per = per
+        self.timeout = timeout
+        self.queues: Dict[int, List[Tuple[int, int, int, int]]] = {}
+        self.queued: Dict[int, int] = {}
+        self.wakeups: Dict[int, asyncio.Event] = {}
+        self.workers: Dict[int, List[asyncio.Task]] = {}
+        self.waiters: Dict[int, asyncio.Event] = {}
+        self.counter = itertools.count()
+        self.chunked = 0
+        self.failed = 0
+        self.members = 0
+        self.elapsed = 0.0
+
+    def __repr__(self) -> str:
+        return f"<GuildChunker queued={len(self.queued)} chunked={self.chunked} failed={self.failed}>"
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queued": len(self.queued),
+            "chunked": self.chunked,
+            "failed": self.failed,
+            "members": self.members,
+            "average": self.elapsed / self.chunked if self.chunked else 0.0,
+            "remaining": sum(1 for g in self.bot.guilds if not g.chunked),
+        }
+
+    def priority(self, guild: Guild) -> int:
+        config = self.bot.guild_config
+        if any(config.get(table, guild.id) for table in config.tables):
+            return CONFIGURED
+
+        return IDLE
+
+    def start(self, guilds: Iterable[Guild]) -> None:
+        """
+        Queue every guild that isn't chunked yet
+        """
+
+        for guild in guilds:
+            self.request(guild, self.priority(guild))
+
+    def stop(self) -> None:
+        for workers in self.workers.values():
+            for worker in workers:
+                worker.cancel()
+
+        self.workers.clear()
+
+    def request(self, guild: Guild, priority: int = IDLE) -> None:
+        """
+        Queue a guild, or move it up if it's queued with a lower priority
+        """
+
+        if guild.chunked or self.queued.get(guild.id, IDLE + 1) <= priority:
+            return
+
+        self.queued[guild.id] = priority
+        queue = self.queues.setdefault(guild.shard_id, [])
+        heapq.heappush(
+            queue, (priority, guild.member_count or 0, next(self.counter), guild.id)
+        )
+
+        self.wakeups.setdefault(guild.shard_id, asyncio.Event()).set()
+        if guild.shard_id not in self.workers:
+            self.workers[guild.shard_id] = [
+                asyncio.ensure_future(self.worker(guild.shard_id))
+                for _ in range(self.concurrency)
+            ]
+
+    def ready(self, guild: Guild) -> bool:
+        """
+        Whether a guild is chunked, queueing it first in line if it isn't
+        """
+
+        if guild.chunked:
+            return True
+
+        self.request(guild, ACTIVE)
+        return False
+
+    async def wait(self, guild: Guild, timeout: Optional[float] = None) -> bool:
+        """
+        Wait up to timeout for a guild to be chunked, returns whether it is
+        """
+
+        if self.ready(guild):
+            return True
+
+        event = self.waiters.setdefault(guild.id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        return guild.chunked
+
+    async def worker(self, shard_id: int) -> None:
+        queue = self.queues[shard_id]
+        wakeup = self.wakeups[shard_id]
+        while True:
+            if not queue:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+
+            priority, _, _, guild_id = heapq.heappop(queue)
+            if self.queued.get(guild_id) != priority:
+                # queued again with a higher priority
+                continue
+
+            del self.queued[guild_id]
+            guild = self.bot.get_guild(guild_id)
+            if guild and not guild.chunked:
+                while retry_after := self.bot.ratelimiter.bucket(
+                    f"chunk:{shard_id}", self.rate, self.per
+                ):
+                    await asyncio.sleep(retry_after)
+
+                await self.chunk(guild)
+
+            if event := self.waiters.pop(guild_id, None):
+                event.set()
+
+    async def chunk(self, guild: Guild) -> None:
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(guild.chunk(cache=True), self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            log.warning(f"Unable to chunk {guild.id}: {e}")
+            return
+
+        self.chunked += 1
+        self.members += guild.member_count or 0
+        self.elapsed += time.monotonic() - start
+        if self.chunked % 100 == 0:
+            log.info(f"Chunked {self.chunked} guilds, {len(self.queued)} queued")
@@ -0,0 +1,276 @@
+import time
+import uuid
+import signal
+import asyncio
+import logging
+import multiprocessing
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import orjson
+
+from discord.ext.commands import AutoShardedBot as AB
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "pretend:ipc"
+
+Handler = Callable[[Any], Awaitable[Any]]
+
+
+def shard_ranges(shard_count: int, clusters: int) -> List[List[int]]:
+    """
+    Split the shards in contiguous ranges, one per cluster
+    """
+
+    clusters = max(min(clusters, shard_count), 1)
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for cluster_id in range(clusters):
+        end = start + size + (cluster_id < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+class ClusterIPC:
+    """
+    Requests between clusters over redis pub/sub
+
+    Every cluster listens on the shared channel and on its own reply
+    channel. A request is answered by every cluster, itself included
+    """
+
+    def __init__(self, bot: AB):
+        self.bot = bot
+        self.handlers: Dict[str, Handler] = {}
+        self.pending: Dict[str, Dict[int, Any]] = {}
+        self.events: Dict[str, asyncio.Event] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.written: Set[str] = set()
+        self.register("stats", self.stats)
+        self.register("invalidate", self.on_invalidate)
+
+    def __repr__(self) -> str:
+        return f"<ClusterIPC cluster={self.cluster_id} handlers={len(self.handlers)}>"
+
+    @property
+    def cluster_id(self) -> int:
+        return self.bot.cluster_id
+
+    def register(self, op: str, handler: Handler) -> None:
+        self.handlers[op] = handler
+
+    def unregister(self, op: str) -> None:
+        self.handlers.pop(op, None)
+
+    async def start(self) -> None:
+        if self.task and not self.task.done():
+            return
+
+        pubsub = self.bot.redis.pubsub()
+        await pubsub.subscribe(CHANNEL, f"{CHANNEL}:{self.cluster_id}")
+        self.task = asyncio.ensure_future(self.listen(pubsub))
+
+    def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+    async def listen(self, pubsub) -> None:
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+
+                try:
+                    payload = orjson.loads(message["data"])
+                except orjson.JSONDecodeError:
+                    continue
+
+                if "reply" in payload:
+                    self.on_reply(payload)
+                elif not (payload.get("others") and payload["from"] == self.cluster_id):
+                    asyncio.ensure_future(self.handle(payload))
+        finally:
+            await pubsub.close()
+
+    def on_reply(self, payload: dict) -> None:
+        if (replies := self.pending.get(payload["reply"])) is None:
+            return
+
+        replies[payload["cluster"]] = payload["data"]
+        if len(replies) >= self.bot.clusters:
+            self.events[payload["reply"]].set()
+
+    async def handle(self, payload: dict) -> None:
+        handler = self.handlers.get(payload["op"])
+        if handler is None:
+            data = {"error": f"Unknown operation {payload['op']}"}
+        else:
+            try:
+                data = await handler(payload.get("data"))
+            except Exception as e:
+                log.exception(f"IPC {payload['op']} failed")
+                data = {"error": str(e)}
+
+        if payload.get("nonce"):
+            await self.bot.redis.publish(
+                f"{CHANNEL}:{payload['from']}",
+                orjson.dumps(
+                    {"reply": payload["nonce"], "cluster": self.cluster_id, "data": data}
+                ),
+            )
+
+    async def request(
+        self, op: str, data: Any = None, timeout: float = 5.0
+    ) -> Dict[int, Any]:
+        """
+        Ask every cluster, returns the answers received before timeout by cluster id
+        """
+
+        nonce = uuid.uuid4().hex
+        self.pending[nonce] = {}
+        self.events[nonce] = asyncio.Event()
+        try:
+            await self.bot.redis.publish(
+                CHANNEL,
+                orjson.dumps(
+                    {"op": op, "data": data, "from": self.cluster_id, "nonce": nonce}
+                ),
+            )
+            await asyncio.wait_for(self.events[nonce].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.events.pop(nonce, None)
+            replies = self.pending.pop(nonce)
+
+        return dict(sorted(replies.items()))
+
+    async def broadcast(self, op: str, data: Any = None) -> None:
+        """
+        Run an operation on every other cluster without waiting for it
+        """
+
+        await self.bot.redis.publish(
+            CHANNEL,
+            orjson.dumps(
+                {"op": op, "data": data, "from": self.cluster_id, "others": True}
+            ),
+        )
+
+    def invalidate(self, table: str) -> None:
+        """
+        Drop a table from the query cache of the other clusters
+
+        Tables written within the same loop iteration go out as one broadcast
+        """
+
+        if not self.written:
+            asyncio.get_running_loop().call_soon(self.flush_invalidations)
+
+        self.written.add(table)
+
+    def flush_invalidations(self) -> None:
+        tables, self.written = sorted(self.written), set()
+        asyncio.ensure_future(self.send_invalidations(tables))
+
+    async def send_invalidations(self, tables: List[str]) -> None:
+        try:
+            await self.broadcast("invalidate", tables)
+        except Exception as e:
+            log.warning(f"Unable to invalidate {tables} on the other clusters: {e}")
+
+    async def on_invalidate(self, tables: List[str]) -> None:
+        self.bot.db.invalidate(*tables)
+
+    async def stats(self, _: Any = None) -> Dict[str, Any]:
+        return {
+            "cluster": self.cluster_id,
+            "shards": sorted(self.bot.shards),
+            "guilds": len(self.bot.guilds),
+            "users": sum(g.member_count or 0 for g in self.bot.guilds),
+            "latency": round(self.bot.latency * 1000),
+        }
+
+
+class ClusterLauncher:
+    """
+    Runs every cluster in its own process, restarting the ones that exit
+    """
+
+    def __init__(
+        self,
+        target: Callable[[int, List[int], int, int], Any],
+        clusters: int,
+        shard_count: int,
+    ):
+        self.target = target
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, clusters)
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.started: Dict[int, float] = {}
+        self.restarts: Dict[int, int] = {}
+        self.stopping = False
+
+    def spawn(self, cluster_id: int) -> None:
+        process = self.context.Process(
+            target=self.target,
+            args=(
+                cluster_id,
+                self.ranges[cluster_id],
+                self.shard_count,
+                len(self.ranges),
+            ),
+            name=f"cluster-{cluster_id}",
+        )
+        process.start()
+        self.processes[cluster_id] = process
+        self.started[cluster_id] = time.monotonic()
+        log.info(
+            f"Started cluster {cluster_id} (pid {process.pid}) with shards {self.ranges[cluster_id]}"
+        )
+
+    def stop(self, *_) -> None:
+        self.stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        for cluster_id in range(len(self.ranges)):
+            self.spawn(cluster_id)
+
+        restart_at: Dict[int, float] = {}
+        while not self.stopping:
+            time.sleep(1)
+            now = time.monotonic()
+            for cluster_id, process in self.processes.items():
+                if process.is_alive():
+                    continue
+
+                if cluster_id not in restart_at:
+                    # back off when a cluster keeps dying right after starting
+                    if now - self.started[cluster_id] > 300:
+                        self.restarts[cluster_id] = 0
+
+                    restarts = self.restarts.get(cluster_id, 0)
+                    self.restarts[cluster_id] = restarts + 1
+                    restart_at[cluster_id] = now + min(2**restarts, 60)
+                    log.warning(
+                        f"Cluster {cluster_id} exited with {process.exitcode}, restarting"
+                    )
+
+                elif restart_at[cluster_id] <= now:
+                    del restart_at[cluster_id]
+                    self.spawn(cluster_id)
+
+        for process in self.processes.values():
+            process.terminate()
+
+        for process in self.processes.values():
+            process.join(10)
+            if process.is_alive():
+                process.kill()
@@ -0,0 +1,193 @@
+import re
+import asyncio
+import logging
+import colorgram
+
+from io import BytesIO
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Union
+
+from PIL import Image
+from discord import Asset
+from xxhash import xxh3_64_hexdigest
+
+try:
+    import numpy as np
+except ImportError:  # colorgram is used instead
+    np = None
+
+log = logging.getLogger(__name__)
+
+# cdn urls embed the asset hash, so resized / reformatted urls share a key
+CDN_ASSET = re.compile(
+    r"^https://(?:cdn|media)\.discordapp\.(?:com|net)/.*?/(\d+)/((?:a_)?[0-9a-f]{32})\."
+)
+
+
+def extract(data: bytes) -> int:
+    """
+    Dominant color of an image, decoded at thumbnail size
+    """
+
+    img = Image.open(BytesIO(data))
+    if img.format == "JPEG":
+        # let the jpeg decoder downscale while decoding
+        img.draft("RGB", (64, 64))
+
+    img.thumbnail((32, 32))
+
+    if np is None:
+        r, g, b = colorgram.extract(img.convert("RGB"), 1)[0].rgb
+        return r << 16 | g << 8 | b
+
+    pixels = np.asarray(img.convert("RGBA"), dtype=np.uint8).reshape(-1, 4)
+    opaque = pixels[pixels[:, 3] >= 128][:, :3]
+    if not len(opaque):
+        opaque = pixels[:, :3]
+
+    # 4 bits per channel histogram, then average the pixels of the fullest bin
+    bins = (
+        (opaque[:, 0].astype(np.int32) >> 4) << 8
+        | (opaque[:, 1].astype(np.int32) >> 4) << 4
+        | opaque[:, 2].astype(np.int32) >> 4
+    )
+    top = np.bincount(bins, minlength=4096).argmax()
+    r, g, b = opaque[bins == top].mean(axis=0).astype(int)
+    return int(r) << 16 | int(g) << 8 | int(b)
+
+
+def extract_many(blobs: List[bytes]) -> List[Union[int, Exception]]:
+    results = []
+    for data in blobs:
+        try:
+            results.append(extract(data))
+        except Exception as e:
+            results.append(e)
+
+    return results
+
+
+class ColorService:
+    """
+    Memoized dominant colors, keyed by discord asset hash
+    """
+
+    def __init__(
+        self,
+        bot,
+        max_entries: int = 20_000,
+        expire: int = 60 * 60 * 24 * 30,
+        batch_delay: float = 0.005,
+    ):
+        self.bot = bot
+        self.max_entries = max_entries
+        self.expire = expire
+        self.batch_delay = batch_delay
+        self.colors: "OrderedDict[str, int]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.queue: List[Tuple[bytes, asyncio.Future]] = []
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    def __repr__(self) -> str:
+        return f"<ColorService entries={len(self.colors)} hits={self.hits} misses={self.misses}>"
+
+    @staticmethod
+    def key(url: Union[Asset, str]) -> str:
+        if isinstance(url, Asset):
+            return f"asset:{url.key}"
+
+        if match := CDN_ASSET.match(url):
+            return f"asset:{match.group(2)}"
+
+        return f"url:{xxh3_64_hexdigest(url)}"
+
+    @property
+    def redis(self):
+        return getattr(self.bot, "redis", None)
+
+    async def get(self, url: Union[Asset, str]) -> int:
+        """
+        Dominant color of an asset or image link
+        """
+
+        key = self.key(url)
+        if (color := self.colors.get(key)) is not None:
+            self.colors.move_to_end(key)
+            self.hits += 1
+            return color
+
+        if not (task := self.inflight.get(key)):
+            task = self.inflight[key] = asyncio.ensure_future(self.lookup(key, url))
+
+        # a cancelled caller doesn't cancel the lookup for the others
+        return await asyncio.shield(task)
+
+    async def lookup(self, key: str, url: Union[Asset, str]) -> int:
+        try:
+            color = await self.resolve(key, url)
+            self.remember(key, color)
+            return color
+        finally:
+            self.inflight.pop(key, None)
+
+    async def resolve(self, key: str, url: Union[Asset, str]) -> int:
+        if self.redis:
+            try:
+                if (cached := await self.redis.get(f"color:{key}")) is not None:
+                    self.redis_hits += 1
+                    return int(cached)
+            except Exception as e:
+                log.warning(f"Unable to read dominant color from redis: {e}")
+
+        self.misses += 1
+        if isinstance(url, Asset):
+            url = url.url
+
+        color = await self.compute(await self.bot.media.get(url))
+
+        if self.redis:
+            try:
+                await self.redis.set(f"color:{key}", color, ex=self.expire)
+            except Exception as e:
+                log.warning(f"Unable to store dominant color in redis: {e}")
+
+        return color
+
+    def remember(self, key: str, color: int) -> None:
+        self.colors[key] = color
+        self.colors.move_to_end(key)
+        while len(self.colors) > self.max_entries:
+            self.colors.popitem(last=False)
+
+    async def compute(self, data: bytes) -> int:
+        """
+        Queue an image for extraction; images queued together share one thread hop
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((data, future))
+        if len(self.queue) == 1:
+            asyncio.ensure_future(self.drain())
+
+        return await future
+
+    async def drain(self) -> None:
+        await asyncio.sleep(self.batch_delay)
+        batch, self.queue = self.queue, []
+        self.batches += 1
+
+        try:
+            results = await asyncio.to_thread(extract_many, [d for d, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
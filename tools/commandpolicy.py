@@ -0,0 +1,110 @@
+import logging
+
+from typing import Dict, FrozenSet, List
+
+import orjson
+
+from discord import Member, Permissions
+from discord.ext.commands import AutoShardedBot as AB
+
+from .database import Record
+
+log = logging.getLogger(__name__)
+
+ADMINISTRATOR = Permissions(administrator=True).value
+
+
+def permission_mask(names: List[str]) -> int:
+    """
+    Bitmask of the given permission names, unknown names are left out
+    """
+
+    mask = 0
+    for name in names:
+        flag = Permissions.VALID_FLAGS.get(name)
+        if flag is None:
+            log.debug(f"Ignoring unknown fake permission {name}")
+            continue
+
+        mask |= flag
+
+    return mask
+
+
+class CommandPolicy:
+    """
+    A guild's disabled commands and fake permissions
+    """
+
+    __slots__ = ("rows", "disabled", "fake")
+
+    def __init__(self, disabled: List[Record], fake_perms: List[Record]):
+        self.rows = (disabled, fake_perms)
+        self.disabled: FrozenSet[str] = frozenset(r["cmd"] for r in disabled)
+        self.fake: Dict[int, int] = {}
+        for row in fake_perms:
+            if mask := permission_mask(orjson.loads(row["perms"])):
+                self.fake[int(row["role_id"])] = mask
+
+    def __repr__(self) -> str:
+        return f"<CommandPolicy disabled={len(self.disabled)} roles={len(self.fake)}>"
+
+    def compiled_from(self, disabled: List[Record], fake_perms: List[Record]) -> bool:
+        return all(
+            rows is compiled or not (rows or compiled)
+            for rows, compiled in zip((disabled, fake_perms), self.rows)
+        )
+
+    def is_disabled(self, name: str) -> bool:
+        return name in self.disabled
+
+    def fake_permissions(self, member: Member) -> int:
+        if not self.fake:
+            return 0
+
+        # _roles leaves out @everyone, which shares the guild's id
+        mask = self.fake.get(member.guild.id, 0)
+        for role in member._roles:
+            mask |= self.fake.get(role, 0)
+
+        return mask
+
+    def allows(self, member: Member, required: int) -> bool:
+        """
+        Whether a member has any of the required permissions, fake ones included
+        """
+
+        if member.guild_permissions.value & required:
+            return True
+
+        mask = self.fake_permissions(member)
+        return bool(mask & (required | ADMINISTRATOR))
+
+
+class CommandPolicies:
+    """
+    Command policies of every guild, compiled from the guild config store
+    """
+
+    def __init__(self, bot: AB):
+        self.bot = bot
+        self.policies: Dict[int, CommandPolicy] = {}
+
+    def __repr__(self) -> str:
+        return f"<CommandPolicies guilds={len(self.policies)}>"
+
+    async def get(self, guild_id: int) -> CommandPolicy:
+        config = self.bot.guild_config
+        if guild_id not in config.loaded:
+            await config.load([guild_id])
+
+        disabled = config.get("disablecmd", guild_id)
+        fake_perms = config.get("fake_perms", guild_id)
+        policy = self.policies.get(guild_id)
+        if not policy or not policy.compiled_from(disabled, fake_perms):
+            policy = self.policies[guild_id] = CommandPolicy(disabled, fake_perms)
+
+        return policy
+
+    def forget(self, guild_id: int) -> None:
+        self.policies.pop(guild_id, None)
@@ -0,0 +1,43 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zlib is used instead
+    zstandard = None
+
+CODEC = "zstd" if zstandard else "zlib"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class MissingCodec(RuntimeError):
+    pass
+
+
+def compressor():
+    """
+    A streaming compressor, zstd when it's installed
+    """
+
+    if zstandard:
+        return zstandard.ZstdCompressor(level=10).compressobj()
+
+    return zlib.compressobj(6)
+
+
+def compress(data: bytes) -> bytes:
+    stream = compressor()
+    return stream.compress(data) + stream.flush()
+
+
+def decompress(data: bytes) -> bytes:
+    """
+    Decompress zstd or zlib data, told apart by the zstd frame magic
+    """
+
+    if data[:4] == ZSTD_MAGIC:
+        if not zstandard:
+            raise MissingCodec("zstd compressed data needs zstandard installed")
+
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    return zlib.decompress(data)
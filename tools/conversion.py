@@ -2,7 +2,7 @@ from asyncio import gather, to_thread as thread, sleep, create_subprocess_shell
 from asyncio.subprocess import PIPE
 from aiofiles import open as async_open
 import os
-from aiohttp import ClientSession as Session
+from .misc.session import Session
 from io import BytesIO
 from tuuid import tuuid
 from discord import File, Embed
@@ -13,9 +13,7 @@ class Conversion:
         self.command = "ffmpeg"
     
     async def download(self, url: str) -> str:
-        async with Session() as session:
-            async with session.get(url) as resp:
-                data = await resp.read()
+        data = await Session().get_bytes(url)
         fp = f"{tuuid()}.mp4"
         async with async_open(fp, "wb") as file:
             await file.write(data)
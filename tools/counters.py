@@ -0,0 +1,202 @@
+import time
+import logging
+
+from typing import Dict, List, Optional, Set
+
+from discord import Guild, HTTPException, Member, VoiceChannel, VoiceState
+from discord.ext.commands import AutoShardedBot as AB
+
+from .database import Record
+
+log = logging.getLogger(__name__)
+
+
+class GuildCounts:
+    __slots__ = ("humans", "bots", "boosters", "voice")
+
+    def __init__(self, guild: Guild):
+        self.humans = self.bots = 0
+        for member in guild.members:
+            if member.bot:
+                self.bots += 1
+            else:
+                self.humans += 1
+
+        self.boosters = len(guild.premium_subscribers)
+        self.voice = sum(len(c.members) for c in guild.voice_channels)
+
+    def __repr__(self) -> str:
+        return f"<GuildCounts humans={self.humans} bots={self.bots} boosters={self.boosters} voice={self.voice}>"
+
+
+class CounterService:
+    """
+    Counter channels kept up to date from member and voice events
+
+    Counts are taken from the member list once, when the guild is
+    chunked, then adjusted by every event. Only guilds whose counts
+    changed are rendered, channels already showing the right name are
+    left alone and renames stay under discord's 2 per 10 minutes
+    """
+
+    def __init__(
+        self,
+        bot: AB,
+        reload_every: float = 600.0,
+        renames: int = 2,
+        per: float = 600.0,
+    ):
+        self.bot = bot
+        self.reload_every = reload_every
+        self.renames = renames
+        self.per = per
+        self.rows: Dict[int, List[Record]] = {}
+        self.counts: Dict[int, GuildCounts] = {}
+        self.dirty: Set[int] = set()
+        self.loaded_at = 0.0
+        self.edits = 0
+        self.skipped = 0
+
+    def __repr__(self) -> str:
+        return f"<CounterService guilds={len(self.rows)} dirty={len(self.dirty)} edits={self.edits}>"
+
+    async def load(self) -> None:
+        """
+        Read the counter channels of the guilds running here
+        """
+
+        rows: Dict[int, List[Record]] = {}
+        for result in await self.bot.db.fetch("SELECT * FROM counters"):
+            if channel := self.bot.get_channel(int(result["channel_id"])):
+                rows.setdefault(channel.guild.id, []).append(result)
+
+        for guild_id in set(self.counts) - set(rows):
+            del self.counts[guild_id]
+
+        self.rows = rows
+        self.dirty.update(rows)
+        self.loaded_at = time.monotonic()
+
+    def get(self, guild: Guild) -> Optional[GuildCounts]:
+        if guild.id not in self.rows:
+            return None
+
+        if (counts := self.counts.get(guild.id)) is None:
+            if not self.bot.chunker.ready(guild):
+                return None
+
+            counts = self.counts[guild.id] = GuildCounts(guild)
+
+        return counts
+
+    def member_join(self, member: Member) -> None:
+        self.member_change(member, 1)
+
+    def member_remove(self, member: Member) -> None:
+        self.member_change(member, -1)
+
+    def member_change(self, member: Member, delta: int) -> None:
+        if member.guild.id not in self.rows:
+            return
+
+        self.dirty.add(member.guild.id)
+        # counted from the member list once the guild is chunked
+        if (counts := self.counts.get(member.guild.id)) is None:
+            return
+
+        if member.bot:
+            counts.bots += delta
+        else:
+            counts.humans += delta
+
+        if member.premium_since:
+            counts.boosters += delta
+
+    def member_update(self, before: Member, after: Member) -> None:
+        if (before.premium_since is None) == (after.premium_since is None):
+            return
+
+        if counts := self.counts.get(after.guild.id):
+            counts.boosters += 1 if after.premium_since else -1
+            self.dirty.add(after.guild.id)
+
+    def voice_state_update(
+        self, member: Member, before: VoiceState, after: VoiceState
+    ) -> None:
+        was = isinstance(before.channel, VoiceChannel)
+        now = isinstance(after.channel, VoiceChannel)
+        if was == now:
+            return
+
+        if counts := self.counts.get(member.guild.id):
+            counts.voice += 1 if now else -1
+            self.dirty.add(member.guild.id)
+
+    def render(self, guild: Guild, counts: GuildCounts, module: str) -> Optional[str]:
+        match module:
+            case "members":
+                return str(guild.member_count)
+            case "humans":
+                return str(counts.humans)
+            case "bots":
+                return str(counts.bots)
+            case "boosters":
+                return str(counts.boosters)
+            case "voice":
+                return str(counts.voice)
+
+        return None
+
+    async def flush(self) -> None:
+        """
+        Rename the counter channels of every guild whose counts changed
+        """
+
+        if time.monotonic() - self.loaded_at > self.reload_every:
+            await self.load()
+
+        for guild_id in list(self.dirty):
+            guild = self.bot.get_guild(guild_id)
+            if not guild or guild_id not in self.rows:
+                self.dirty.discard(guild_id)
+                continue
+
+            if (counts := self.get(guild)) is None:
+                continue
+
+            if await self.update(guild, counts):
+                self.dirty.discard(guild_id)
+
+    async def update(self, guild: Guild, counts: GuildCounts) -> bool:
+        """
+        Rename the counter channels of a guild, returns False if some have to wait
+        """
+
+        if not guild.me.guild_permissions.manage_channels:
+            return True
+
+        done = True
+        for row in self.rows[guild.id]:
+            channel = guild.get_channel(int(row["channel_id"]))
+            target = self.render(guild, counts, row["module"])
+            if not channel or target is None:
+                continue
+
+            name = row["channel_name"].replace("{target}", target)
+            if channel.name == name:
+                self.skipped += 1
+                continue
+
+            if self.bot.ratelimiter.window(
+                f"counter:{channel.id}", self.renames, self.per
+            ):
+                done = False
+                continue
+
+            try:
+                await channel.edit(name=name, reason="updating counter")
+                self.edits += 1
+            except HTTPException as e:
+                log.warning(f"Unable to update the counter {channel.id}: {e}")
+
+        return done
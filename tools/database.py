@@ -1,20 +1,224 @@
+import re, sys, time
 import asyncpg, os
 import asyncio, orjson
-from typing import Any, Optional, Iterable, Iterator
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Iterable, Iterator, Set, Tuple
 from types import TracebackType
 from typing import Any, Iterable, Optional, Sequence
 
+READ_TABLES = re.compile(r"\b(?:from|join)\s+\"?([a-z_][\w]*)\"?", re.IGNORECASE)
+WRITE_TABLE = re.compile(
+    r"^\s*(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?)\s+\"?([a-z_][\w]*)\"?",
+    re.IGNORECASE,
+)
+VOLATILE = re.compile(r"\b(?:random|now|nextval|current_timestamp|clock_timestamp)\b", re.IGNORECASE)
+
 
 class Record(asyncpg.Record):
     def __getattr__(self, attr: str) -> Any:
         return self[attr]
 
 
+class CacheKey(NamedTuple):
+    method: str
+    tables: Tuple[str, ...]
+    sql: str
+    args: Tuple[Any, ...]
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    expires: float
+    size: int
+
+
+class QueryCache:
+    """
+    LRU + TTL cache for read queries, indexed by the tables each query reads
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 50_000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 300.0,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._tables: Dict[str, Set[CacheKey]] = defaultdict(set)
+        # bumped on every invalidation, so reads that raced a write aren't stored
+        self._generations: Dict[str, int] = defaultdict(int)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"<QueryCache entries={len(self)} bytes={self.bytes} hits={self.hits} misses={self.misses}>"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters describing how much work the cache takes off the pool
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    @staticmethod
+    def key(method: str, sql: str, args: Tuple[Any, ...]) -> Optional[CacheKey]:
+        """
+        Build a cache key for a read query, or None if the query can't be cached
+        """
+
+        if WRITE_TABLE.match(sql) or VOLATILE.search(sql):
+            return None
+
+        tables = tuple(sorted({t.lower() for t in READ_TABLES.findall(sql)}))
+        if not tables:
+            return None
+
+        try:
+            hash(args)
+        except TypeError:
+            return None
+
+        return CacheKey(method, tables, sql, args)
+
+    @staticmethod
+    def sizeof(value: Any) -> int:
+        """
+        Rough memory footprint of a query result
+        """
+
+        if value is None:
+            return 16
+
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + sum(QueryCache.sizeof(v) for v in value)
+
+        if isinstance(value, asyncpg.Record):
+            return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+
+        return sys.getsizeof(value)
+
+    def get(self, key: CacheKey) -> Tuple[bool, Any]:
+        """
+        Returns (found, value); a found None / [] is a cached negative result
+        """
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        if entry.expires < time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry.value
+
+    def generation(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._generations[t] for t in tables)
+
+    def set(
+        self,
+        key: CacheKey,
+        value: Any,
+        ttl: Optional[float] = None,
+        generation: Optional[Tuple[int, ...]] = None,
+    ) -> None:
+        """
+        Store a query result and evict the least recently used entries over budget
+
+        generation is the one of the key's tables before the query ran, the
+        result is dropped if any of them was invalidated since
+        """
+
+        if generation is not None and generation != self.generation(key.tables):
+            return
+
+        if key in self._entries:
+            self._drop(key)
+
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = CacheEntry(
+            value, time.monotonic() + (ttl or self.ttl), size
+        )
+        self.bytes += size
+        for table in key.tables:
+            self._tables[table].add(key)
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.bytes > self.max_bytes
+        ):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tables: str) -> int:
+        """
+        Drop every entry that reads from any of the given tables
+        """
+
+        dropped = 0
+        for table in tables:
+            self._generations[table.lower()] += 1
+            for key in self._tables.pop(table.lower(), ()):
+                if key in self._entries:
+                    self._drop(key)
+                    dropped += 1
+
+        self.invalidations += dropped
+        return dropped
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tables.clear()
+        self.bytes = 0
+
+    def _drop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for table in key.tables:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+
 class PostgreSQL:
     _pool = asyncpg.Pool
 
     def __init__(self):
-        self.cache = {}
+        self.cache = QueryCache()
+        self.listeners: Dict[str, Tuple[Callable, Optional[Callable]]] = {}
+        self._listener: Optional[asyncpg.Connection] = None
+        # told about every table written to, to invalidate other clusters
+        self.on_write: Optional[Callable[[str], Any]] = None
 
     async def __aenter__(self, **kwargs):
         record_class = kwargs.pop("record_class", Record)
@@ -30,64 +234,136 @@ class PostgreSQL:
     def __repr__(self) -> str:
         return f"<Postgresql Cache Pool PID 69 Pool ID 420>"
 
-    async def delete_cache_entry(self, type: str, sql: str, *args):
-        await asyncio.sleep(60)
-        try:
-            self.cache.pop(f"{type} {sql} {args}")
-        except:
-            pass
+    @property
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Hit / miss / eviction counters of the query cache
+        """
 
-    async def add_to_cache(self, data: Any, type: str, sql: str, *args):
-        self.cache[f"{type} {sql} {args}"] = data
+        return self.cache.stats
 
-    async def search_and_delete(self, table: str):
-        for k in self.cache.keys():
-            if table.lower() in k.lower():
-                self.cache.pop(k)
+    def invalidate(self, *tables: str) -> int:
+        """
+        Drop the cached results of the given tables
+        """
+
+        return self.cache.invalidate(*tables)
+
+    def written_table(self, sql: str) -> Optional[str]:
+        """
+        The table an INSERT / UPDATE / DELETE statement writes to
+        """
+
+        if match := WRITE_TABLE.match(sql):
+            return match.group(1).lower()
+
+        return None
+
+    async def _cached(self, method: str, sql: str, args: Tuple[Any, ...]):
+        """
+        Run a read query through the cache
+
+        Cached results are shared: records are immutable and lists are
+        copied before they're handed out
+        """
+
+        key = self.cache.key(method, sql, args)
+        if key:
+            found, result = self.cache.get(key)
+            if found:
+                return list(result) if isinstance(result, list) else result
+
+            generation = self.cache.generation(key.tables)
 
-    async def fetch(self, sql: str, *args):
-        if result := self.cache.get(f"fetch {sql} {args}"):
-            return result
         async with self._pool.acquire() as conn:
-            async with conn.transaction():
-                data = await conn.fetch(sql, *args)
-                await self.add_to_cache(data, "fetch", sql, args)
-                return data
+            data = await getattr(conn, method)(sql, *args)
+
+        if key:
+            self.cache.set(key, data, generation=generation)
+            return list(data) if isinstance(data, list) else data
+        elif table := self.written_table(sql):
+            self._written(table)
+
+        return data
+
+    def _written(self, table: str) -> None:
+        self.cache.invalidate(table)
+        if self.on_write:
+            self.on_write(table)
+
+    async def listen(
+        self,
+        channel: str,
+        callback: Callable[[str], Any],
+        on_reconnect: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """
+        Call the callback with the payload of every NOTIFY sent on the channel
+        """
+
+        self.listeners[channel] = (callback, on_reconnect)
+        if not self._listener or self._listener.is_closed():
+            self._listener = await self._pool.acquire()
+            self._listener.add_termination_listener(self._on_listener_closed)
+
+        await self._listener.add_listener(
+            channel, lambda conn, pid, channel, payload: callback(payload)
+        )
+
+    def _on_listener_closed(self, _) -> None:
+        asyncio.ensure_future(self._relisten())
+
+    async def _release_listener(self) -> None:
+        listener, self._listener = self._listener, None
+        if listener:
+            try:
+                await self._pool.release(listener)
+            except Exception:
+                listener.terminate()
+
+    async def _relisten(self) -> None:
+        await self._release_listener()
+        while not self._listener:
+            try:
+                for channel, (callback, on_reconnect) in self.listeners.items():
+                    await self.listen(channel, callback, on_reconnect)
+            except Exception:
+                # a half set up connection is dropped before trying again
+                await self._release_listener()
+                await asyncio.sleep(5)
+
+        # notifications sent while disconnected are lost, each callback
+        # gets to catch up once
+        callbacks = {c for _, c in self.listeners.values() if c}
+        for on_reconnect in callbacks:
+            on_reconnect()
+
+    async def fetch(self, sql: str, *args):
+        return await self._cached("fetch", sql, args)
 
     async def fetchrow(self, sql: str, *args):
-        if result := self.cache.get(f"fetchrow {sql} {args}"):
-            return result
-        async with self._pool.acquire() as conn:
-            async with conn.transaction():
-                data = await conn.fetchrow(sql, *args)
-                await self.add_to_cache(data, "fetchrow", sql, args)
-                return data
+        return await self._cached("fetchrow", sql, args)
 
     async def fetchval(self, sql: str, *args):
-        if result := self.cache.get(f"fetchval {sql} {args}"):
-            return result
-        async with self._pool.acquire() as conn:
-            async with conn.transaction():
-                data = await conn.fetchval(sql, *args)
-                await self.add_to_cache(data, "fetchval", sql, args)
-                return data
+        return await self._cached("fetchval", sql, args)
 
     async def execute(self, sql: str, *args) -> Optional[Any]:
         try:
-            table = sql.lower().split("from")[1].split("where")[0]
-            await self.search_and_delete(table, args)
-        except:
-            pass
-        async with self._pool.acquire() as conn:
-            async with conn.transaction():
-                return await conn.fetchval(sql, *args)
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    return await conn.fetchval(sql, *args)
+        finally:
+            if table := self.written_table(sql):
+                self._written(table)
 
     async def executemany(self, sql: str, args: Iterable[Sequence]) -> Optional[Any]:
-        if result := self.cache.get(f"{sql} {args}"):
-            self.cache.pop(f"{sql} {args}")
-        async with self._pool.acquire() as conn:
-            async with conn.transaction():
-                return await conn.executemany(sql, args)
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    return await conn.executemany(sql, args)
+        finally:
+            if table := self.written_table(sql):
+                self._written(table)
 
     async def fetch_config(self, guild_id: int, key: str):
         return await self.fetchval(
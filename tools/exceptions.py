@@ -42,3 +42,16 @@ class ApiError(CommandError):
 
         self.status_code = status_code
         super().__init__(f"The API returned **{self.status_code}** as the status code")
+
+
+class MediaTooLarge(CommandError):
+    def __init__(self, size: int, limit: int):
+        """
+        Exception raised when a download goes over the media size limit
+        """
+
+        self.size = size
+        self.limit = limit
+        super().__init__(
+            f"This file is too big (**{size // 1024 // 1024} MB**), the limit is **{limit // 1024 // 1024} MB**"
+        )
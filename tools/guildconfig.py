@@ -0,0 +1,261 @@
+import asyncio
+import logging
+
+import asyncpg
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from discord.ext.commands import AutoShardedBot as AB
+
+from .database import Record
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "guild_config"
+
+# tables holding at most one row per guild
+SINGLE = (
+    "leveling",
+    "antispam",
+    "antinuke",
+    "modlogs",
+    "prefixes",
+    "bumpreminder",
+    "joindm",
+    "jail",
+    "anti_join",
+)
+# tables holding any number of rows per guild
+MULTI = (
+    "antinuke_modules",
+    "autoreact",
+    "autoresponder",
+    "disablecmd",
+    "boost",
+    "welcome",
+    "aliases",
+    "fake_perms",
+    "autoping",
+    "autorole",
+)
+
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION notify_guild_config() RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME || ':' || changed.guild_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+class GuildConfigStore:
+    """
+    In-memory snapshot of the per guild configuration tables
+    """
+
+    def __init__(self, bot: AB):
+        self.bot = bot
+        self.data: Dict[str, Dict[int, Union[Record, List[Record]]]] = {
+            table: {} for table in SINGLE + MULTI
+        }
+        self.loaded: Set[int] = set()
+        self.loading: Dict[int, asyncio.Future] = {}
+        self.pending: Set[Tuple[str, int]] = set()
+        self._flush: Optional[asyncio.Task] = None
+
+    def __repr__(self) -> str:
+        return f"<GuildConfigStore guilds={len(self.loaded)} pending={len(self.pending)}>"
+
+    @property
+    def tables(self) -> Tuple[str, ...]:
+        return SINGLE + MULTI
+
+    async def setup(self) -> None:
+        """
+        Install the notify triggers and start listening for config changes
+
+        A table without its trigger would never refresh, so setup fails if
+        any of them can't be installed
+        """
+
+        await self.bot.db.execute(TRIGGER_FUNCTION)
+        failed = []
+        for table in self.tables:
+            try:
+                await self.install_trigger(table)
+            except Exception as e:
+                log.error(f"Unable to install the guild config trigger on {table}: {e}")
+                failed.append(table)
+
+        if failed:
+            raise RuntimeError(f"Missing guild config triggers on {', '.join(failed)}")
+
+        await self.bot.db.listen(CHANNEL, self.on_notify, self.on_reconnect)
+
+    async def install_trigger(self, table: str) -> None:
+        """
+        Create the notify trigger of a table unless it's there already
+        """
+
+        # pg_trigger isn't written through the pool, skip the query cache
+        self.bot.db.invalidate("pg_trigger")
+        if await self.bot.db.fetchval(
+            "SELECT 1 FROM pg_trigger WHERE tgname = $1 AND tgrelid = $2::regclass",
+            f"{table}_guild_config",
+            table,
+        ):
+            return
+
+        try:
+            await self.bot.db.execute(
+                f"""
+          CREATE TRIGGER {table}_guild_config
+          AFTER INSERT OR UPDATE OR DELETE ON {table}
+          FOR EACH ROW EXECUTE FUNCTION notify_guild_config()
+          """
+            )
+        except asyncpg.DuplicateObjectError:
+            # another cluster starting at the same time created it
+            pass
+
+    def get(self, table: str, guild_id: int) -> Union[Optional[Record], List[Record]]:
+        """
+        Cached config of a guild; a row (or None) for single tables, a list for the others
+        """
+
+        if table in SINGLE:
+            return self.data[table].get(guild_id)
+
+        return self.data[table].get(guild_id, [])
+
+    async def fetch(
+        self, table: str, guild_id: int
+    ) -> Union[Optional[Record], List[Record]]:
+        """
+        Same as get, loading the guild first if it wasn't loaded yet
+        """
+
+        if guild_id not in self.loaded:
+            await self.load([guild_id])
+
+        return self.get(table, guild_id)
+
+    async def load(self, guild_ids: Iterable[int], force: bool = False) -> None:
+        """
+        Bulk load every config table for the given guilds
+
+        Guilds already being loaded aren't queried again, their load is awaited
+        """
+
+        guild_ids = set(guild_ids)
+        waiting = {
+            self.loading[g] for g in guild_ids if not force and g in self.loading
+        }
+        guild_ids = [
+            g
+            for g in guild_ids
+            if force or (g not in self.loaded and g not in self.loading)
+        ]
+        if guild_ids:
+            future = asyncio.get_running_loop().create_future()
+            for guild_id in guild_ids:
+                self.loading[guild_id] = future
+
+            try:
+                for table in self.tables:
+                    results = await self.bot.db.fetch(
+                        f"SELECT * FROM {table} WHERE guild_id = ANY($1::BIGINT[])",
+                        guild_ids,
+                    )
+                    self.store(table, guild_ids, results)
+
+                self.loaded.update(guild_ids)
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+                # retrieved here so it isn't reported when nobody else waits on it
+                future.exception()
+                raise
+            finally:
+                for guild_id in guild_ids:
+                    if self.loading.get(guild_id) is future:
+                        del self.loading[guild_id]
+
+        if waiting:
+            await asyncio.gather(*waiting)
+
+    async def load_shard(self, shard_id: int) -> None:
+        """
+        Load the config of every guild in a shard
+        """
+
+        guild_ids = [g.id for g in self.bot.guilds if g.shard_id == shard_id]
+        await self.load(guild_ids)
+        log.info(f"Loaded the config of {len(guild_ids)} guilds on shard {shard_id}")
+
+    def store(self, table: str, guild_ids: Iterable[int], results: List[Record]):
+        for guild_id in guild_ids:
+            self.data[table].pop(guild_id, None)
+
+        for result in results:
+            guild_id = int(result["guild_id"])
+            if table in SINGLE:
+                self.data[table][guild_id] = result
+            else:
+                self.data[table].setdefault(guild_id, []).append(result)
+
+    async def refresh(self, table: str, guild_id: int) -> None:
+        """
+        Reload a single table for a guild
+        """
+
+        self.bot.db.invalidate(table)
+        results = await self.bot.db.fetch(
+            f"SELECT * FROM {table} WHERE guild_id = $1", guild_id
+        )
+        self.store(table, [guild_id], results)
+
+    def forget(self, guild_id: int) -> None:
+        """
+        Drop a guild from the snapshot
+        """
+
+        self.loaded.discard(guild_id)
+        for table in self.tables:
+            self.data[table].pop(guild_id, None)
+
+    def on_notify(self, payload: str) -> None:
+        table, _, guild_id = payload.partition(":")
+        if table not in self.data or not guild_id.isdigit():
+            return
+
+        if int(guild_id) not in self.loaded:
+            return
+
+        self.pending.add((table, int(guild_id)))
+        if not self._flush or self._flush.done():
+            self._flush = asyncio.ensure_future(self.flush())
+
+    def on_reconnect(self) -> None:
+        # notifications were lost while disconnected
+        asyncio.ensure_future(self.load(list(self.loaded), force=True))
+
+    async def flush(self) -> None:
+        """
+        Apply every queued change, coalescing repeated notifications
+        """
+
+        while self.pending:
+            table, guild_id = self.pending.pop()
+            try:
+                await self.refresh(table, guild_id)
+            except Exception as e:
+                log.warning(f"Unable to refresh {table} for {guild_id}: {e}")
@@ -11,6 +11,8 @@ import re, discord, datetime, asyncio
 import TagScriptEngine as tse
 from TagScriptEngine import Verb as String
 
+from .embedbuilder import Text, Variables
+
 
 async def to_embedcode(data: str) -> str:
     data = data.replace("```", "`` `")
@@ -187,75 +189,7 @@ class EmbedBuilder:
 
     def make_replacements(self, code: str, **kwargs) -> Embed:
         if user := kwargs.get("user", kwargs.get("member")):
-            if "{user}" in code:
-                code = code.replace("{user}", str(user))
-            if "{user.mention}" in code:
-                code = code.replace("{user.mention}", user.mention)
-            if "{user.name}" in code:
-                code = code.replace("{user.name}", user.name)
-            if "{user.avatar}" in code:
-                code = code.replace("{user.avatar}", str(user.display_avatar.url))
-            if "{user.joined_at}" in code:
-                code = code.replace(
-                    "{user.joined_at}",
-                    discord.utils.format_dt(user.joined_at, style="R"),
-                )
-            if "{user.created_at}" in code:
-                code = code.replace(
-                    "{user.created_at}",
-                    discord.utils.format_dt(user.created_at, style="R"),
-                )
-            if "{user.discriminator}" in code:
-                code = code.replace("{user.discriminator}", user.discriminator)
-        if guild := kwargs.get("guild", kwargs.get("server")):
-            if "{guild.name}" in code:
-                code = code.replace("{guild.name}", user.guild.name)
-            if "{guild.count}" in code:
-                code = code.replace("{guild.count}", str(user.guild.member_count))
-            if "{guild.count.format}" in code:
-                code = code.replace(
-                    "{guild.count.format}", self.ordinal(len(user.guild.members))
-                )
-            if "{guild.id}" in code:
-                code = code.replace("{guild.id}", user.guild.id)
-            if "{guild.created_at}" in code:
-                code = code.replace(
-                    "{guild.created_at}",
-                    discord.utils.format_dt(user.guild.created_at, style="R"),
-                )
-            if "{guild.boost_count}" in code:
-                code = code.replace(
-                    "{guild.boost_count}", str(user.guild.premium_subscription_count)
-                )
-            if "{guild.booster_count}" in code:
-                code = code.replace(
-                    "{guild.booster_count}", str(len(user.guild.premium_subscribers))
-                )
-            if "{guild.boost_count.format}" in code:
-                code = code.replace(
-                    "{guild.boost_count.format}",
-                    self.ordinal(user.guild.premium_subscription_count),
-                )
-            if "{guild.booster_count.format}" in code:
-                code = code.replace(
-                    "{guild.booster_count.format}",
-                    self.ordinal(len(user.guild.premium_subscribers)),
-                )
-            if "{guild.boost_tier}" in code:
-                code = code.replace("{guild.boost_tier}", str(user.guild.premium_tier))
-            if "{guild.vanity}" in code:
-                code = code.replace(
-                    "{guild.vanity}", "/" + user.guild.vanity_url_code or "none"
-                )
-            if "{guild.icon}" in code:
-                if user.guild.icon:
-                    code = code.replace("{guild.icon}", user.guild.icon.url)
-                else:
-                    code = code.replace("{guild.icon}", "https://none.none")
-        if "{invisible}" in code:
-            code = code.replace("{invisible}", "2b2d31")
-        if "{botcolor}" in code:
-            code = code.replace("{botcolor}", "7b90d5")
+            code = Text(code).render(Variables(user))
         return code
 
     async def build_embed(self, code: str, sendable: bool = False):
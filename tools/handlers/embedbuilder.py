@@ -2,272 +2,392 @@ import re
 import discord
 import datetime
 
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
 from discord.ext import commands
 
+VARIABLE = re.compile(r"\{([\w.]+)\}")
+URL = re.compile(
+    r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"
+)
+BUTTON_STYLES = {
+    "red": discord.ButtonStyle.red,
+    "green": discord.ButtonStyle.green,
+    "gray": discord.ButtonStyle.gray,
+    "blue": discord.ButtonStyle.blurple,
+}
+
+
+def ordinal(num: int) -> str:
+    """Convert from number to ordinal (10 - 10th)"""
+    numb = str(num)
+    if numb.startswith("0"):
+        numb = numb.strip("0")
+    if numb in ["11", "12", "13"]:
+        return numb + "th"
+    if numb.endswith("1"):
+        return numb + "st"
+    elif numb.endswith("2"):
+        return numb + "nd"
+    elif numb.endswith("3"):
+        return numb + "rd"
+    else:
+        return numb + "th"
+
+
+VARIABLES: Dict[str, Callable[[discord.Member], str]] = {
+    "user": str,
+    "user.mention": lambda user: user.mention,
+    "user.name": lambda user: user.name,
+    "user.avatar": lambda user: str(user.display_avatar.url),
+    "user.joined_at": lambda user: discord.utils.format_dt(user.joined_at, style="R"),
+    "user.created_at": lambda user: discord.utils.format_dt(
+        user.created_at, style="R"
+    ),
+    "user.discriminator": lambda user: user.discriminator,
+    "guild.name": lambda user: user.guild.name,
+    "guild.count": lambda user: str(user.guild.member_count),
+    "guild.count.format": lambda user: ordinal(len(user.guild.members)),
+    "guild.id": lambda user: str(user.guild.id),
+    "guild.created_at": lambda user: discord.utils.format_dt(
+        user.guild.created_at, style="R"
+    ),
+    "guild.boost_count": lambda user: str(user.guild.premium_subscription_count),
+    "guild.booster_count": lambda user: str(len(user.guild.premium_subscribers)),
+    "guild.boost_count.format": lambda user: ordinal(
+        user.guild.premium_subscription_count
+    ),
+    "guild.booster_count.format": lambda user: ordinal(
+        len(user.guild.premium_subscribers)
+    ),
+    "guild.boost_tier": lambda user: str(user.guild.premium_tier),
+    "guild.vanity": lambda user: (
+        "/" + user.guild.vanity_url_code if user.guild.vanity_url_code else "none"
+    ),
+    "invisible": lambda user: "2f3136",
+    "botcolor": lambda user: "7b90d5",
+    "guild.icon": lambda user: (
+        user.guild.icon.url if user.guild.icon else "https://none.none"
+    ),
+}
+
+
+class Variables(dict):
+    """The variables of a member, each resolved the first time it's used"""
+
+    def __init__(self, user: discord.Member):
+        super().__init__()
+        self.user = user
+
+    def __missing__(self, name: str) -> str:
+        value = self[name] = VARIABLES[name](self.user)
+        return value
+
+
+class Text:
+    """
+    A piece of an embed script, split around its variables once
+
+    Literals sit at even indexes of parts and variable names at odd ones,
+    so rendering is a single join. Limits and urls of text without
+    variables are checked when it's compiled, the others when rendered
+    """
+
+    __slots__ = ("parts", "limit", "error", "url")
+
+    def __init__(
+        self,
+        source: str,
+        limit: Optional[int] = None,
+        error: Optional[str] = None,
+        url: Optional[str] = None,
+    ):
+        tokens = VARIABLE.split(source)
+        parts = [tokens[0]]
+        for i in range(1, len(tokens), 2):
+            if tokens[i] in VARIABLES:
+                parts += [tokens[i], tokens[i + 1]]
+            else:
+                parts[-1] += "{" + tokens[i] + "}" + tokens[i + 1]
 
-class EmbedBuilder:
-    def __init__(self):
-        self.ok = "hi"
+        self.parts: Tuple[str, ...] = tuple(parts)
+        self.limit = limit
+        self.error = error
+        self.url = url
+        if self.static:
+            self.validate(source)
 
-    def ordinal(self, num: int) -> str:
-        """Convert from number to ordinal (10 - 10th)"""
-        numb = str(num)
-        if numb.startswith("0"):
-            numb = numb.strip("0")
-        if numb in ["11", "12", "13"]:
-            return numb + "th"
-        if numb.endswith("1"):
-            return numb + "st"
-        elif numb.endswith("2"):
-            return numb + "nd"
-        elif numb.endswith("3"):
-            return numb + "rd"
-        else:
-            return numb + "th"
+    def __repr__(self) -> str:
+        return f"<Text parts={self.parts}>"
 
-    def embed_replacement(self, user: discord.Member, params: str = None):
-        """Replace embed variables"""
-        if params is None:
-            return None
-        if user is None:
-            return None
-        if "{user}" in params:
-            params = params.replace("{user}", str(user))
-        if "{user.mention}" in params:
-            params = params.replace("{user.mention}", user.mention)
-        if "{user.name}" in params:
-            params = params.replace("{user.name}", user.name)
-        if "{user.avatar}" in params:
-            params = params.replace("{user.avatar}", str(user.display_avatar.url))
-        if "{user.joined_at}" in params:
-            params = params.replace(
-                "{user.joined_at}", discord.utils.format_dt(user.joined_at, style="R")
-            )
-        if "{user.created_at}" in params:
-            params = params.replace(
-                "{user.created_at}", discord.utils.format_dt(user.created_at, style="R")
-            )
-        if "{user.discriminator}" in params:
-            params = params.replace("{user.discriminator}", user.discriminator)
-        if "{guild.name}" in params:
-            params = params.replace("{guild.name}", user.guild.name)
-        if "{guild.count}" in params:
-            params = params.replace("{guild.count}", str(user.guild.member_count))
-        if "{guild.count.format}" in params:
-            params = params.replace(
-                "{guild.count.format}", self.ordinal(len(user.guild.members))
-            )
-        if "{guild.id}" in params:
-            params = params.replace("{guild.id}", user.guild.id)
-        if "{guild.created_at}" in params:
-            params = params.replace(
-                "{guild.created_at}",
-                discord.utils.format_dt(user.guild.created_at, style="R"),
-            )
-        if "{guild.boost_count}" in params:
-            params = params.replace(
-                "{guild.boost_count}", str(user.guild.premium_subscription_count)
-            )
-        if "{guild.booster_count}" in params:
-            params = params.replace(
-                "{guild.booster_count}", str(len(user.guild.premium_subscribers))
-            )
-        if "{guild.boost_count.format}" in params:
-            params = params.replace(
-                "{guild.boost_count.format}",
-                self.ordinal(user.guild.premium_subscription_count),
-            )
-        if "{guild.booster_count.format}" in params:
-            params = params.replace(
-                "{guild.booster_count.format}",
-                self.ordinal(len(user.guild.premium_subscribers)),
-            )
-        if "{guild.boost_tier}" in params:
-            params = params.replace("{guild.boost_tier}", str(user.guild.premium_tier))
-        if "{guild.vanity}" in params:
-            params = params.replace(
-                "{guild.vanity}", "/" + user.guild.vanity_url_code or "none"
+    @property
+    def static(self) -> bool:
+        return len(self.parts) == 1
+
+    def validate(self, text: str) -> None:
+        if self.limit and len(text) >= self.limit:
+            raise commands.BadArgument(self.error)
+
+        if self.url and not URL.search(text):
+            raise commands.BadArgument(
+                f"The **{self.url}** parameter got an invalid url"
             )
-        if "{invisible}" in params:
-            params = params.replace("{invisible}", "2f3136")
-        if "{botcolor}" in params:
-            params = params.replace("{botcolor}", "7b90d5")
-        if "{guild.icon}" in params:
-            if user.guild.icon:
-                params = params.replace("{guild.icon}", user.guild.icon.url)
-            else:
-                params = params.replace("{guild.icon}", "https://none.none")
 
-        return params
+    def render(self, variables: Variables) -> str:
+        if len(self.parts) == 1:
+            return self.parts[0]
 
-    def get_parts(self, params: str) -> list:
-        if params is None:
-            return None
-        params = params.replace("{embed}", "")
-        return [p[1:][:-1] for p in params.split("$v")]
+        text = "".join(
+            variables[part] if i % 2 else part for i, part in enumerate(self.parts)
+        )
+        self.validate(text)
+        return text
+
+
+def resolve(node: Any, variables: Variables) -> Any:
+    if isinstance(node, Text):
+        return node.render(variables)
+    if isinstance(node, dict):
+        return {key: resolve(value, variables) for key, value in node.items()}
+    if isinstance(node, list):
+        return [resolve(value, variables) for value in node]
+
+    return node
+
+
+def parse_color(text: str) -> int:
+    try:
+        return int(text.replace("#", ""), 16)
+    except:
+        return int("7b90d5", 16)
+
+
+def parse_delete(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except:
+        return None
+
+
+class Button:
+    __slots__ = ("label", "url", "emoji", "style", "disabled")
+
+    def __init__(self, part: str):
+        self.label: Optional[Text] = None
+        self.url: Optional[Text] = None
+        self.emoji: Optional[Text] = None
+        self.style = discord.ButtonStyle.gray
+        self.disabled = True
+        for m in part.split(" && "):
+            if "label:" in m:
+                self.label = Text(m.replace("label:", ""))
+            if "url:" in m:
+                self.url = Text(m.replace("url:", "").strip())
+                self.disabled = False
+            if "emoji:" in m:
+                self.emoji = Text(m.replace("emoji:", "").strip())
+            if "disabled" in m:
+                self.disabled = True
+            if "style:" in m:
+                self.style = BUTTON_STYLES.get(
+                    m.replace("style:", "").strip(), self.style
+                )
 
-    def validator(self, text: str, max_len: int, error: str):
-        if len(text) >= max_len:
-            raise commands.BadArgument(error)
+    def render(self, variables: Variables) -> discord.ui.Button:
+        return discord.ui.Button(
+            style=self.style,
+            label=resolve(self.label, variables),
+            emoji=resolve(self.emoji, variables),
+            url=resolve(self.url, variables),
+            disabled=self.disabled,
+        )
 
-    def is_url(self, text: str, parameter: str):
-        regex = r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"
-        if not re.search(regex, text):
-            raise commands.BadArgument(
-                f"The **{parameter}** parameter got an invalid url"
-            )
 
-    def to_object(self, params: str) -> tuple:
-        x = {}
+class EmbedTemplate:
+    """
+    An embed script parsed once, rendered for every member it's sent to
+    """
+
+    __slots__ = ("plain", "content", "embed", "color", "timestamp", "delete", "buttons")
+
+    def __init__(self, script: str):
+        self.plain = Text(script)
+        self.content: Optional[Text] = None
+        self.embed: Dict[str, Any] = {}
+        self.color: Union[int, Text, None] = None
+        self.timestamp = False
+        self.delete: Union[float, Text, None] = None
+        self.buttons: List[Button] = []
         fields = []
-        content = None
-        view = discord.ui.View()
-        delete_after = None
-        for part in self.get_parts(params):
+
+        for part in [p[1:][:-1] for p in script.replace("{embed}", "").split("$v")]:
             if part.startswith("content:"):
-                content = part[len("content:") :]
-                self.validator(content, 2000, "Message content too long")
+                self.content = Text(
+                    part[len("content:") :], 2000, "Message content too long"
+                )
 
             if part.startswith("title:"):
-                x["title"] = part[len("title:") :]
-                self.validator(part[len("title:") :], 256, "Embed title too long")
+                self.embed["title"] = Text(
+                    part[len("title:") :], 256, "Embed title too long"
+                )
 
             if part.startswith("description:"):
-                x["description"] = part[len("description:") :]
-                self.validator(
+                self.embed["description"] = Text(
                     part[len("description:") :], 2048, "Embed description too long"
                 )
 
             if part.startswith("color:"):
-                try:
-                    x["color"] = int(part[len("color:") :].replace("#", ""), 16)
-                except:
-                    x["color"] = int("7b90d5", 16)
+                color = Text(part[len("color:") :])
+                self.color = parse_color(color.parts[0]) if color.static else color
 
             if part.startswith("thumbnail:"):
-                x["thumbnail"] = {"url": part[len("thumbnail:") :]}
-                self.is_url(part[len("thumbnail:") :], "thumbnail")
+                self.embed["thumbnail"] = {
+                    "url": Text(part[len("thumbnail:") :], url="thumbnail")
+                }
 
             if part.startswith("image:"):
-                x["image"] = {"url": part[len("image:") :]}
-                self.is_url(part[len("image:") :], "image")
+                self.embed["image"] = {"url": Text(part[len("image:") :], url="image")}
 
             if part == "timestamp":
-                x["timestamp"] = datetime.datetime.now().isoformat()
+                self.timestamp = True
 
             if part.startswith("delete:"):
-                try:
-                    delete_after = float(part[len("delete: ") :])
-                except:
-                    delete_after = None
+                delete = Text(part[len("delete: ") :])
+                self.delete = parse_delete(delete.parts[0]) if delete.static else delete
 
             if part.startswith("author:"):
-                author_parts = part[len("author: ") :].split(" && ")
-                name = None
-                url = None
-                icon_url = None
-                for z in author_parts:
+                author = {"name": None}
+                for z in part[len("author: ") :].split(" && "):
                     if z.startswith("name:"):
-                        name = z[len("name:") :]
-                        self.validator(name, 256, "author name too long")
+                        author["name"] = Text(
+                            z[len("name:") :], 256, "author name too long"
+                        )
 
                     if z.startswith("icon:"):
-                        icon_url = z[len("icon:") :]
-                        self.is_url(icon_url, "author icon")
+                        author["icon_url"] = Text(z[len("icon:") :], url="author icon")
 
                     if z.startswith("url:"):
-                        url = z[len("url:") :]
-                        self.is_url(url, "author url")
-
-                x["author"] = {"name": name}
-
-                if icon_url:
-                    x["author"]["icon_url"] = icon_url
+                        author["url"] = Text(z[len("url:") :], url="author url")
 
-                if url:
-                    x["author"]["url"] = url
+                self.embed["author"] = author
 
             if part.startswith("field:"):
-                name = None
-                value = None
-                inline = False
-                field_parts = part[len("field: ") :].split(" && ")
-                for z in field_parts:
+                field = {"name": None, "value": None, "inline": False}
+                for z in part[len("field: ") :].split(" && "):
                     if z.startswith("name:"):
-                        name = z[len("name:") :]
-                        self.validator(name, 256, "field name too long")
+                        field["name"] = Text(
+                            z[len("name:") :], 256, "field name too long"
+                        )
 
                     if z.startswith("value:"):
-                        value = z[len("value:") :]
-                        self.validator(value, 1024, "field value too long")
+                        field["value"] = Text(
+                            z[len("value:") :], 1024, "field value too long"
+                        )
 
                     if z.strip() == "inline":
-                        inline = True
+                        field["inline"] = True
 
-                fields.append({"name": name, "value": value, "inline": inline})
+                fields.append(field)
 
             if part.startswith("footer:"):
-                text = None
-                icon_url = None
-                footer_parts = part[len("footer: ") :].split(" && ")
-                for z in footer_parts:
+                footer = {"text": None, "icon_url": None}
+                for z in part[len("footer: ") :].split(" && "):
                     if z.startswith("text:"):
-                        text = z[len("text:") :]
-                        self.validator(text, 2048, "footer text too long")
+                        footer["text"] = Text(
+                            z[len("text:") :], 2048, "footer text too long"
+                        )
 
                     if z.startswith("icon:"):
-                        icon_url = z[len("icon:") :]
-                        self.is_url(icon_url, "footer icon")
+                        footer["icon_url"] = Text(z[len("icon:") :], url="footer icon")
+
+                self.embed["footer"] = footer
 
-                x["footer"] = {"text": text, "icon_url": icon_url}
             if part.startswith("button:"):
-                z = part[len("button:") :].split(" && ")
-                disabled = True
-                style = discord.ButtonStyle.gray
-                emoji = None
-                label = None
-                url = None
-                for m in z:
-                    if "label:" in m:
-                        label = m.replace("label:", "")
-                    if "url:" in m:
-                        url = m.replace("url:", "").strip()
-                        disabled = False
-                    if "emoji:" in m:
-                        emoji = m.replace("emoji:", "").strip()
-                    if "disabled" in m:
-                        disabled = True
-                    if "style:" in m:
-                        if m.replace("style:", "").strip() == "red":
-                            style = discord.ButtonStyle.red
-                        elif m.replace("style:", "").strip() == "green":
-                            style = discord.ButtonStyle.green
-                        elif m.replace("style:", "").strip() == "gray":
-                            style = discord.ButtonStyle.gray
-                        elif m.replace("style:", "").strip() == "blue":
-                            style = discord.ButtonStyle.blurple
-
-                view.add_item(
-                    discord.ui.Button(
-                        style=style,
-                        label=label,
-                        emoji=emoji,
-                        url=url,
-                        disabled=disabled,
-                    )
-                )
+                self.buttons.append(Button(part[len("button:") :]))
+
+        if len(fields) > 25:
+            raise commands.BadArgument(
+                "There are more than **25** fields in your embed"
+            )
 
-        if not x:
-            embed = None
-        else:
-            if len(fields) > 25:
-                raise commands.BadArgument(
-                    "There are more than **25** fields in your embed"
+        if fields:
+            self.embed["fields"] = fields
+
+    def __repr__(self) -> str:
+        return f"<EmbedTemplate embed={self.has_embed} buttons={len(self.buttons)}>"
+
+    @property
+    def has_embed(self) -> bool:
+        return bool(self.embed or self.color is not None or self.timestamp)
+
+    def render(self, user: discord.Member) -> Dict[str, Any]:
+        """
+        The message kwargs of the script for a member
+        """
+
+        variables = Variables(user)
+        content = resolve(self.content, variables)
+        embed = None
+        if self.has_embed:
+            data = resolve(self.embed, variables)
+            data.setdefault("fields", [])
+            if self.color is not None:
+                data["color"] = (
+                    self.color
+                    if isinstance(self.color, int)
+                    else parse_color(self.color.render(variables))
                 )
 
-            x["fields"] = fields
-            embed = discord.Embed.from_dict(x)
-        return content, embed, view, delete_after
+            if self.timestamp:
+                data["timestamp"] = datetime.datetime.now().isoformat()
+
+            embed = discord.Embed.from_dict(data)
+
+        if not content and not embed:
+            return {"content": self.plain.render(variables)}
+
+        view = discord.ui.View()
+        for button in self.buttons:
+            view.add_item(button.render(variables))
+
+        result = {"content": content, "embed": embed, "view": view}
+        delete_after = (
+            parse_delete(self.delete.render(variables))
+            if isinstance(self.delete, Text)
+            else self.delete
+        )
+        if delete_after:
+            result["delete_after"] = delete_after
+
+        return result
+
+
+@lru_cache(maxsize=4096)
+def compile_script(script: str) -> EmbedTemplate:
+    """
+    Parse an embed script, cached by its text
+    """
+
+    return EmbedTemplate(script)
+
+
+class EmbedBuilder:
+    def __init__(self):
+        self.ok = "hi"
+
+    def ordinal(self, num: int) -> str:
+        """Convert from number to ordinal (10 - 10th)"""
+        return ordinal(num)
+
+    def embed_replacement(self, user: discord.Member, params: str = None):
+        """Replace embed variables"""
+        if params is None:
+            return None
+        if user is None:
+            return None
+
+        return Text(params).render(Variables(user))
 
     def copy_embed(self, message: discord.Message) -> str:
         to_return = ""
@@ -333,33 +453,19 @@ class EmbedBuilder:
 
 class EmbedScript(commands.Converter):
     async def convert(self, ctx: commands.Context, argument: str):
-        x = EmbedBuilder().to_object(
-            EmbedBuilder().embed_replacement(ctx.author, argument)
-        )
-        if x[0] or x[1]:
-            if x[3]:
-                return {
-                    "content": x[0],
-                    "embed": x[1],
-                    "view": x[2],
-                    "delete_after": x[3],
-                }
-            else:
-                return {"content": x[0], "embed": x[1], "view": x[2]}
-
-        return {"content": EmbedBuilder().embed_replacement(ctx.author, argument)}
+        return compile_script(argument).render(ctx.author)
 
     async def alt_convert(self, member: discord.Member, argument: str):
-        x = EmbedBuilder().to_object(EmbedBuilder().embed_replacement(member, argument))
-        if x[0] or x[1]:
-            if x[3]:
-                return {
-                    "content": x[0],
-                    "embed": x[1],
-                    "view": x[2],
-                    "delete_after": x[3],
-                }
-            else:
-                return {"content": x[0], "embed": x[1], "view": x[2]}
+        return compile_script(argument).render(member)
+
+    def compile(self, argument: str) -> "EmbedTemplate":
+        """Compile an embed script, raising BadArgument if it's invalid"""
+        return compile_script(argument)
+
+
+class ValidEmbedScript(commands.Converter):
+    """An embed script that is checked before it's saved"""
 
-        return {"content": EmbedBuilder().embed_replacement(member, argument)}
+    async def convert(self, ctx: commands.Context, argument: str) -> str:
+        compile_script(argument)
+        return argument
@@ -1,30 +1,35 @@
-import aiohttp
+from tools.misc.session import Session
 
 
 class Requests:
+    session = Session()
+
     async def post_request(self, url: str, headers: dict, params: dict = None) -> int:
-        async with aiohttp.ClientSession(headers=headers) as cs:
-            async with cs.post(url, params=params) as r:
-                if r.status != 204:
-                    return r.status, await r.json()
-                else:
-                    return r.status
+        async with self.session.request(
+            "POST", url, headers=headers, params=params
+        ) as r:
+            if r.status != 204:
+                return r.status, await r.json()
+            else:
+                return r.status
 
     async def get_request(self, url: str, headers: dict, params: dict = None):
-        async with aiohttp.ClientSession(headers=headers) as cs:
-            async with cs.get(url, params=params) as r:
-                if r.status != 204:
-                    return r.status, await r.json()
-                else:
-                    return r.status
+        async with self.session.request(
+            "GET", url, headers=headers, params=params
+        ) as r:
+            if r.status != 204:
+                return r.status, await r.json()
+            else:
+                return r.status
 
     async def put_request(self, url: str, headers: dict, params: dict = None):
-        async with aiohttp.ClientSession(headers=headers) as cs:
-            async with cs.put(url, params=params) as r:
-                if r.status != 204:
-                    return r.status, await r.json()
-                else:
-                    return r.status
+        async with self.session.request(
+            "PUT", url, headers=headers, params=params
+        ) as r:
+            if r.status != 204:
+                return r.status, await r.json()
+            else:
+                return r.status
 
 
 class Spotify(Requests):
@@ -65,15 +70,14 @@ class Handler(object):
     def __init__(self, api_key: str):
         self.apikey = api_key
         self.baseurl = "https://ws.audioscrobbler.com/2.0/"
+        self.session = Session()
 
     async def lastfm_user_exists(self, user: str) -> bool:
         a = await self.get_user_info(user)
         return "error" not in a
 
     async def do_request(self, data: dict):
-        async with aiohttp.ClientSession() as cs:
-            async with cs.get(self.baseurl, params=data) as r:
-                return await r.json()
+        return await self.session.get_json(self.baseurl, params=data)
 
     async def get_track_playcount(self, user: str, track: dict) -> int:
         data = {
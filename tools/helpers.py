@@ -1,6 +1,5 @@
 import sys
 import discord
-import orjson
 import asyncio
 import datetime
 import humanize
@@ -11,6 +10,8 @@ from discord.interactions import Interaction
 from typing import Mapping, Coroutine, List, Any, Dict, Tuple, Callable, Optional, Union
 from discord_paginator import Paginator
 
+from .antinuke import AntinukeEngine, AntinukePolicy, ModuleRule
+from .commandpolicy import permission_mask
 from .misc.views import ConfirmView
 
 from discord.ext.commands import (
@@ -44,22 +45,11 @@ TUPLE = ()
 SET = set()
 
 def guild_perms(**perms: bool) -> Any:
-    async def predicate(ctx: PretendContext):
-        author_permissions = [p[0] for p in ctx.author.guild_permissions if p[1]]
-        if not any(p in author_permissions for p in perms):
-            roles = ", ".join(list(map(lambda r: str(r.id), ctx.author.roles)))
-            results = await ctx.bot.db.fetch(
-                f"SELECT perms FROM fake_perms WHERE guild_id = $1 AND role_id IN ({roles})",
-                ctx.guild.id,
-            )
-            for result in results:
-                fake_perms = orjson.loads(result[0])
+    required = permission_mask(list(perms))
 
-                if "administrator" in fake_perms:
-                    return True
-
-                if any(p in fake_perms for p in perms):
-                    return True
+    async def predicate(ctx: PretendContext):
+        policy = await ctx.bot.command_policy.get(ctx.guild.id)
+        if not policy.allows(ctx.author, required):
             raise MissingPermissions([p for p in perms])
         return True
 
@@ -184,7 +174,8 @@ async def identify(self):
 class AntinukeMeasures:
     def __init__(self: "AntinukeMeasures", bot: AB):
         self.bot = bot
-        self.thresholds = {}
+        self.engine = AntinukeEngine()
+        self.policies: Dict[int, AntinukePolicy] = {}
 
     def get_bot_perms(self, guild: Guild) -> bool:
         """check if the bot can actually punish members"""
@@ -215,49 +206,52 @@ class AntinukeMeasures:
             else:
                 return False
 
-    async def is_module(self: "AntinukeMeasures", module: str, guild: Guild) -> bool:
+    async def policy(self: "AntinukeMeasures", guild: Guild) -> AntinukePolicy:
         """
-        check if the specific module is available in the guild
+        the compiled antinuke config of a guild
         """
 
-        return (
-            await self.bot.db.fetchrow(
-                """
-      SELECT * FROM antinuke_modules
-      WHERE module = $1
-      AND guild_id = $2
-      """,
-                module,
-                guild.id,
-            )
-            is not None
-        )
+        config = await self.bot.guild_config.fetch("antinuke", guild.id)
+        rows = self.bot.guild_config.get("antinuke_modules", guild.id)
+        policy = self.policies.get(guild.id)
+        if not policy or not policy.compiled_from(config, rows):
+            policy = self.policies[guild.id] = AntinukePolicy(config, rows)
 
-    async def is_whitelisted(self: "AntinukeMeasures", member: Member) -> bool:
+        return policy
+
+    async def reload(self: "AntinukeMeasures", guild: Guild) -> AntinukePolicy:
         """
-        check if the specific member is whitelisted in any way
+        reload the antinuke config of a guild after it was changed
         """
 
-        check = await self.bot.db.fetchrow(
-            """
-      SELECT owner_id, admins, whitelisted FROM antinuke
-      WHERE guild_id = $1
-      """,
-            member.guild.id,
-        )
+        self.policies.pop(guild.id, None)
+        for table in ("antinuke", "antinuke_modules"):
+            await self.bot.guild_config.refresh(table, guild.id)
 
-        if member.id == check["owner_id"]:
-            return True
+        return await self.policy(guild)
 
-        if check["whitelisted"]:
-            if member.id in orjson.loads(check["whitelisted"]):
-                return True
+    async def is_module(self: "AntinukeMeasures", module: str, guild: Guild) -> bool:
+        """
+        check if the specific module is available in the guild
+        """
 
-        if check["admins"]:
-            if member.id in orjson.loads(check["admins"]):
-                return True
+        return module in (await self.policy(guild)).modules
+
+    async def get_module(
+        self: "AntinukeMeasures", module: str, guild: Guild
+    ) -> Optional[ModuleRule]:
+        """
+        get the threshold and punishment of an antinuke module
+        """
 
-        return False
+        return (await self.policy(guild)).modules.get(module)
+
+    async def is_whitelisted(self: "AntinukeMeasures", member: Member) -> bool:
+        """
+        check if the specific member is whitelisted in any way
+        """
+
+        return member.id in (await self.policy(member.guild)).trusted
 
     async def decide_punishment(
         self: "AntinukeMeasures", module: str, member: Member, reason: str
@@ -269,15 +263,8 @@ class AntinukeMeasures:
         if member.bot:
             return member.kick(reason=reason)
 
-        punishment = await self.bot.db.fetchval(
-            """
-      SELECT punishment FROM antinuke_modules
-      WHERE guild_id = $1
-      AND module = $2
-      """,
-            member.guild.id,
-            module,
-        )
+        rule = await self.get_module(module, member.guild)
+        punishment = rule.punishment if rule else None
 
         if punishment == "ban":
             return member.ban(reason=reason)
@@ -290,61 +277,27 @@ class AntinukeMeasures:
                 roles=[r for r in member.roles if not r.is_assignable()], reason=reason
             )
 
-    async def check_threshold(
+    async def exceeded_threshold(
         self: "AntinukeMeasures", module: str, member: Member
     ) -> bool:
         """
-        check if a member exceeded the threshold of the specific module
+        check the module threshold against the member's actions in the window
         """
 
-        check = await self.bot.db.fetchval(
-            """
-      SELECT threshold FROM antinuke_modules 
-      WHERE module = $1
-      AND guild_id = $2
-      """,
-            module,
-            member.guild.id,
+        rule = await self.get_module(module, member.guild)
+        return self.engine.exceeded(
+            member.guild.id, member.id, module, rule.threshold if rule else None
         )
 
-        if check == 0:
-            return True
-
-        payload = self.thresholds
-        if payload:
-            if not payload.get(module):
-                payload[module] = {}
-
-            if not payload[module].get(member.guild.id):
-                payload[module][member.guild.id] = {}
-
-            if not payload[module][member.guild.id].get(member.id):
-                payload[module][member.guild.id][member.id] = [datetime.datetime.now()]
-            else:
-                payload[module][member.guild.id][member.id].append(
-                    datetime.datetime.now()
-                )
-
-        else:
-            payload = {
-                module: {member.guild.id: {member.id: [datetime.datetime.now()]}}
-            }
-
-        to_remove = [
-            d
-            for d in payload[module][member.guild.id][member.id]
-            if (datetime.datetime.now() - d).total_seconds() > 60
-        ]
-
-        for r in to_remove:
-            payload[module][member.guild.id][member.id].remove(r)
-
-        self.thresholds = payload
-
-        if check < len(payload[module][member.guild.id][member.id]):
-            return True
+    async def check_threshold(
+        self: "AntinukeMeasures", module: str, member: Member
+    ) -> bool:
+        """
+        count an action done through the bot's commands, then check the threshold
+        """
 
-        return False
+        self.engine.record(member.guild.id, member.id, module)
+        return await self.exceeded_threshold(module, member)
 
     async def take_action(
         self: "AntinukeMeasures",
@@ -0,0 +1,146 @@
+import time
+import asyncio
+import logging
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from discord import Guild, HTTPException, Invite
+from discord.ext.commands import AutoShardedBot as AB
+
+log = logging.getLogger(__name__)
+
+
+class TrackedInvite:
+    __slots__ = ("code", "uses", "max_uses", "inviter_id", "inviter")
+
+    def __init__(self, invite: Invite):
+        self.code = invite.code
+        self.uses = invite.uses or 0
+        self.max_uses = invite.max_uses or 0
+        self.inviter_id = invite.inviter.id if invite.inviter else None
+        self.inviter = str(invite.inviter) if invite.inviter else None
+
+    def __repr__(self) -> str:
+        return f"<TrackedInvite code={self.code} uses={self.uses}>"
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.inviter_id}>" if self.inviter_id else "unknown"
+
+
+class InviteTracker:
+    """
+    Invite uses of the tracked guilds, kept in memory
+
+    Created and deleted invites come from the gateway. The gateway
+    doesn't send uses though, so joins are attributed by diffing against
+    a REST fetch. Fetches are debounced per guild: joins landing while
+    one is pending share it, and a guild is fetched at most once every
+    interval seconds. An invite deleted on its last use counts as used
+    """
+
+    def __init__(self, bot: AB, interval: float = 10.0, debounce: float = 1.0):
+        self.bot = bot
+        self.interval = interval
+        self.debounce = debounce
+        self.invites: Dict[int, Dict[str, TrackedInvite]] = {}
+        self.expired: Dict[int, List[Tuple[float, TrackedInvite]]] = {}
+        self.synced: Dict[int, float] = {}
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.joins: Dict[int, int] = {}
+        self.fetches = 0
+
+    def __repr__(self) -> str:
+        return f"<InviteTracker guilds={len(self.invites)} fetches={self.fetches}>"
+
+    def tracked(self, guild_id: int) -> bool:
+        return guild_id in self.invites
+
+    def store(self, guild_id: int, invites: Iterable[Invite]) -> None:
+        self.invites[guild_id] = {i.code: TrackedInvite(i) for i in invites}
+
+    async def fetch(self, guild: Guild) -> Optional[List[Invite]]:
+        try:
+            invites = await guild.invites()
+        except HTTPException as e:
+            log.debug(f"Unable to fetch the invites of {guild.id}: {e}")
+            return None
+
+        self.fetches += 1
+        self.synced[guild.id] = time.monotonic()
+        return invites
+
+    async def load(self, guild: Guild) -> None:
+        """
+        Start tracking a guild
+        """
+
+        invites = await self.fetch(guild)
+        self.store(guild.id, invites or [])
+
+    def forget(self, guild_id: int) -> None:
+        self.invites.pop(guild_id, None)
+        self.expired.pop(guild_id, None)
+        self.synced.pop(guild_id, None)
+
+    def invite_create(self, invite: Invite) -> None:
+        if invite.guild and (invites := self.invites.get(invite.guild.id)) is not None:
+            invites[invite.code] = TrackedInvite(invite)
+
+    def invite_delete(self, invite: Invite) -> None:
+        if not invite.guild or (invites := self.invites.get(invite.guild.id)) is None:
+            return
+
+        tracked = invites.pop(invite.code, None)
+        if tracked and tracked.max_uses and tracked.uses + 1 >= tracked.max_uses:
+            # deleted right after the use that exhausted it
+            tracked.uses += 1
+            self.expired.setdefault(invite.guild.id, []).append(
+                (time.monotonic(), tracked)
+            )
+
+    async def attribute(self, guild: Guild, joins: int = 1) -> Optional[TrackedInvite]:
+        """
+        The invite used by the latest joins, if a single one was used
+        """
+
+        if not self.tracked(guild.id):
+            await self.load(guild)
+            return None
+
+        self.joins[guild.id] = self.joins.get(guild.id, 0) + joins
+        if (future := self.pending.get(guild.id)) is None:
+            future = self.pending[guild.id] = asyncio.ensure_future(self.sync(guild))
+
+        return await asyncio.shield(future)
+
+    async def sync(self, guild: Guild) -> Optional[TrackedInvite]:
+        wait = max(
+            self.debounce, self.synced.get(guild.id, 0) + self.interval - time.monotonic()
+        )
+        await asyncio.sleep(wait)
+
+        del self.pending[guild.id]
+        joins = self.joins.pop(guild.id, 0)
+        before = self.invites.get(guild.id, {})
+        invites = await self.fetch(guild)
+        if invites is None or not self.tracked(guild.id):
+            return None
+
+        used = [
+            (TrackedInvite(i), i.uses - (before[i.code].uses if i.code in before else 0))
+            for i in invites
+            if i.uses and (i.code not in before or i.uses > before[i.code].uses)
+        ]
+        now = time.monotonic()
+        for deleted_at, tracked in self.expired.pop(guild.id, []):
+            if now - deleted_at <= wait + self.debounce:
+                used.append((tracked, 1))
+
+        self.store(guild.id, invites)
+        if len(used) != 1:
+            return None
+
+        tracked, count = used[0]
+        # a single invite has to account for every join of the batch
+        return tracked if count >= joins else None
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from discord import Guild, HTTPException, Member, Role, TextChannel
+from discord.ext.commands import AutoShardedBot as AB
+
+log = logging.getLogger(__name__)
+
+JoinHandler = Callable[[Guild, List[Member]], Awaitable[Any]]
+
+
+def mergeable(message: Dict[str, Any]) -> bool:
+    if message.get("delete_after") or message.get("file") or message.get("files"):
+        return False
+
+    view = message.get("view")
+    return not (view and view.children)
+
+
+class ChannelOutbox:
+    """
+    Messages sent through one queue per channel
+
+    Every channel is paced below discord's 5 messages per 5 seconds, with
+    a shared bucket keeping all of them under the global limit. Plain
+    messages that pile up behind the limit are merged, up to 2000
+    characters and 10 embeds per message
+    """
+
+    def __init__(
+        self,
+        bot: AB,
+        rate: int = 5,
+        per: float = 5.0,
+        global_rate: int = 40,
+        max_queue: int = 500,
+    ):
+        self.bot = bot
+        self.rate = rate
+        self.per = per
+        self.global_rate = global_rate
+        self.max_queue = max_queue
+        self.queues: Dict[int, Deque[Dict[str, Any]]] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def __repr__(self) -> str:
+        return f"<ChannelOutbox channels={len(self.workers)} sent={self.sent} merged={self.merged} dropped={self.dropped}>"
+
+    def send(self, channel: TextChannel, **kwargs: Any) -> None:
+        queue = self.queues.setdefault(channel.id, deque())
+        if len(queue) >= self.max_queue:
+            queue.popleft()
+            self.dropped += 1
+
+        queue.append(kwargs)
+        if channel.id not in self.workers:
+            self.workers[channel.id] = asyncio.ensure_future(self.worker(channel))
+
+    async def worker(self, channel: TextChannel) -> None:
+        queue = self.queues[channel.id]
+        try:
+            while queue:
+                for key, rate, per in (
+                    (f"outbox:{channel.id}", self.rate, self.per),
+                    ("outbox", self.global_rate, 1.0),
+                ):
+                    while retry_after := self.bot.ratelimiter.bucket(key, rate, per):
+                        await asyncio.sleep(retry_after)
+
+                try:
+                    await channel.send(**self.take(queue))
+                    self.sent += 1
+                except HTTPException as e:
+                    log.warning(f"Unable to send to {channel.id}: {e}")
+                    if e.status in (403, 404):
+                        queue.clear()
+                except Exception:
+                    # a bad message is dropped, the ones behind it still go out
+                    log.exception(f"Unable to send to {channel.id}")
+        finally:
+            self.workers.pop(channel.id, None)
+            if not queue:
+                self.queues.pop(channel.id, None)
+
+    def take(self, queue: Deque[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        The next message to send, merged with the plain ones behind it
+        """
+
+        first = queue.popleft()
+        if not queue or not mergeable(first) or not mergeable(queue[0]):
+            return first
+
+        content: List[str] = [first["content"]] if first.get("content") else []
+        embeds = [first["embed"]] if first.get("embed") else []
+        length = sum(map(len, content))
+        size = sum(map(len, embeds))
+        while queue and mergeable(queue[0]):
+            message = queue[0]
+            text = message.get("content")
+            embed = message.get("embed")
+            if text and length + len(text) + 1 > 2000:
+                break
+
+            if embed and (len(embeds) == 10 or size + len(embed) > 6000):
+                break
+
+            queue.popleft()
+            self.merged += 1
+            if text:
+                content.append(text)
+                length += len(text) + 1
+            if embed:
+                embeds.append(embed)
+                size += len(embed)
+
+        return {"content": "\n".join(content) or None, "embeds": embeds}
+
+
+class JoinPipeline:
+    """
+    Member joins coalesced per guild into small batches
+
+    The first join of a guild opens a batch that is handed to every
+    handler window seconds later, or as soon as it's full. A raid costs
+    each handler one lookup per batch instead of one per member, and
+    whatever they send goes through the channel outbox
+    """
+
+    def __init__(
+        self,
+        bot: AB,
+        window: float = 1.0,
+        max_batch: int = 100,
+        role_concurrency: int = 5,
+    ):
+        self.bot = bot
+        self.window = window
+        self.max_batch = max_batch
+        self.handlers: Dict[str, Tuple[JoinHandler, Optional[str]]] = {}
+        self.batches: Dict[int, List[Member]] = {}
+        self.timers: Dict[int, asyncio.TimerHandle] = {}
+        self.outbox = ChannelOutbox(bot)
+        self.roles = asyncio.Semaphore(role_concurrency)
+        self.joins = 0
+        self.flushed = 0
+
+    def __repr__(self) -> str:
+        return f"<JoinPipeline handlers={len(self.handlers)} pending={len(self.batches)} joins={self.joins} batches={self.flushed}>"
+
+    def register(
+        self, name: str, callback: JoinHandler, *, feature: Optional[str] = None
+    ) -> None:
+        """
+        Add a handler. feature is a guild config table that has to be set for it to run
+        """
+
+        self.handlers[name] = (callback, feature)
+
+    def unregister(self, *names: str) -> None:
+        for name in names:
+            self.handlers.pop(name, None)
+
+    def push(self, member: Member) -> None:
+        self.joins += 1
+        batch = self.batches.setdefault(member.guild.id, [])
+        batch.append(member)
+        if len(batch) >= self.max_batch:
+            if timer := self.timers.pop(member.guild.id, None):
+                timer.cancel()
+
+            self.flush(member.guild.id)
+        elif len(batch) == 1:
+            self.timers[member.guild.id] = asyncio.get_running_loop().call_later(
+                self.window, self.flush, member.guild.id
+            )
+
+    def flush(self, guild_id: int) -> None:
+        self.timers.pop(guild_id, None)
+        members = self.batches.pop(guild_id, None)
+        if members and (guild := self.bot.get_guild(guild_id)):
+            self.flushed += 1
+            asyncio.ensure_future(self.run("dispatch", self.dispatch, guild, members))
+
+    async def dispatch(self, guild: Guild, members: List[Member]) -> None:
+        await self.bot.guild_config.load([guild.id])
+        for name, (callback, feature) in list(self.handlers.items()):
+            if feature and not self.bot.guild_config.get(feature, guild.id):
+                continue
+
+            asyncio.ensure_future(self.run(name, callback, guild, members))
+
+    async def run(
+        self, name: str, callback: JoinHandler, guild: Guild, members: List[Member]
+    ) -> None:
+        try:
+            await callback(guild, members)
+        except Exception:
+            log.exception(f"Join handler {name} failed in {guild.id}")
+
+    async def add_roles(self, member: Member, *roles: Role, reason: str) -> None:
+        """
+        Add roles to a member, a few members at a time
+        """
+
+        async with self.roles:
+            try:
+                await member.add_roles(*roles, reason=reason)
+            except HTTPException as e:
+                log.debug(f"Unable to add roles to {member.id}: {e}")
@@ -0,0 +1,222 @@
+import time
+import asyncio
+import logging
+
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from discord import Member
+from discord.ext.commands import AutoShardedBot as AB
+
+log = logging.getLogger(__name__)
+
+Key = Tuple[int, int]
+
+
+def target_for(level: int) -> int:
+    """
+    xp needed to go past the given level
+    """
+
+    return int((100 * level + 1) ** 0.9) if level else int((100 * 1) ** 0.9)
+
+
+class LevelState:
+    __slots__ = ("level", "xp", "target_xp", "new", "touched")
+
+    def __init__(self, level: int, xp: int, target_xp: int, new: bool = False):
+        self.level = level
+        self.xp = xp
+        self.target_xp = target_xp
+        self.new = new
+        self.touched = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"<LevelState level={self.level} xp={self.xp}/{self.target_xp}>"
+
+    def __getitem__(self, key: str):
+        # lets the state stand in for a level_user record
+        return getattr(self, key)
+
+
+class LevelEngine:
+    """
+    In-memory xp accumulator for level_user, written back to postgres in batches
+    """
+
+    def __init__(self, bot: AB, idle: float = 900.0):
+        self.bot = bot
+        self.idle = idle
+        self.users: Dict[Key, LevelState] = {}
+        self.dirty: Set[Key] = set()
+        self.locks: Dict[Key, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.flush_lock = asyncio.Lock()
+        self.written = 0
+
+    def __repr__(self) -> str:
+        return f"<LevelEngine users={len(self.users)} dirty={len(self.dirty)}>"
+
+    async def get(self, guild_id: int, user_id: int) -> Optional[LevelState]:
+        """
+        The level state of a member, loading it from the database once
+        """
+
+        key = (guild_id, user_id)
+        if state := self.users.get(key):
+            return state
+
+        async with self.locks[key]:
+            if state := self.users.get(key):
+                return state
+
+            check = await self.bot.db.fetchrow(
+                "SELECT * FROM level_user WHERE guild_id = $1 AND user_id = $2",
+                guild_id,
+                user_id,
+            )
+            if not check:
+                return None
+
+            state = self.users[key] = LevelState(
+                check["level"], check["xp"], check["target_xp"]
+            )
+            return state
+
+    async def add_xp(
+        self, member: Member, amount: int
+    ) -> Tuple[LevelState, bool, bool]:
+        """
+        Add xp to a member. Returns (state, leveled up, first seen since startup)
+        """
+
+        key = (member.guild.id, member.id)
+        loaded = key in self.users
+        state = await self.get(*key)
+
+        if state is None:
+            # new members start at level 0 with their first message's xp
+            state = self.users[key] = LevelState(0, 0, target_for(0), new=True)
+
+        state.xp += amount
+        state.touched = time.monotonic()
+        self.dirty.add(key)
+
+        leveled = False
+        if state.xp >= state.target_xp:
+            state.level += 1
+            state.target_xp = target_for(state.level)
+            state.xp = 0
+            leveled = True
+
+        return state, leveled, not loaded
+
+    def set(self, guild_id: int, user_id: int, level: int) -> None:
+        """
+        Overwrite the cached state after the database row was changed directly
+        """
+
+        key = (guild_id, user_id)
+        self.dirty.discard(key)
+        if state := self.users.get(key):
+            state.level = level
+            state.xp = 0
+            state.target_xp = target_for(level)
+            state.new = False
+
+    def forget(self, guild_id: int, user_id: Optional[int] = None) -> None:
+        """
+        Drop the cached state of a member, or of a whole guild
+        """
+
+        if user_id is not None:
+            keys = [(guild_id, user_id)]
+        else:
+            keys = [k for k in self.users if k[0] == guild_id]
+
+        for key in keys:
+            self.users.pop(key, None)
+            self.dirty.discard(key)
+
+    async def flush(self) -> int:
+        """
+        Write every changed row with one UPDATE batch and one INSERT batch
+        """
+
+        async with self.flush_lock:
+            if not self.dirty:
+                return 0
+
+            keys, self.dirty = self.dirty, set()
+            updates: List[tuple] = []
+            inserts: List[tuple] = []
+            inserted: List[LevelState] = []
+
+            for key in keys:
+                state = self.users.get(key)
+                if state is None:
+                    continue
+
+                # new rows are updated too, in case another cluster or a
+                # level command wrote them since; the insert skips those
+                updates.append((state.xp, state.level, state.target_xp, *key))
+                if state.new:
+                    state.new = False
+                    inserted.append(state)
+                    inserts.append((*key, state.xp, state.level, state.target_xp))
+
+            try:
+                if updates:
+                    await self.bot.db.executemany(
+                        """
+            UPDATE level_user
+            SET xp = $1,
+            level = $2,
+            target_xp = $3
+            WHERE guild_id = $4
+            AND user_id = $5
+            """,
+                        updates,
+                    )
+
+                if inserts:
+                    # level_user has no unique constraint to upsert on
+                    await self.bot.db.executemany(
+                        """
+            INSERT INTO level_user (guild_id, user_id, xp, level, target_xp)
+            SELECT $1::BIGINT, $2::BIGINT, $3::INTEGER, $4::INTEGER, $5::INTEGER
+            WHERE NOT EXISTS (
+              SELECT 1 FROM level_user WHERE guild_id = $1 AND user_id = $2
+            )
+            """,
+                        inserts,
+                    )
+            except Exception:
+                log.exception(f"Unable to flush {len(keys)} level rows")
+                for state in inserted:
+                    state.new = True
+
+                self.dirty.update(k for k in keys if k in self.users)
+                return 0
+
+            self.written += len(updates)
+            return len(updates)
+
+    def evict(self) -> int:
+        """
+        Drop clean members that didn't talk for a while
+        """
+
+        cutoff = time.monotonic() - self.idle
+        stale = [
+            key
+            for key, state in self.users.items()
+            if state.touched < cutoff and key not in self.dirty
+        ]
+        for key in stale:
+            del self.users[key]
+
+        for key in [k for k, l in self.locks.items() if not l.locked()]:
+            if key not in self.users:
+                del self.locks[key]
+
+        return len(stale)
@@ -0,0 +1,223 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from aiofiles import open as async_open
+
+from .exceptions import MediaTooLarge
+from .misc.session import Session
+
+log = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """
+    Content addressed cache for downloaded media
+
+    Urls map to the sha256 of their content. Blobs live in a memory LRU
+    bounded by bytes and spill to a bounded disk directory when evicted.
+    Every cluster gets its own directory, so the disk budget holds per cluster
+    """
+
+    def __init__(
+        self,
+        session: Optional[Session] = None,
+        memory_bytes: int = 64 * 1024 * 1024,
+        disk_bytes: int = 1024 * 1024 * 1024,
+        max_size: int = 50 * 1024 * 1024,
+        ttl: float = 3600.0,
+        path: Optional[str] = None,
+        chunk_size: int = 64 * 1024,
+        max_urls: int = 100_000,
+        cluster_id: int = 0,
+    ):
+        self.session = session or Session()
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_size = max_size
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.max_urls = max_urls
+        self.path = path or os.path.join(
+            tempfile.gettempdir(), "pretend-media", str(cluster_id)
+        )
+        os.makedirs(self.path, exist_ok=True)
+
+        self.urls: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.disk: "OrderedDict[str, int]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.used = 0
+        self.disk_used = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.rejected = 0
+
+        # pick up what previous runs left on disk, oldest first
+        files = []
+        for name in os.listdir(self.path):
+            fp = os.path.join(self.path, name)
+            if os.path.isfile(fp):
+                files.append((os.path.getmtime(fp), name, os.path.getsize(fp)))
+
+        for _, name, size in sorted(files):
+            self.disk[name] = size
+            self.disk_used += size
+
+    def __repr__(self) -> str:
+        return f"<MediaCache memory={self.used} disk={self.disk_used} hits={self.hits} misses={self.misses}>"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "urls": len(self.urls),
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.used,
+            "disk_entries": len(self.disk),
+            "disk_bytes": self.disk_used,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "rejected": self.rejected,
+        }
+
+    async def get(self, url: str, max_size: Optional[int] = None) -> bytes:
+        """
+        The content of an url, downloading it at most once for concurrent callers
+        """
+
+        if data := await self.lookup(url):
+            return data
+
+        if task := self.inflight.get(url):
+            self.shared += 1
+        else:
+            task = self.inflight[url] = asyncio.ensure_future(
+                self.fetch(url, max_size or self.max_size)
+            )
+
+        # a cancelled caller doesn't cancel the download for the others
+        return await asyncio.shield(task)
+
+    async def fetch(self, url: str, max_size: int) -> bytes:
+        try:
+            data = await self.download(url, max_size)
+            self.store(url, data)
+            return data
+        finally:
+            self.inflight.pop(url, None)
+
+    async def lookup(self, url: str) -> Optional[bytes]:
+        entry = self.urls.get(url)
+        if not entry:
+            return None
+
+        digest, expires = entry
+        if expires < time.monotonic():
+            self.urls.pop(url, None)
+            return None
+
+        if (data := self.memory.get(digest)) is not None:
+            self.memory.move_to_end(digest)
+            self.hits += 1
+            return data
+
+        if digest in self.disk:
+            try:
+                async with async_open(os.path.join(self.path, digest), "rb") as file:
+                    data = await file.read()
+            except OSError:
+                self.disk_used -= self.disk.pop(digest)
+                return None
+
+            self.disk.move_to_end(digest)
+            self.disk_hits += 1
+            self.remember(digest, data)
+            return data
+
+        self.urls.pop(url, None)
+        return None
+
+    async def download(self, url: str, max_size: int) -> bytes:
+        """
+        Stream an url into memory, giving up once it's bigger than max_size
+        """
+
+        self.misses += 1
+        async with self.session.request("GET", url) as r:
+            r.raise_for_status()
+            if r.content_length and r.content_length > max_size:
+                self.rejected += 1
+                raise MediaTooLarge(r.content_length, max_size)
+
+            buffer = bytearray()
+            async for chunk in r.content.iter_chunked(self.chunk_size):
+                buffer.extend(chunk)
+                if len(buffer) > max_size:
+                    self.rejected += 1
+                    raise MediaTooLarge(len(buffer), max_size)
+
+        return bytes(buffer)
+
+    def store(self, url: str, data: bytes) -> None:
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.monotonic()
+        self.urls.pop(url, None)
+        self.urls[url] = (digest, now + self.ttl)
+        # every url gets the same ttl, so the oldest ones expire first
+        while self.urls and (
+            len(self.urls) > self.max_urls or next(iter(self.urls.values()))[1] < now
+        ):
+            self.urls.popitem(last=False)
+
+        self.remember(digest, data)
+
+    def remember(self, digest: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            asyncio.ensure_future(self.spill(digest, data))
+            return
+
+        if digest not in self.memory:
+            self.memory[digest] = data
+            self.used += len(data)
+
+        self.memory.move_to_end(digest)
+        while self.used > self.memory_bytes:
+            old, blob = self.memory.popitem(last=False)
+            self.used -= len(blob)
+            if old not in self.disk:
+                asyncio.ensure_future(self.spill(old, blob))
+
+    async def spill(self, digest: str, data: bytes) -> None:
+        """
+        Move an evicted blob to the disk tier
+        """
+
+        if len(data) > self.disk_bytes or digest in self.disk:
+            return
+
+        try:
+            async with async_open(os.path.join(self.path, digest), "wb") as file:
+                await file.write(data)
+        except OSError as e:
+            log.warning(f"Unable to write {digest} to the media cache: {e}")
+            return
+
+        self.disk[digest] = len(data)
+        self.disk_used += len(data)
+        while self.disk_used > self.disk_bytes:
+            old, size = self.disk.popitem(last=False)
+            self.disk_used -= size
+            try:
+                os.remove(os.path.join(self.path, old))
+            except OSError:
+                pass
@@ -1,13 +1,121 @@
+import asyncio
 import aiohttp
-from typing import Optional
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+# statuses worth retrying, everything else is returned as is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
 
 
 class Session:
-    def __init__(self):
+    """
+    Connection pooled http client, every instance shares the same pool
+    """
+
+    LIMIT = 100
+    LIMIT_PER_HOST = 20
+    DNS_TTL = 300
+    KEEPALIVE = 30
+    TIMEOUT = 20.0
+    CONNECT_TIMEOUT = 5.0
+
+    _client: Optional[aiohttp.ClientSession] = None
+
+    def __init__(self, retries: int = 2, backoff: float = 0.5):
+        self.retries = retries
+        self.backoff = backoff
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/74.0.3729.169 Safari/537.36"
         }
 
+    @property
+    def client(self) -> aiohttp.ClientSession:
+        """
+        The shared aiohttp session, created on first use
+        """
+
+        if Session._client is None or Session._client.closed:
+            Session._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.LIMIT,
+                    limit_per_host=self.LIMIT_PER_HOST,
+                    ttl_dns_cache=self.DNS_TTL,
+                    keepalive_timeout=self.KEEPALIVE,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=self.TIMEOUT, connect=self.CONNECT_TIMEOUT
+                ),
+                headers=self.headers,
+            )
+
+        return Session._client
+
+    async def close(self) -> None:
+        if Session._client and not Session._client.closed:
+            await Session._client.close()
+
+        Session._client = None
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Seconds to wait before the next attempt
+        """
+
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+
+        return self.backoff * 2**attempt
+
+    @asynccontextmanager
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        retries: Optional[int] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Send a request through the pool, retrying connection errors and
+        retryable statuses with exponential backoff
+        """
+
+        method = method.upper()
+        if retries is None:
+            retries = self.retries if method in IDEMPOTENT else 0
+
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            else:
+                if response.status not in RETRY_STATUSES or attempt >= retries:
+                    break
+
+                retry_after = response.headers.get("Retry-After")
+                response.release()
+
+            await asyncio.sleep(self.delay(attempt, retry_after))
+            attempt += 1
+
+        try:
+            yield response
+        finally:
+            response.release()
+
     async def post_json(
         self,
         url: str,
@@ -19,9 +127,10 @@ class Session:
         Use the post method to get the json response
         """
 
-        async with aiohttp.ClientSession(headers=headers or self.headers) as cs:
-            async with cs.post(url, headers=headers, params=params, proxy=proxy) as r:
-                return await r.json()
+        async with self.request(
+            "POST", url, headers=headers, params=params, proxy=proxy
+        ) as r:
+            return await r.json()
 
     async def get_json(
         self,
@@ -34,9 +143,10 @@ class Session:
         Use the get method to get the json response
         """
 
-        async with aiohttp.ClientSession(headers=headers or self.headers) as cs:
-            async with cs.get(url, headers=headers, params=params, proxy=proxy) as r:
-                return await r.json()
+        async with self.request(
+            "GET", url, headers=headers, params=params, proxy=proxy
+        ) as r:
+            return await r.json()
 
     async def get_text(
         self,
@@ -49,9 +159,10 @@ class Session:
         Use the get method to get the text response
         """
 
-        async with aiohttp.ClientSession(headers=headers or self.headers) as cs:
-            async with cs.get(url, headers=headers, params=params, proxy=proxy) as r:
-                return await r.text()
+        async with self.request(
+            "GET", url, headers=headers, params=params, proxy=proxy
+        ) as r:
+            return await r.text()
 
     async def get_bytes(
         self,
@@ -64,6 +175,7 @@ class Session:
         Use the get method to get the bytes response
         """
 
-        async with aiohttp.ClientSession(headers=headers or self.headers) as cs:
-            async with cs.get(url, headers=headers, params=params, proxy=proxy) as r:
-                return await r.read()
+        async with self.request(
+            "GET", url, headers=headers, params=params, proxy=proxy
+        ) as r:
+            return await r.read()
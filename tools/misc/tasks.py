@@ -2,42 +2,15 @@ import orjson
 import random
 import datetime
 
-from discord import Embed, NotFound, AllowedMentions
+from discord import Embed, AllowedMentions, HTTPException
 
 from discord.ext import tasks
 from discord.ext.commands import AutoShardedBot as AB
 
 
-@tasks.loop(minutes=10)
+@tasks.loop(seconds=30)
 async def counter_update(bot: AB):
-    results = await bot.db.fetch("SELECT * FROM counters")
-    for result in results:
-        channel = bot.get_channel(int(result["channel_id"]))
-        if channel:
-            guild = channel.guild
-
-            if not guild.chunked:
-                await guild.chunk(cache=True)
-
-            if not guild.me.guild_permissions.manage_channels:
-                continue
-
-            module = result["module"]
-
-            match module:
-                case "members":
-                    target = str(guild.member_count)
-                case "humans":
-                    target = str(len([m for m in guild.members if not m.bot]))
-                case "bots":
-                    target = str(len([m for m in guild.members if m.bot]))
-                case "boosters":
-                    target = str(len(guild.premium_subscribers))
-                case "voice":
-                    target = str(sum(len(c.members) for c in guild.voice_channels))
-
-            name = result["channel_name"].replace("{target}", target)
-            await channel.edit(name=name, reason="updating counter")
+    await bot.counters.flush()
 
 
 @tasks.loop(hours=6)
@@ -51,89 +24,79 @@ async def snipe_delete(bot: AB):
         bot.cache.delete(m)
 
 
-@tasks.loop(seconds=5)
-async def reminder_task(bot: AB):
-    results = await bot.db.fetch("SELECT * FROM reminder")
-    for result in results:
-        if datetime.datetime.now().timestamp() > result["date"].timestamp():
-            channel = bot.get_channel(int(result["channel_id"]))
-            if channel:
-                if not channel.guild.chunked:
-                    await channel.guild.chunk(cache=True)
-
-                await channel.send(f"🕰️ <@{result['user_id']}> - {result['task']}")
-                await bot.db.execute(
-                    """
-          DELETE FROM reminder 
-          WHERE guild_id = $1 
-          AND user_id = $2 
-          AND channel_id = $3
-          """,
-                    channel.guild.id,
-                    result["user_id"],
-                    channel.id,
-                )
+async def reminder_task(bot: AB, result):
+    guild = bot.get_guild(int(result["guild_id"]))
+    if guild and guild.unavailable:
+        # discord outage, the reminder fires again with the next window
+        return
 
+    # the row goes even if the channel is gone or the send fails,
+    # otherwise it stays overdue and fires again on every window
+    if channel := bot.get_channel(int(result["channel_id"])):
+        try:
+            await channel.send(f"🕰️ <@{result['user_id']}> - {result['task']}")
+        except HTTPException:
+            pass
 
-@tasks.loop(minutes=1)
-async def bump_remind(bot):
-    results = await bot.db.fetch(
-        "SELECT channel_id, reminder, user_id, time FROM bumpreminder WHERE time IS NOT NULL"
+    await bot.db.execute(
+        """
+      DELETE FROM reminder 
+      WHERE guild_id = $1 
+      AND user_id = $2 
+      AND channel_id = $3
+      """,
+        result["guild_id"],
+        result["user_id"],
+        result["channel_id"],
     )
-    for result in [
-        r for r in results if r[3].timestamp() < datetime.datetime.now().timestamp()
-    ]:
-        channel = bot.get_channel(result[0])
-        if channel:
-            if not channel.guild.chunked:
-                await channel.guild.chunk(cache=True)
-
-            try:
-                user = channel.guild.get_member(result[2]) or channel.guild.owner
-                x = await bot.embed_build.alt_convert(user, result[1])
-                x["allowed_mentions"] = AllowedMentions.all()
-                await channel.send(**x)
-            except:
-                continue
-        await bot.db.execute(
-            "UPDATE bumpreminder SET time = $1, channel_id = $2, user_id = $3 WHERE channel_id = $4",
-            None,
-            None,
-            None,
-            result[0],
-        )
-
-
-@tasks.loop(minutes=10)
-async def check_monthly_guilds(bot: AB):
-    results = await bot.db.fetch("SELECT * FROM authorize WHERE till IS NOT NULL")
-    for result in results:
-        if result["till"]:
-            if datetime.datetime.now().timestamp() > result["till"].timestamp():
-                guild = bot.get_guild(result["guild_id"])
-                user = result["user_id"]
-                await bot.db.execute(
-                    "DELETE FROM authorize WHERE guild_id = $1", result["guild_id"]
-                )
 
-                val = await bot.db.fetchrow(
-                    "SELECT * FROM authorize WHERE user_id = $1", user
-                )
-                if not val:
-                    if support := bot.get_guild(1005150492382478377):
-                        if member := support.get_member(user):
-                            if role := support.get_role(1124447347783520318):
-                                await member.remove_roles(role)
-
-                if guild:
-                    await guild.leave()
-                    await bot.get_channel(1122993923422429274).send(
-                        f"Left **{guild.name}** (`{guild.id}`). monthly payment not received"
-                    )
-                else:
-                    await bot.get_channel(1122993923422429274).send(
-                        f"Removing `{result['guild_id']}`. monthly payment not received"
-                    )
+
+async def bump_remind(bot: AB, result):
+    channel = bot.get_channel(result["channel_id"])
+    if channel:
+        await bot.chunker.wait(channel.guild, 10)
+        try:
+            user = channel.guild.get_member(result["user_id"]) or channel.guild.owner
+            x = await bot.embed_build.alt_convert(user, result["reminder"])
+            x["allowed_mentions"] = AllowedMentions.all()
+            await channel.send(**x)
+        except:
+            return
+
+    await bot.db.execute(
+        "UPDATE bumpreminder SET time = $1, channel_id = $2, user_id = $3 WHERE channel_id = $4",
+        None,
+        None,
+        None,
+        result["channel_id"],
+    )
+
+
+async def check_monthly_guild(bot: AB, result):
+    guild = bot.get_guild(result["guild_id"])
+    user = result["user_id"]
+    await bot.db.execute("DELETE FROM authorize WHERE guild_id = $1", result["guild_id"])
+
+    val = await bot.db.fetchrow("SELECT * FROM authorize WHERE user_id = $1", user)
+    if not val:
+        # the support server can be on another cluster, so this goes through REST
+        try:
+            await bot.http.remove_role(
+                1005150492382478377, user, 1124447347783520318
+            )
+        except HTTPException:
+            pass
+
+    if guild:
+        await guild.leave()
+        message = f"Left **{guild.name}** (`{guild.id}`). monthly payment not received"
+    else:
+        message = f"Removing `{result['guild_id']}`. monthly payment not received"
+
+    try:
+        await bot.get_partial_messageable(1122993923422429274).send(message)
+    except HTTPException:
+        pass
 
 
 @tasks.loop(seconds=5)
@@ -143,13 +106,8 @@ async def shit_loop(bot: AB):
             await player.do_next()
 
 
-@tasks.loop(seconds=5)
-async def gw_loop(bot: AB):
-    results = await bot.db.fetch("SELECT * FROM giveaway")
-    date = datetime.datetime.now()
-    for result in results:
-        if date.timestamp() > result["finish"].timestamp():
-            await gwend_task(bot, result, date)
+async def gw_end(bot: AB, result):
+    await gwend_task(bot, result, datetime.datetime.now())
 
 
 async def gwend_task(bot: AB, result, date: datetime.datetime):
@@ -158,9 +116,6 @@ async def gwend_task(bot: AB, result, date: datetime.datetime):
     channel_id = result["channel_id"]
     message_id = result["message_id"]
     if channel := bot.get_channel(channel_id):
-        if not channel.guild.chunked:
-            await channel.guild.chunk(cache=True)
-
         try:
             message = await channel.fetch_message(message_id)
             wins = []
@@ -188,7 +143,8 @@ async def gwend_task(bot: AB, result, date: datetime.datetime):
                     f"**{result['title']}** winners:\n"
                     + "\n".join([f"<@{w}> ({w})" for w in wins])
                 )
-        except NotFound:
+        except HTTPException:
+            # a missing message or permission must not keep the row overdue
             pass
 
     await bot.db.execute(
@@ -0,0 +1,220 @@
+import time
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from discord import Member, Message
+from discord.utils import cached_property
+from discord.ext.commands import AutoShardedBot as AB
+
+log = logging.getLogger(__name__)
+
+
+class MessageEvent:
+    """
+    Per message state shared by every pipeline stage
+    """
+
+    def __init__(self, bot: AB, message: Message):
+        self.bot = bot
+        self.message = message
+        self.guild = message.guild
+        self.author = message.author
+        self.blacklisted = False
+
+    @property
+    def is_bot(self) -> bool:
+        return self.author.bot
+
+    @property
+    def is_member(self) -> bool:
+        return isinstance(self.author, Member)
+
+    @cached_property
+    def is_system(self) -> bool:
+        return self.message.is_system()
+
+    @cached_property
+    def can_reply(self) -> bool:
+        """
+        whether the bot can send embeds in the channel
+        """
+
+        perms = self.message.channel.permissions_for(self.guild.me)
+        return perms.send_messages and perms.embed_links
+
+    @cached_property
+    def content(self) -> str:
+        return self.message.content
+
+    @cached_property
+    def lowered(self) -> str:
+        return self.message.content.lower()
+
+    @cached_property
+    def words(self) -> List[str]:
+        return self.lowered.split()
+
+    @cached_property
+    def word_set(self) -> Set[str]:
+        return set(self.words)
+
+    def config(self, table: str):
+        """
+        guild config from the config snapshot
+        """
+
+        return self.bot.guild_config.get(table, self.guild.id)
+
+
+class Stage:
+    __slots__ = (
+        "name",
+        "callback",
+        "feature",
+        "bots",
+        "dms",
+        "system",
+        "calls",
+        "skipped",
+        "errors",
+        "total",
+        "slowest",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        callback: Callable[[MessageEvent], Awaitable[Any]],
+        feature: Optional[Union[str, Callable[[MessageEvent], bool]]] = None,
+        bots: bool = False,
+        dms: bool = False,
+        system: bool = False,
+    ):
+        self.name = name
+        self.callback = callback
+        self.feature = feature
+        self.bots = bots
+        self.dms = dms
+        self.system = system
+        self.calls = 0
+        self.skipped = 0
+        self.errors = 0
+        self.total = 0.0
+        self.slowest = 0.0
+
+    def wants(self, event: MessageEvent) -> bool:
+        """
+        cheap checks deciding if the stage runs for this message
+        """
+
+        if not event.guild:
+            return self.dms
+
+        if event.is_bot and not self.bots:
+            return False
+
+        if not self.system and event.is_system:
+            return False
+
+        if self.feature is None:
+            return True
+
+        if isinstance(self.feature, str):
+            return bool(event.config(self.feature))
+
+        return self.feature(event)
+
+    async def run(self, event: MessageEvent) -> None:
+        start = time.perf_counter()
+        try:
+            await self.callback(event)
+        except Exception:
+            self.errors += 1
+            log.exception(f"Message stage {self.name} failed")
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls += 1
+            self.total += elapsed
+            if elapsed > self.slowest:
+                self.slowest = elapsed
+
+
+class MessagePipeline:
+    """
+    Runs every registered message stage from a single on_message event
+    """
+
+    def __init__(self, bot: AB):
+        self.bot = bot
+        self.stages: Dict[str, Stage] = {}
+        self.messages = 0
+
+    def __repr__(self) -> str:
+        return f"<MessagePipeline stages={list(self.stages)} messages={self.messages}>"
+
+    def register(
+        self,
+        name: str,
+        callback: Callable[[MessageEvent], Awaitable[Any]],
+        *,
+        feature: Optional[Union[str, Callable[[MessageEvent], bool]]] = None,
+        bots: bool = False,
+        dms: bool = False,
+        system: bool = False,
+    ) -> None:
+        """
+        Add a stage. feature is a guild config table or a predicate, checked before the stage runs
+        """
+
+        self.stages[name] = Stage(name, callback, feature, bots, dms, system)
+
+    def unregister(self, *names: str) -> None:
+        for name in names:
+            self.stages.pop(name, None)
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per stage call counts and latency in milliseconds
+        """
+
+        return {
+            stage.name: {
+                "calls": stage.calls,
+                "skipped": stage.skipped,
+                "errors": stage.errors,
+                "avg_ms": round(stage.total / stage.calls * 1000, 3)
+                if stage.calls
+                else 0,
+                "max_ms": round(stage.slowest * 1000, 3),
+            }
+            for stage in self.stages.values()
+        }
+
+    async def dispatch(self, message: Message) -> None:
+        """
+        Build the shared message state and run the stages that apply
+        """
+
+        self.messages += 1
+        event = MessageEvent(self.bot, message)
+
+        if event.guild:
+            await self.bot.guild_config.load([event.guild.id])
+
+            if not event.is_bot:
+                event.blacklisted = await self.bot.blacklist.user(event.author.id)
+
+        stages = []
+        for stage in list(self.stages.values()):
+            if stage.wants(event):
+                stages.append(stage)
+            else:
+                stage.skipped += 1
+
+        if len(stages) == 1:
+            await stages[0].run(event)
+        elif stages:
+            await asyncio.gather(*(stage.run(event) for stage in stages))
@@ -1,4 +1,3 @@
-import orjson
 import datetime
 
 from discord.ext.commands import check, BadArgument
@@ -35,9 +34,7 @@ ANTINUKE PREDICATES
 
 def antinuke_owner():
     async def predicate(ctx: PretendContext):
-        if owner_id := await ctx.bot.db.fetchval(
-            "SELECT owner_id FROM antinuke WHERE guild_id = $1", ctx.guild.id
-        ):
+        if owner_id := (await ctx.bot.an.policy(ctx.guild)).owner_id:
             if ctx.author.id != owner_id:
                 await ctx.send_warning(f"Only <@!{owner_id}> can use this command!")
                 return False
@@ -50,27 +47,19 @@ def antinuke_owner():
 
 def antinuke_configured():
     async def predicate(ctx: PretendContext):
-        check = await ctx.bot.db.fetchval(
-            "SELECT configured FROM antinuke WHERE guild_id = $1", ctx.guild.id
-        )
-        if not check or check == "false":
+        if not (await ctx.bot.an.policy(ctx.guild)).configured:
             await ctx.send_warning("Antinuke is **not** configured")
-        return str(check) == "true"
+            return False
+        return True
 
     return check(predicate)
 
 
 def admin_antinuke():
     async def predicate(ctx: PretendContext):
-        check = await ctx.bot.db.fetchrow(
-            "SELECT owner_id, admins FROM antinuke WHERE guild_id = $1", ctx.guild.id
-        )
-        if check:
-            allowed = [check["owner_id"]]
-            if check["admins"]:
-                allowed.extend([id for id in orjson.loads(check["admins"])])
-
-            if not ctx.author.id in allowed:
+        policy = await ctx.bot.an.policy(ctx.guild)
+        if policy.config:
+            if not policy.is_admin(ctx.author.id):
                 await ctx.send_warning("You **cannot** use this command")
                 return False
             return True
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from discord import Message
+from discord.ext.commands import AutoShardedBot as AB
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "selfprefix"
+DEFAULT = ","
+
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION notify_selfprefix() RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    PERFORM pg_notify('{CHANNEL}', changed.user_id::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+class PrefixMatcher:
+    """
+    The prefixes a message can start with, mentions included
+    """
+
+    __slots__ = ("prefixes", "everything", "first")
+
+    def __init__(self, prefixes: Tuple[str, ...], mentions: Tuple[str, ...]):
+        self.prefixes = prefixes
+        self.everything = mentions + prefixes
+        self.first: FrozenSet[str] = frozenset(p[0] for p in self.everything)
+
+    def __repr__(self) -> str:
+        return f"<PrefixMatcher prefixes={self.prefixes}>"
+
+    def matches(self, content: str) -> bool:
+        # most messages aren't commands, rule them out on the first character
+        if not content or content[0] not in self.first:
+            return False
+
+        return content.startswith(self.everything)
+
+
+class PrefixResolver:
+    """
+    Guild and self prefixes resolved from memory
+
+    Guild prefixes come from the guild config store, self prefixes are
+    loaded in bulk and kept fresh with a NOTIFY trigger. Matchers are
+    shared between every guild and user with the same prefixes
+    """
+
+    MAX_MATCHERS = 4096
+
+    def __init__(self, bot: AB):
+        self.bot = bot
+        self.users: Dict[int, str] = {}
+        self.matchers: Dict[Tuple[Optional[str], Optional[str]], PrefixMatcher] = {}
+
+    def __repr__(self) -> str:
+        return f"<PrefixResolver users={len(self.users)} matchers={len(self.matchers)}>"
+
+    async def setup(self) -> None:
+        """
+        Load every self prefix and listen for changes
+        """
+
+        try:
+            await self.bot.db.execute(TRIGGER_FUNCTION)
+            await self.bot.db.execute(
+                "DROP TRIGGER IF EXISTS selfprefix_notify ON selfprefix"
+            )
+            await self.bot.db.execute(
+                """
+          CREATE TRIGGER selfprefix_notify
+          AFTER INSERT OR UPDATE OR DELETE ON selfprefix
+          FOR EACH ROW EXECUTE FUNCTION notify_selfprefix()
+          """
+            )
+        except Exception as e:
+            log.warning(f"Unable to install the self prefix trigger: {e}")
+
+        await self.load()
+        await self.bot.db.listen(CHANNEL, self.on_notify, self.on_reconnect)
+
+    async def load(self) -> None:
+        self.bot.db.invalidate("selfprefix")
+        results = await self.bot.db.fetch("SELECT user_id, prefix FROM selfprefix")
+        self.users = {r["user_id"]: r["prefix"] for r in results}
+
+    async def refresh(self, user_id: int) -> None:
+        self.bot.db.invalidate("selfprefix")
+        prefix = await self.bot.db.fetchval(
+            "SELECT prefix FROM selfprefix WHERE user_id = $1", user_id
+        )
+        self.set_user(user_id, prefix)
+
+    def set_user(self, user_id: int, prefix: Optional[str]) -> None:
+        if prefix:
+            self.users[user_id] = prefix
+        else:
+            self.users.pop(user_id, None)
+
+    def on_notify(self, payload: str) -> None:
+        if payload.isdigit():
+            asyncio.ensure_future(self.refresh(int(payload)))
+
+    def on_reconnect(self) -> None:
+        asyncio.ensure_future(self.load())
+
+    def matcher(self, message: Message) -> PrefixMatcher:
+        """
+        The compiled prefixes of a guild message
+        """
+
+        config = self.bot.guild_config.get("prefixes", message.guild.id)
+        key = (config["prefix"] if config else None, self.users.get(message.author.id))
+        if (matcher := self.matchers.get(key)) is None:
+            if len(self.matchers) >= self.MAX_MATCHERS:
+                self.matchers.clear()
+
+            guild, user = key
+            prefixes = tuple(dict.fromkeys(p for p in (user, guild or DEFAULT) if p))
+            mentions = (f"<@{self.bot.user.id}> ", f"<@!{self.bot.user.id}> ")
+            matcher = self.matchers[key] = PrefixMatcher(prefixes, mentions)
+
+        return matcher
+
+    async def resolve(self, message: Message) -> PrefixMatcher:
+        """
+        Same as matcher, loading the guild config first if needed
+        """
+
+        if message.guild.id not in self.bot.guild_config.loaded:
+            await self.bot.guild_config.load([message.guild.id])
+
+        return self.matcher(message)
@@ -0,0 +1,203 @@
+import time
+import logging
+
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from discord import Message
+from discord.ext.commands import BucketType
+
+log = logging.getLogger(__name__)
+
+MODES = ("bucket", "window", "shared")
+
+
+class Limit:
+    """
+    A named limit keyed by a discord bucket type, replacing CooldownMapping
+    """
+
+    def __init__(
+        self,
+        limiter: "RateLimiter",
+        name: str,
+        rate: int,
+        per: float,
+        type: BucketType = BucketType.default,
+        mode: str = "bucket",
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown rate limit mode {mode}")
+
+        self.limiter = limiter
+        self.name = name
+        self.rate = rate
+        self.per = per
+        self.type = type
+        self.mode = mode
+
+    def __repr__(self) -> str:
+        return f"<Limit {self.name} {self.rate}/{self.per}s mode={self.mode}>"
+
+    def key(self, message: Message) -> str:
+        return f"{self.name}:{self.type.get_key(message)}"
+
+    def hit(self, message: Message) -> Optional[float]:
+        """
+        Consume one call, returns the retry after if limited. Local modes only
+        """
+
+        if self.mode == "window":
+            return self.limiter.window(
+                self.key(message), self.rate, self.per, self.name
+            )
+
+        return self.limiter.bucket(self.key(message), self.rate, self.per, self.name)
+
+    async def shared_hit(self, message: Message) -> Optional[float]:
+        """
+        Same as hit, going through redis when the limit is shared
+        """
+
+        if self.mode == "shared":
+            return await self.limiter.shared(
+                self.key(message), self.rate, self.per, self.name
+            )
+
+        return self.hit(message)
+
+
+class RateLimiter:
+    """
+    Every rate limit of the bot: local token buckets, local sliding
+    windows, and redis windows shared between processes
+
+    Idle keys are dropped lazily while the limiter is used
+    """
+
+    SWEEP_EVERY = 1024
+
+    def __init__(self, bot: Any = None):
+        self.bot = bot
+        self.buckets: Dict[str, List[float]] = {}
+        self.windows: Dict[str, Deque[float]] = {}
+        self.expires: Dict[str, float] = {}
+        self.passed: Counter = Counter()
+        self.limited: Counter = Counter()
+        self.calls = 0
+
+    def __repr__(self) -> str:
+        return f"<RateLimiter keys={len(self.expires)} calls={self.calls}>"
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Passed and limited calls per limit name
+        """
+
+        return {
+            name: {"passed": self.passed[name], "limited": self.limited[name]}
+            for name in set(self.passed) | set(self.limited)
+        }
+
+    def limit(
+        self,
+        name: str,
+        rate: int,
+        per: float,
+        type: BucketType = BucketType.default,
+        mode: str = "bucket",
+    ) -> Limit:
+        return Limit(self, name, rate, per, type, mode)
+
+    def record(self, name: str, retry_after: Optional[float]) -> Optional[float]:
+        if retry_after is None:
+            self.passed[name] += 1
+        else:
+            self.limited[name] += 1
+
+        self.calls += 1
+        if self.calls % self.SWEEP_EVERY == 0:
+            self.sweep()
+
+        return retry_after
+
+    def sweep(self) -> int:
+        """
+        Forget the keys whose limit has fully reset
+        """
+
+        now = time.monotonic()
+        expired = [key for key, expires in self.expires.items() if expires < now]
+        for key in expired:
+            del self.expires[key]
+            self.buckets.pop(key, None)
+            self.windows.pop(key, None)
+
+        return len(expired)
+
+    def bucket(
+        self, key: str, rate: int, per: float, name: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Token bucket holding rate tokens, refilled over per seconds
+        """
+
+        now = time.monotonic()
+        name = name or key.partition(":")[0]
+        state = self.buckets.get(key)
+        if state is None:
+            tokens = float(rate)
+        else:
+            tokens = min(rate, state[0] + (now - state[1]) * rate / per)
+
+        self.expires[key] = now + per
+        if tokens < 1:
+            self.buckets[key] = [tokens, now]
+            return self.record(name, (1 - tokens) * per / rate)
+
+        self.buckets[key] = [tokens - 1, now]
+        return self.record(name, None)
+
+    def window(
+        self, key: str, rate: int, per: float, name: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Sliding window allowing rate calls in any per seconds
+        """
+
+        now = time.monotonic()
+        name = name or key.partition(":")[0]
+        calls = self.windows.setdefault(key, deque())
+        while calls and calls[0] <= now - per:
+            calls.popleft()
+
+        self.expires[key] = now + per
+        if len(calls) >= rate:
+            return self.record(name, calls[0] + per - now)
+
+        calls.append(now)
+        return self.record(name, None)
+
+    async def shared(
+        self, key: str, rate: int, per: float, name: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Window counted in redis so every process shares it, local if redis is down
+        """
+
+        name = name or key.partition(":")[0]
+        redis = getattr(self.bot, "redis", None)
+        if redis is None:
+            return self.window(key, rate, per, name)
+
+        try:
+            if not await redis.ratelimited(key, rate, max(int(per), 1)):
+                return self.record(name, None)
+
+            retry_after = await redis.ttl(redis.rl_key(key))
+        except Exception as e:
+            log.warning(f"Falling back to a local rate limit for {key}: {e}")
+            return self.window(key, rate, per, name)
+
+        return self.record(name, float(retry_after) if retry_after > 0 else per)
@@ -0,0 +1,252 @@
+import heapq
+import asyncio
+import logging
+import datetime
+
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from discord.ext.commands import AutoShardedBot as AB
+
+from .database import Record
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "scheduler"
+
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION notify_scheduler() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+class JobKind(NamedTuple):
+    name: str
+    table: str
+    column: str
+    keys: Tuple[str, ...]
+    callback: Callable[[AB, Record], Awaitable[Any]]
+
+
+class Job(NamedTuple):
+    due: float
+    kind: str
+    key: Tuple[Any, ...]
+
+
+class Scheduler:
+    """
+    Fires rows of timed tables (reminders, giveaways...) when they are due
+
+    Only rows due within the horizon are kept in a heap. The loop sleeps
+    until the earliest deadline, the end of the horizon, or a NOTIFY from
+    one of the tables. Fired rows are deleted or cleared by their callback,
+    so the tables themselves are the cursor a restart resumes from
+
+    Every table has a guild_id, each cluster only fires the rows of the
+    guilds on its own shards
+    """
+
+    def __init__(self, bot: AB, horizon: float = 600.0):
+        self.bot = bot
+        self.horizon = horizon
+        self.kinds: Dict[str, JobKind] = {}
+        self.heap: List[Job] = []
+        self.pending: Dict[Tuple[str, Tuple[Any, ...]], float] = {}
+        self.running: Set[Tuple[str, Tuple[Any, ...]]] = set()
+        self.dirty: Set[str] = set()
+        self.window_end = 0.0
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.fired = 0
+
+    def __repr__(self) -> str:
+        return f"<Scheduler pending={len(self.pending)} fired={self.fired}>"
+
+    def register(
+        self,
+        name: str,
+        table: str,
+        column: str,
+        keys: Tuple[str, ...],
+        callback: Callable[[AB, Record], Awaitable[Any]],
+    ) -> None:
+        """
+        Fire callback(bot, row) once row[column] is in the past
+        """
+
+        self.kinds[name] = JobKind(name, table, column, keys, callback)
+
+    async def setup(self) -> None:
+        """
+        Install the notify triggers used to wake the scheduler up
+        """
+
+        try:
+            await self.bot.db.execute(TRIGGER_FUNCTION)
+            for kind in self.kinds.values():
+                await self.bot.db.execute(
+                    f"DROP TRIGGER IF EXISTS {kind.table}_scheduler ON {kind.table}"
+                )
+                await self.bot.db.execute(
+                    f"""
+          CREATE TRIGGER {kind.table}_scheduler
+          AFTER INSERT OR UPDATE OF {kind.column} ON {kind.table}
+          FOR EACH ROW EXECUTE FUNCTION notify_scheduler()
+          """
+                )
+        except Exception as e:
+            log.warning(f"Unable to install scheduler triggers: {e}")
+
+        await self.bot.db.listen(CHANNEL, self.on_notify, self.on_reconnect)
+
+    def start(self) -> None:
+        if not self.task or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+    def on_notify(self, table: str) -> None:
+        for kind in self.kinds.values():
+            if kind.table == table:
+                self.dirty.add(kind.name)
+
+        self.wakeup.set()
+
+    def on_reconnect(self) -> None:
+        self.dirty.update(self.kinds)
+        self.wakeup.set()
+
+    def now(self) -> float:
+        # the tables store naive local timestamps
+        return datetime.datetime.now().timestamp()
+
+    async def load(self, name: str, until: float) -> None:
+        """
+        Queue every row of a kind that is due before until
+        """
+
+        kind = self.kinds[name]
+        # other processes write to these tables too
+        self.bot.db.invalidate(kind.table)
+        results = await self.bot.db.fetch(
+            f"""
+      SELECT {', '.join(kind.keys)}, {kind.column}, guild_id AS owner
+      FROM {kind.table}
+      WHERE {kind.column} IS NOT NULL
+      AND {kind.column} <= $1
+      """,
+            datetime.datetime.fromtimestamp(until),
+        )
+
+        previous = {
+            k: self.pending.pop(k) for k in list(self.pending) if k[0] == name
+        }
+
+        for result in results:
+            if not self.bot.owns_guild(result["owner"]):
+                # fired by the cluster running the guild
+                continue
+
+            job = Job(
+                result[kind.column].timestamp(),
+                name,
+                tuple(result[k] for k in kind.keys),
+            )
+            if (name, job.key) in self.running:
+                continue
+
+            self.pending[(name, job.key)] = job.due
+            # jobs already in the heap with the same deadline stay valid
+            if previous.get((name, job.key)) != job.due:
+                heapq.heappush(self.heap, job)
+
+    async def refresh(self) -> None:
+        now = self.now()
+        if now >= self.window_end:
+            self.window_end = now + self.horizon
+            self.dirty.update(self.kinds)
+            # drop stale entries from the previous window
+            self.heap = [
+                job
+                for job in self.heap
+                if self.pending.get((job.kind, job.key)) == job.due
+            ]
+            heapq.heapify(self.heap)
+
+        while self.dirty:
+            name = self.dirty.pop()
+            try:
+                await self.load(name, self.window_end)
+            except Exception:
+                log.exception(f"Unable to load scheduled {name} jobs")
+                self.dirty.add(name)
+                break
+
+    async def run(self) -> None:
+        await self.bot.wait_until_ready()
+        while True:
+            self.wakeup.clear()
+            await self.refresh()
+
+            now = self.now()
+            while self.heap and self.heap[0].due <= now:
+                job = heapq.heappop(self.heap)
+                if self.pending.get((job.kind, job.key)) != job.due:
+                    # rescheduled or removed since it was queued
+                    continue
+
+                del self.pending[(job.kind, job.key)]
+                self.running.add((job.kind, job.key))
+                asyncio.ensure_future(self.fire(job))
+
+            deadline = self.window_end
+            if self.heap:
+                deadline = min(deadline, self.heap[0].due)
+
+            try:
+                await asyncio.wait_for(
+                    self.wakeup.wait(), timeout=max(deadline - self.now(), 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def fire(self, job: Job) -> None:
+        kind = self.kinds[job.kind]
+        conditions = " AND ".join(f"{k} = ${i}" for i, k in enumerate(kind.keys, 1))
+
+        try:
+            # the row could have changed or been deleted since it was loaded
+            self.bot.db.invalidate(kind.table)
+            result = await self.bot.db.fetchrow(
+                f"SELECT * FROM {kind.table} WHERE {conditions}", *job.key
+            )
+            if not result or not result[kind.column]:
+                return
+
+            if result[kind.column].timestamp() > self.now():
+                self.dirty.add(job.kind)
+                self.wakeup.set()
+                return
+
+            self.fired += 1
+            await kind.callback(self.bot, result)
+        except Exception:
+            log.exception(f"Scheduled {job.kind} job {job.key} failed")
+        finally:
+            self.running.discard((job.kind, job.key))
@@ -5,6 +5,10 @@ from discord import Member, DMChannel, TextChannel, Message
 from xxhash import xxh3_64_hexdigest as hash
 from json import dumps as dump, loads as load
 import orjson
+from .compression import CODEC, compress, compressor
+
+# version of the chunked transcript format in {key}:meta
+FORMAT = 1
 
 class LogAuthor(BaseModel):
     id: str
@@ -45,8 +49,14 @@ class TicketLogs:
         self.bot = bot
         self.logs = {}
         self.base_url = f"https://logs.greed.best/logs/"
+        self.page_size = 100
+        self.ttl = 60 * 60 * 24 * 14
+
+    async def setup(self):
+        # every upload writes the column, a failure here has to stop the bot
+        await self.bot.db.execute("ALTER TABLE logs ADD COLUMN IF NOT EXISTS data BYTEA")
     
-    def serialize_message(self, message: discord.Message) -> LogEntry:
+    def serialize_message(self, message: discord.Message) -> dict:
         data = {
             "timestamp": str(message.created_at),
             "message_id": message.id,
@@ -70,20 +80,85 @@ class TicketLogs:
                 for a in message.attachments
             ],
         }
-        return LogEntry(**data)
+        return data
+
+    async def pages(self, channel: discord.TextChannel):
+        """
+        The channel history, oldest first, in pages of serialized messages
+        """
+        page = []
+        async for message in channel.history(limit=None, oldest_first=True):
+            if message.author.bot:
+                continue
+            page.append(self.serialize_message(message))
+            if len(page) == self.page_size:
+                yield page
+                page = []
+        if page:
+            yield page
 
 
     async def upload(self, channel: discord.TextChannel, ticketauthor: TicketAuthor) -> str:
-        messages = [self.serialize_message(a) async for a in channel.history(limit=None) if not a.author.bot]
-        data = {'guild_id': channel.guild.id, 'channel_id': channel.id, 'author': ticketauthor, 'logs': messages}
+        """
+        Stream the transcript page by page
+
+        {key} in redis and the logs column keep the full transcript json
+        existing readers use. Next to it every page is compressed on its own
+        and pushed to {key}:chunks, described by {key}:meta, while the same
+        bytes feed a single compressed message array for the data column.
+        The redis keys expire after self.ttl
+        """
         key = hash(f"{channel.guild.id}-{channel.id}")
-        logs = TicketLog(**data)
-        await self.bot.redis.set(key,orjson.dumps(logs.dict()))
-        await self.bot.db.execute("""INSERT INTO logs (key, guild_id, channel_id, author, logs) VALUES ($1, $2, $3, $4, $5)""", key, channel.guild.id, channel.id, ticketauthor.json(), logs.json())
+        chunks = f"{key}:chunks"
+        await self.bot.redis.delete(chunks)
+        head = {"guild_id": channel.guild.id, "channel_id": channel.id, "author": ticketauthor.dict()}
+        stream = compressor()
+        blob = [stream.compress(b"[")]
+        messages = []
+        count = pages = 0
+        async for page in self.pages(channel):
+            data = orjson.dumps(page)
+            await self.bot.redis.rpush(chunks, compress(data))
+            blob.append(stream.compress((b"," if count else b"") + data[1:-1]))
+            messages.append(data[1:-1])
+            count += len(page)
+            pages += 1
+        blob.append(stream.compress(b"]") + stream.flush())
+        transcript = orjson.dumps(head)[:-1] + b',"logs":[' + b",".join(messages) + b"]}"
+        meta = orjson.dumps({**head, "format": FORMAT, "codec": CODEC, "chunk_count": pages, "message_count": count})
+        await self.bot.redis.set(key, transcript, ex=self.ttl)
+        await self.bot.redis.set(f"{key}:meta", meta, ex=self.ttl)
+        if pages:
+            await self.bot.redis.expire(chunks, self.ttl)
+        await self.bot.db.execute("""INSERT INTO logs (key, guild_id, channel_id, author, logs, data) VALUES ($1, $2, $3, $4, $5, $6)""", key, channel.guild.id, channel.id, ticketauthor.json(), transcript.decode(), b"".join(blob))
         return f"{self.base_url}{key}"
+
+    async def transcript(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        A transcript with its messages as compressed chunks, the form the log viewer's LogEntry reads
+
+        Chunks come from redis while they're there, then from the data column.
+        Transcripts saved before it came with their message list
+        """
+        if meta := await self.bot.redis.get(f"{key}:meta"):
+            data = orjson.loads(meta)
+            data["key"] = key
+            data["chunks"] = await self.bot.redis.lrange(f"{key}:chunks", 0, -1)
+            return data
+
+        row = await self.bot.db.fetchrow("""SELECT guild_id, channel_id, author, logs, data FROM logs WHERE key = $1""", key)
+        if not row:
+            return None
+
+        data = {"key": key, "guild_id": row["guild_id"], "channel_id": row["channel_id"], "author": orjson.loads(row["author"])}
+        if row["data"] is not None:
+            data["chunks"] = [row["data"]]
+        else:
+            data["messages"] = orjson.loads(row["logs"])["logs"]
+        return data
     
     async def delete(self, key: str):
-        await self.bot.redis.delete(key) #await self.bot.db.execute("""DELETE FROM logs WHERE key = $1""", key)
+        await self.bot.redis.delete(key, f"{key}:meta", f"{key}:chunks") #await self.bot.db.execute("""DELETE FROM logs WHERE key = $1""", key)
         return True
     
     async def clear(self, guild_id: Optional[int] = None):
@@ -0,0 +1,160 @@
+import orjson
+
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .database import Record
+
+
+class AhoCorasick:
+    """
+    Automaton matching many patterns in a single pass over the text
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+
+        for pattern in patterns:
+            self.add(pattern)
+
+        self.build()
+
+    def add(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+
+        self.output[state].append(pattern)
+
+    def build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (start index, pattern) for every pattern occurrence
+        """
+
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern in self.output[state]:
+                yield index - len(pattern) + 1, pattern
+
+
+class AutoresponderIndex:
+    """
+    Exact content -> response lookup for a guild's autoresponders
+    """
+
+    def __init__(self, rows: List[Record]):
+        self.rows = rows
+        self.responses: Dict[str, str] = {}
+        for row in rows:
+            self.responses.setdefault(row["trigger"], row["response"])
+
+    def match(self, content: str) -> Optional[str]:
+        return self.responses.get(content)
+
+
+class AutoreactIndex:
+    """
+    Compiled matcher for a guild's autoreact triggers
+
+    Single word triggers are matched against the message's word set,
+    multi word triggers with an Aho-Corasick automaton over the content
+    """
+
+    def __init__(self, rows: List[Record]):
+        self.rows = rows
+        self.order: Dict[str, int] = {}
+        self.reactions: Dict[str, List[str]] = {}
+        self.resolved: Dict[str, List[Any]] = {}
+        phrases = []
+
+        for position, row in enumerate(rows):
+            trigger = " ".join(row["trigger"].lower().split())
+            if not trigger or trigger in self.order:
+                continue
+
+            self.order[trigger] = position
+            self.reactions[trigger] = orjson.loads(row["reactions"])
+            if " " in trigger:
+                phrases.append(trigger)
+
+        self.tokens = {t for t in self.order if " " not in t}
+        self.phrases = AhoCorasick(phrases) if phrases else None
+
+    def match(self, lowered: str, words: Iterable[str]) -> Optional[str]:
+        """
+        The first configured trigger present in the message, if any
+        """
+
+        found = [w for w in words if w in self.tokens]
+
+        if self.phrases:
+            for start, phrase in self.phrases.search(lowered):
+                end = start + len(phrase)
+                if (start == 0 or lowered[start - 1].isspace()) and (
+                    end == len(lowered) or lowered[end].isspace()
+                ):
+                    found.append(phrase)
+
+        if not found:
+            return None
+
+        return min(found, key=self.order.__getitem__)
+
+
+EMPTY_AUTORESPONDER = AutoresponderIndex([])
+EMPTY_AUTOREACT = AutoreactIndex([])
+
+
+class TriggerIndexes:
+    """
+    Per guild trigger indexes, rebuilt whenever the guild's rows change
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.autoresponders: Dict[int, AutoresponderIndex] = {}
+        self.autoreacts: Dict[int, AutoreactIndex] = {}
+
+    def autoresponder(self, guild_id: int) -> AutoresponderIndex:
+        rows = self.bot.guild_config.get("autoresponder", guild_id)
+        if not rows:
+            return EMPTY_AUTORESPONDER
+
+        index = self.autoresponders.get(guild_id)
+        if index is None or index.rows is not rows:
+            index = self.autoresponders[guild_id] = AutoresponderIndex(rows)
+
+        return index
+
+    def autoreact(self, guild_id: int) -> AutoreactIndex:
+        rows = self.bot.guild_config.get("autoreact", guild_id)
+        if not rows:
+            return EMPTY_AUTOREACT
+
+        index = self.autoreacts.get(guild_id)
+        if index is None or index.rows is not rows:
+            index = self.autoreacts[guild_id] = AutoreactIndex(rows)
+
+        return index
@@ -0,0 +1,151 @@
+import time
+
+from collections import Counter, deque
+from typing import Deque, Dict, Hashable, Iterator, List, NamedTuple, Optional
+
+
+class Event(NamedTuple):
+    at: float
+    id: int
+    channel_id: int
+    digest: Optional[int]
+
+
+class SlidingWindow:
+    """
+    Events of the last seconds, oldest first, with a running count of
+    every content digest they hold
+    """
+
+    __slots__ = ("events", "digests")
+
+    def __init__(self):
+        self.events: Deque[Event] = deque()
+        self.digests: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __iter__(self) -> Iterator[Event]:
+        return iter(self.events)
+
+    @property
+    def last(self) -> float:
+        return self.events[-1].at if self.events else 0.0
+
+    def push(self, event: Event, limit: int) -> None:
+        while len(self.events) >= limit:
+            self.drop()
+
+        self.events.append(event)
+        if event.digest is not None:
+            self.digests[event.digest] += 1
+
+    def expire(self, cutoff: float) -> None:
+        while self.events and self.events[0].at <= cutoff:
+            self.drop()
+
+    def drop(self) -> None:
+        event = self.events.popleft()
+        if event.digest is not None:
+            if count := self.digests[event.digest] - 1:
+                self.digests[event.digest] = count
+            else:
+                del self.digests[event.digest]
+
+    def repeats(self, digest: Optional[int]) -> int:
+        """
+        How many events in the window share a digest
+        """
+
+        return self.digests.get(digest, 0) if digest is not None else 0
+
+    def burst(self, since: float) -> int:
+        """
+        How many events happened after since, walking back from the newest
+        """
+
+        count = 0
+        for event in reversed(self.events):
+            if event.at <= since:
+                break
+            count += 1
+
+        return count
+
+    def by_channel(self) -> Dict[int, List[int]]:
+        channels: Dict[int, List[int]] = {}
+        for event in self.events:
+            channels.setdefault(event.channel_id, []).append(event.id)
+
+        return channels
+
+
+class WindowStore:
+    """
+    Sliding windows keyed by anything hashable, like (guild, user)
+
+    Windows are bounded to limit events and dropped once idle for longer
+    than the window itself
+    """
+
+    SWEEP_EVERY = 512
+
+    def __init__(self, per: float, limit: int = 256):
+        self.per = per
+        self.limit = limit
+        self.windows: Dict[Hashable, SlidingWindow] = {}
+        self.pushes = 0
+
+    def __repr__(self) -> str:
+        return f"<WindowStore per={self.per} keys={len(self.windows)}>"
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+    def push(
+        self,
+        key: Hashable,
+        id: int,
+        channel_id: int = 0,
+        digest: Optional[int] = None,
+    ) -> SlidingWindow:
+        """
+        Add an event to the window of a key, returns the updated window
+        """
+
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = SlidingWindow()
+
+        window.expire(now - self.per)
+        window.push(Event(now, id, channel_id, digest), self.limit)
+
+        self.pushes += 1
+        if self.pushes % self.SWEEP_EVERY == 0:
+            self.sweep()
+
+        return window
+
+    def get(self, key: Hashable) -> Optional[SlidingWindow]:
+        window = self.windows.get(key)
+        if window is not None:
+            window.expire(time.monotonic() - self.per)
+
+        return window
+
+    def pop(self, key: Hashable) -> Optional[SlidingWindow]:
+        return self.windows.pop(key, None)
+
+    def sweep(self) -> int:
+        """
+        Drop the windows nothing was pushed to for a whole window
+        """
+
+        cutoff = time.monotonic() - self.per
+        idle = [key for key, window in self.windows.items() if window.last <= cutoff]
+        for key in idle:
+            del self.windows[key]
+
+        return len(idle)